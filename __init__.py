@@ -1,3 +1,16 @@
-from .atoms import atom, atomMixed
+from .parameterDatabase import parameterDatabase, getParameterDatabase, compileParameterStore
+from .atoms import atom, atomMixed, atomComposition, getCMAtomicFormFactors
+from .antiderivatives import antiderivativeCache, getAntiderivativeCache
+from .materialFunction import materialFunction
 from .unitCell import unitCell
 from .structure import structure
+from .layerView import layerView
+from .strainBinning import strainBinning
+from .parameterSweep import parameterSweep, applyParameters
+from .resultCache import resultCache, getFingerprint, getFingerprintComponents
+from .chunkedMap import chunkedMap, getStructureMetadata
+from .serialization import getSampleDict, sampleFromDict, saveSample, loadSample
+from .heat import heat
+from .phonon import phonon
+from .xrayKin import xrayKin
+from .xrayDyn import xrayDyn
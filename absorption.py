@@ -0,0 +1,288 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+"""absorption
+
+Optical absorption profiles and reflectivities of structures. The
+Lambert-Beer mode uses the optical penetration depths of the unit cells.
+The transfer-matrix mode uses the complex refractive indices
+$n + i\\kappa$ of the unit cells and treats every unit cell as a thin
+film with its characteristic 2x2 matrix. All matrices of a structure are
+multiplied as stacked arrays, batched over wavelengths, angles of
+incidence and strain maps.
+"""
+
+import numpy as np
+
+# maximum number of stacked matrices per batch of the transfer-matrix mode
+_maxBatchElements = 2**21
+
+
+def getLambertBeerAbsorption(S):
+    """getLambertBeerAbsorption
+
+    Returns the fraction of the incident fluence absorbed in each unit
+    cell according to Lambert-Beer's law with the optical penetration
+    depth of the unit cells. Unit cells with a penetration depth of 0 or
+    inf are transparent.
+    """
+    compiled = S.compile()
+    dz       = compiled.getPropertyVector('cAxis')
+    delta    = compiled.getPropertyVector('optPenDepth').astype(float)
+    absorbing = (delta > 0) & np.isfinite(delta)
+    alpha = np.zeros_like(dz)
+    alpha[absorbing] = dz[absorbing]/delta[absorbing]
+    # optical depth at the end of each unit cell
+    cum = np.cumsum(alpha)
+    return np.exp(-(cum - alpha)) - np.exp(-cum)
+
+
+def getRefractiveIndices(S, strain=None):
+    """getRefractiveIndices
+
+    Returns the complex refractive indices of all unit cells. The
+    refractive index of a unit cell is given either as complex number or
+    as [n, kappa]. For a strain vector or a (... x N) strain map, the
+    refractive indices are changed linearly by optRefIndexPerStrain.
+    """
+    compiled = S.compile()
+    n  = np.array([_toComplex(handle.optRefIndex) for handle in compiled.UCHandles])
+    if np.any(n == 0):
+        raise ValueError('The refractive index of all unit cells has to be set for '
+                         'the transfer-matrix mode!')
+    n = n[compiled.indices]
+    if strain is not None:
+        dn = np.array([_toComplex(handle.optRefIndexPerStrain) for handle in compiled.UCHandles])
+        n  = n + dn[compiled.indices]*np.asarray(strain, dtype=float)
+    return n
+
+
+def _toComplex(value):
+    """_toComplex
+
+    Returns the complex number of a refractive index given as complex
+    number or as [n, kappa].
+    """
+    value = np.asarray(value)
+    if value.size == 2 and not np.iscomplexobj(value):
+        return complex(value.flat[0], value.flat[1])
+    return complex(value)
+
+
+def _getAdmittance(n, cosTheta, polarization):
+    """_getAdmittance
+
+    Returns the optical admittance of the refractive indices in units of
+    the admittance of free space for s or p polarization.
+    """
+    if polarization == 's':
+        return n*cosTheta
+    elif polarization == 'p':
+        return n/cosTheta
+    raise ValueError('The polarization has to be s or p!')
+
+
+def _getCosTheta(n, nSinTheta):
+    """_getCosTheta
+
+    Returns the complex cosine of the angle of propagation in the media
+    of refractive index n by Snell's law, with the branch of a wave which
+    is damped or propagates into the structure.
+    """
+    nCos = np.sqrt(n**2 - nSinTheta**2 + 0j)
+    nCos = np.where(nCos.imag < 0, -nCos, nCos)
+    return nCos/n
+
+
+def _getCharacteristicMatrices(n, d, wavelength, nSinTheta, polarization):
+    """_getCharacteristicMatrices
+
+    Returns the stacked (... x N x 2 x 2) characteristic matrices of thin
+    films of the refractive indices n and thicknesses d, which relate the
+    tangential fields at the top to the ones at the bottom of each film.
+    Also returns the phase thicknesses and admittances of the films.
+    """
+    cosTheta = _getCosTheta(n, nSinTheta)
+    eta      = _getAdmittance(n, cosTheta, polarization)
+    delta    = 2*np.pi*n*cosTheta*d/wavelength
+    cos, sin = np.cos(delta), np.sin(delta)
+    M = np.empty(np.shape(delta) + (2, 2), dtype=complex)
+    M[..., 0, 0] = cos
+    M[..., 0, 1] = -1j*sin/eta
+    M[..., 1, 0] = -1j*eta*sin
+    M[..., 1, 1] = cos
+    return M, cos, sin, eta
+
+
+def _normalize(M):
+    """_normalize
+
+    Scales the stacked matrices by their largest element. The admittances
+    are invariant under scaling, which avoids overflows for thick
+    absorbing structures.
+    """
+    M /= np.max(np.abs(M), axis=(-2, -1), keepdims=True)
+    return M
+
+
+def _getSuffixProducts(M):
+    """_getSuffixProducts
+
+    Returns the normalized products M_j @ ... @ M_N of the stacked
+    matrices for all j, which are calculated in log2(N) steps of stacked
+    matrix products.
+    """
+    P = M.copy()
+    N = P.shape[-3]
+    shift = 1
+    while shift < N:
+        P[..., :N-shift, :, :] = P[..., :N-shift, :, :] @ P[..., shift:, :, :]
+        _normalize(P)
+        shift *= 2
+    return P
+
+
+def _getTotalProduct(M):
+    """_getTotalProduct
+
+    Returns the normalized product M_1 @ ... @ M_N of the stacked matrices
+    by pairwise reduction.
+    """
+    P = M
+    while P.shape[-3] > 1:
+        if P.shape[-3] % 2:
+            P = np.concatenate([P, np.broadcast_to(np.eye(2), P.shape[:-3] + (1, 2, 2))], axis=-3)
+        P = _normalize(P[..., 0::2, :, :] @ P[..., 1::2, :, :])
+    return P[..., 0, :, :]
+
+
+def _getBatch(S, wavelength, theta, strain, nAmbient):
+    """_getBatch
+
+    Returns the refractive indices as (batch x N) array, the matching
+    wavelengths and in-plane wave vector components as (batch x 1) arrays
+    and the shape of the batch. The batch dimensions are the ones of the
+    strain map followed by the ones of the wavelengths and of the angles
+    of incidence.
+    """
+    n = getRefractiveIndices(S, strain)
+    wavelength = np.asarray(wavelength, dtype=float)
+    theta      = np.asarray(theta, dtype=float)
+    shape = n.shape[:-1] + wavelength.shape + theta.shape
+    wl = np.reshape(wavelength, (1,)*(n.ndim - 1) + wavelength.shape + (1,)*theta.ndim)
+    th = np.reshape(theta, (1,)*(n.ndim - 1 + wavelength.ndim) + theta.shape)
+    nn = np.reshape(n, n.shape[:-1] + (1,)*(wavelength.ndim + theta.ndim) + n.shape[-1:])
+    wl, th = np.broadcast_arrays(wl, th)
+    nn = np.broadcast_to(nn, shape + n.shape[-1:]).reshape(-1, n.shape[-1])
+    wl = np.broadcast_to(wl, shape).reshape(-1, 1)
+    nSinTheta = (nAmbient*np.sin(np.broadcast_to(th, shape))).reshape(-1, 1)
+    return nn, wl, nSinTheta, shape
+
+
+def _iterChunks(numBatch, numUnitCells):
+    """_iterChunks
+
+    Yields slices of the batch such that each chunk holds at most
+    _maxBatchElements stacked matrices.
+    """
+    size = max(1, _maxBatchElements//max(numUnitCells, 1))
+    for start in range(0, numBatch, size):
+        yield slice(start, min(start + size, numBatch))
+
+
+def getTransferMatrixAbsorption(S, wavelength, theta=0, polarization='s', **kwargs):
+    """getTransferMatrixAbsorption
+
+    Returns the fraction of the incident intensity absorbed in each unit
+    cell by the transfer-matrix method, including all multiple
+    reflections at the interfaces. The result has the shape of the strain
+    map without its last dimension, followed by the shapes of the
+    wavelengths and the angles of incidence [rad] and the number of unit
+    cells.
+
+    The fields are propagated with the admittances at the top of each
+    unit cell, which are derived from the suffix products of the
+    characteristic matrices.
+
+    Args:
+        strain (Optional[ndarray])  : strain vector or (... x N) map
+        nAmbient (Optional[float])  : refractive index of the ambient,
+                                      default is 1
+        nSubstrate (Optional[complex]) : refractive index of the semi-
+                                      infinite medium below the
+                                      structure, default is the one of
+                                      the last unit cell
+    """
+    strain   = kwargs.get('strain')
+    nAmbient = kwargs.get('nAmbient', 1)
+    dz = S.compile().getPropertyVector('cAxis')
+    n, wl, nSinTheta, shape = _getBatch(S, wavelength, theta, strain, nAmbient)
+    N  = n.shape[-1]
+    nSub = kwargs.get('nSubstrate')
+    eta0 = _getAdmittance(nAmbient, _getCosTheta(nAmbient + 0j, nSinTheta[:, 0]), polarization)
+
+    res = np.empty(n.shape)
+    for chunk in _iterChunks(n.shape[0], N):
+        M, cos, sin, eta = _getCharacteristicMatrices(n[chunk], dz, wl[chunk], nSinTheta[chunk],
+                                                      polarization)
+        nS    = n[chunk, -1] if nSub is None else np.full(n[chunk].shape[0], _toComplex(nSub))
+        etaS  = _getAdmittance(nS, _getCosTheta(nS, nSinTheta[chunk, 0]), polarization)
+        P     = _getSuffixProducts(M)
+        # admittances at the top of each unit cell and of the substrate
+        Y     = np.empty((P.shape[0], N + 1), dtype=complex)
+        Y[:, :N] = ((P[..., 1, 0] + P[..., 1, 1]*etaS[:, np.newaxis])
+                    / (P[..., 0, 0] + P[..., 0, 1]*etaS[:, np.newaxis]))
+        Y[:, N]  = etaS
+        # tangential electric fields at the interfaces for a unit incident field
+        E0    = 2*eta0[chunk]/(eta0[chunk] + Y[:, 0])
+        ratio = 1/(cos - 1j*Y[:, 1:]*sin/eta)
+        E     = np.empty_like(Y)
+        E[:, 0]  = E0
+        E[:, 1:] = E0[:, np.newaxis]*np.cumprod(ratio, axis=1)
+        # Poynting flux into each interface relative to the incident flux
+        flux  = np.abs(E)**2*Y.real/eta0[chunk, np.newaxis].real
+        res[chunk] = flux[:, :-1] - flux[:, 1:]
+    return res.reshape(shape + (N,))
+
+
+def getReflectivity(S, wavelength, theta=0, polarization='s', **kwargs):
+    """getReflectivity
+
+    Returns the optical reflectivity of the structure by the
+    transfer-matrix method. For a (... x N) strain map, e.g. of a phonon
+    simulation, the transient reflectivity is returned. The result has the
+    shape of the strain map without its last dimension, followed by the
+    shapes of the wavelengths and the angles of incidence [rad], see
+    getTransferMatrixAbsorption for the keyword arguments.
+    """
+    strain   = kwargs.get('strain')
+    nAmbient = kwargs.get('nAmbient', 1)
+    dz = S.compile().getPropertyVector('cAxis')
+    n, wl, nSinTheta, shape = _getBatch(S, wavelength, theta, strain, nAmbient)
+    N  = n.shape[-1]
+    nSub = kwargs.get('nSubstrate')
+    eta0 = _getAdmittance(nAmbient, _getCosTheta(nAmbient + 0j, nSinTheta[:, 0]), polarization)
+
+    res = np.empty(n.shape[0])
+    for chunk in _iterChunks(n.shape[0], N):
+        M    = _getCharacteristicMatrices(n[chunk], dz, wl[chunk], nSinTheta[chunk], polarization)[0]
+        nS   = n[chunk, -1] if nSub is None else np.full(n[chunk].shape[0], _toComplex(nSub))
+        etaS = _getAdmittance(nS, _getCosTheta(nS, nSinTheta[chunk, 0]), polarization)
+        P    = _getTotalProduct(M)
+        Y    = (P[:, 1, 0] + P[:, 1, 1]*etaS)/(P[:, 0, 0] + P[:, 0, 1]*etaS)
+        res[chunk] = np.abs((eta0[chunk] - Y)/(eta0[chunk] + Y))**2
+    return res.reshape(shape)
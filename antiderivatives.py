@@ -0,0 +1,278 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import os
+import ast
+import json
+import threading
+from .helpers import getCacheDir, atomicWrite
+from .materialFunction import materialFunction
+
+
+class antiderivativeCache(object):
+    """antiderivativeCache
+
+    The antiderivativeCache class holds the symbolic anti-derivatives of
+    temperature-dependent material functions, such as the heat capacity
+    or the linear thermal expansion, given as strings 'lambda T: ...'.
+    The anti-derivatives are integrated once per normalized expression
+    with sympy and are stored as numpy code in a JSON file on the local
+    disk. Cache hits are evaluated without importing sympy.
+
+    Expressions which cannot be integrated symbolically are integrated
+    numerically on a temperature grid and are evaluated by interpolation
+    within and by adaptive integration outside of the grid.
+
+    Attributes:
+        filename (str)          : JSON file of the persistent cache
+        tempGrid (ndarray)      : temperature grid of the numerical
+                                  integration [K]
+        hits (int)              : number of cache hits
+        misses (int)            : number of cache misses
+    """
+
+    version = 1
+
+    def __init__(self, filename=None, **kwargs):
+        """Initialize the class and load the persistent cache.
+
+        Args:
+            filename (Optional[str])        : JSON file of the cache,
+                                              default is antiderivatives.json
+                                              in the cache directory.
+            tempGrid (Optional[ndarray])    : temperature grid of the
+                                              numerical integration, default
+                                              is 1 to 10000 K in 0.5 K steps.
+
+        """
+        self.filename   = filename
+        self.tempGrid   = kwargs.get('tempGrid', np.linspace(1, 10000, 19999))
+        self.hits       = 0
+        self.misses     = 0
+        self._entries   = None
+        self._lock      = threading.Lock()
+
+    def _getFilename(self):
+        if self.filename is None:
+            self.filename = os.path.join(getCacheDir(), 'antiderivatives.json')
+        return self.filename
+
+    def _load(self):
+        """_load
+
+        Reads the entries of the persistent cache from disk.
+        """
+        entries = {}
+        try:
+            with open(self._getFilename(), 'r') as f:
+                data = json.load(f)
+            if data.get('version') == self.version:
+                entries = data['entries']
+        except (OSError, ValueError, KeyError):
+            pass
+        return entries
+
+    def _store(self, key, entry):
+        """_store
+
+        Adds the entry to the persistent cache. Entries written by other
+        processes in the meantime are kept.
+        """
+        try:
+            entries = self._load()
+            entries[key] = entry
+            atomicWrite(self._getFilename(), json.dumps({'version': self.version,
+                        'entries': entries}, indent=1, sort_keys=True), mode='w')
+        except OSError as e:
+            print('Cannot write the antiderivative cache {:s}!'.format(str(self.filename)))
+            print(e)
+
+    @staticmethod
+    def normalizeExpression(funcStr):
+        """normalizeExpression
+
+        Returns the variable name and the expression of a string
+        'lambda T: ...' in the canonical formatting of the Python parser.
+        """
+        var, expr = funcStr.split(':', 1)
+        var = var.strip()
+        if var.startswith('lambda'):
+            var = var[len('lambda'):].strip()
+        try:
+            expr = ast.unparse(ast.parse(expr.strip(), mode='eval'))
+        except SyntaxError:
+            expr = ' '.join(expr.split())
+        return var, expr
+
+    def getAntiderivative(self, funcStr):
+        """getAntiderivative
+
+        Returns the anti-derivative of the function given by the string
+        'lambda T: ...' as function handle and as string representation.
+        """
+        var, expr = self.normalizeExpression(funcStr)
+        key = 'lambda {:s}: {:s}'.format(var, expr)
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+            entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            entry = self._integrate(var, expr)
+            with self._lock:
+                self._entries[key] = entry
+            self._store(key, entry)
+        else:
+            self.hits += 1
+
+        if entry['tabulated']:
+            return self._tabulate(var, expr), entry['str']
+        func = materialFunction('lambda {:s}: {:s}'.format(var, entry['code']))
+        return func, entry['str']
+
+    def _integrate(self, var, expr):
+        """_integrate
+
+        Integrates the expression symbolically with sympy and returns the
+        cache entry.
+        """
+        try:
+            from sympy import integrate, Integral, Symbol, sympify
+            from sympy.printing.numpy import NumPyPrinter
+            T = Symbol(var)
+            namespace = _getSympyNamespace()
+            integral = integrate(sympify(expr, locals={var: T, 'np': namespace,
+                                                       'numpy': namespace}), T)
+            if integral.has(Integral):
+                raise ValueError('No closed form found for {:s}'.format(expr))
+            return {'str': 'lambda {:s} : {:s}'.format(var, str(integral)),
+                    'code': NumPyPrinter().doprint(integral), 'tabulated': False}
+        except Exception as e:
+            print('The sympy integration of {:s} did not work, the '
+                  'anti-derivative is integrated numerically instead.'.format(expr))
+            print(e)
+            return {'str': 'lambda {:s} : tabulated integral of {:s}'.format(var, expr),
+                    'code': '', 'tabulated': True}
+
+    def _tabulate(self, var, expr):
+        """_tabulate
+
+        Returns the numerical anti-derivative of the expression on the
+        temperature grid as interpolating function handle.
+        """
+        return tabulatedIntegral('lambda {:s}: {:s}'.format(var, expr), self.tempGrid)
+
+    def clear(self):
+        """clear
+
+        Removes all entries from memory and from the persistent cache.
+        """
+        with self._lock:
+            self._entries = {}
+            try:
+                os.remove(self._getFilename())
+            except OSError:
+                pass
+
+
+class tabulatedIntegral(object):
+    """tabulatedIntegral
+
+    Numerical anti-derivative of a materialFunction, which is integrated
+    with the trapezoidal rule on a grid and evaluated by linear
+    interpolation. Outside of the grid, the function is integrated
+    adaptively from the nearest end of the grid. Instances are pickled by
+    the expression and the grid.
+
+    Attributes:
+        func (materialFunction)   : function to integrate
+        grid (ndarray[float])     : grid of the integration
+        table (ndarray[float])    : anti-derivative on the grid
+    """
+
+    def __init__(self, funcStr, grid):
+        self.func   = materialFunction(funcStr)
+        self.grid   = np.asarray(grid, dtype=float)
+        values      = np.broadcast_to(np.asarray(self.func(self.grid), dtype=float), self.grid.shape)
+        self.table  = np.concatenate([[0], np.cumsum(np.diff(self.grid)*(values[1:] + values[:-1])/2)])
+
+    def __call__(self, x):
+        x   = np.asarray(x, dtype=float)
+        res = np.interp(x, self.grid, self.table)
+        outside = (x < self.grid[0]) | (x > self.grid[-1])
+        if np.any(outside):
+            res = np.array(res, ndmin=1)
+            xOut = np.array(x, ndmin=1)[np.array(outside, ndmin=1)]
+            res[np.array(outside, ndmin=1)] = self._integrateOutside(xOut)
+            res = res.reshape(x.shape)
+        return res
+
+    def _integrateOutside(self, x):
+        """_integrateOutside
+
+        Returns the anti-derivative for values outside of the grid by
+        adaptive integration of the function from the nearest end of the
+        grid. The integrals of all values are computed at once by the
+        substitution T = T0 + s*(x - T0) with s from 0 to 1.
+        """
+        from scipy.integrate import quad_vec
+        below = x < self.grid[0]
+        start = np.where(below, self.grid[0], self.grid[-1])
+        width = x - start
+
+        def integrand(s):
+            return np.broadcast_to(np.asarray(self.func(start + s*width), dtype=float), x.shape)*width
+
+        integral = quad_vec(integrand, 0, 1)[0]
+        return np.where(below, self.table[0], self.table[-1]) + integral
+
+    def __reduce__(self):
+        return (tabulatedIntegral, (self.func.funcStr, self.grid))
+
+
+def _getSympyNamespace():
+    """_getSympyNamespace
+
+    Returns the namespace which maps the numpy functions and constants of
+    the expressions, e.g. np.exp or np.arctan, to their sympy equivalents.
+    """
+    import sympy
+    from types import SimpleNamespace
+    namespace = dict((name, getattr(sympy, name)) for name in dir(sympy) if not name.startswith('_'))
+    namespace.update({'arcsin': sympy.asin, 'arccos': sympy.acos, 'arctan': sympy.atan,
+                      'arcsinh': sympy.asinh, 'arccosh': sympy.acosh, 'arctanh': sympy.atanh,
+                      'arctan2': sympy.atan2, 'abs': sympy.Abs, 'absolute': sympy.Abs,
+                      'power': sympy.Pow, 'log10': lambda x: sympy.log(x, 10),
+                      'log2': lambda x: sympy.log(x, 2), 'e': sympy.E, 'inf': sympy.oo})
+    return SimpleNamespace(**namespace)
+
+
+_cache = None
+
+
+def getAntiderivativeCache():
+    """getAntiderivativeCache
+
+    Returns the process-wide antiderivativeCache instance which is created
+    on first request.
+    """
+    global _cache
+    if _cache is None:
+        _cache = antiderivativeCache()
+    return _cache
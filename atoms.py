@@ -16,11 +16,141 @@
 # Copyright (C) 2017 Daniel Schick
 
 import numpy as np
-import os
-import scipy.constants as constants
+import hashlib
+import functools
+import inspect
+from collections import OrderedDict
+from .parameterDatabase import getParameterDatabase
 import numericalunits as u
 u.reset_units('SI')
 
+class formFactorCache(object):
+    """formFactorCache
+
+    The formFactorCache class is a bounded least-recently-used cache for
+    the results of the form factor methods of atom and atomMixed. The keys
+    are built from the method name and hashes of the energy and $q_z$
+    inputs, so repeated calls with the same grids reduce to a lookup.
+
+    Attributes:
+        maxSize (int)       : maximum number of cached results
+        maxBytes (int)      : maximum memory of all cached results [bytes]
+        nbytes (int)        : memory of all cached results [bytes]
+        hits (int)          : number of cache hits
+        misses (int)        : number of cache misses
+    """
+
+    def __init__(self, maxSize=128, maxBytes=64*1024**2):
+        """Initialize the class.
+
+        Args:
+            maxSize (Optional[int])  : maximum number of cached results,
+                                       default is 128.
+            maxBytes (Optional[int]) : maximum memory of all cached
+                                       results, default is 64 MiB.
+
+        """
+        self.maxSize    = maxSize
+        self.maxBytes   = maxBytes
+        self.nbytes     = 0
+        self.hits       = 0
+        self.misses     = 0
+        self._entries   = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def getKey(name, *args):
+        """getKey
+
+        Returns the cache key for the method name and its array inputs.
+        """
+        key = [name]
+        for arg in args:
+            arg = np.ascontiguousarray(arg)
+            key.append((arg.shape, arg.dtype.str, hashlib.sha1(arg.tobytes()).hexdigest()))
+        return tuple(key)
+
+    def get(self, key):
+        """get
+
+        Returns the cached result for the key or None and updates the
+        hit/miss statistics.
+        """
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """put
+
+        Adds a result to the cache and evicts the least recently used
+        results if the size limits are exceeded. Returns the cached
+        read-only result.
+        """
+        value = np.asarray(value)
+        if value.ndim == 0:
+            # store scalars as immutable numpy scalars
+            value = value[()]
+        else:
+            value.flags.writeable = False
+        if value.nbytes > self.maxBytes:
+            return value
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key).nbytes
+        self._entries[key] = value
+        self.nbytes += value.nbytes
+        while len(self._entries) > self.maxSize or self.nbytes > self.maxBytes:
+            self.nbytes -= self._entries.popitem(last=False)[1].nbytes
+        return value
+
+    def clear(self):
+        """clear
+
+        Removes all cached results and resets the statistics.
+        """
+        self._entries.clear()
+        self.nbytes = 0
+        self.hits   = 0
+        self.misses = 0
+
+    def getStatistics(self):
+        """getStatistics
+
+        Returns a dict with the cache statistics.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries),
+                'maxSize': self.maxSize, 'nbytes': self.nbytes, 'maxBytes': self.maxBytes}
+
+def _cachedFormFactor(func):
+    """_cachedFormFactor
+
+    Decorator for the form factor methods, which looks up the result in
+    the formFactorCache of the instance if the cache is enabled. Keyword
+    arguments are bound to their positions, so that positional and
+    keyword calls share the cache entries.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        cache = getattr(self, 'formFactorCache', None)
+        if cache is None:
+            return func(self, *args, **kwargs)
+        args = signature.bind(self, *args, **kwargs).args[1:]
+        key = cache.getKey(func.__name__, *args)
+        f = cache.get(key)
+        if f is None:
+            f = cache.put(key, func(self, *args))
+        return f
+    return wrapper
+
 class atom(object):
     """atom
 
@@ -43,6 +173,8 @@ class atom(object):
             form factor
         cromerMannCoeff (ndarray[float])       :
             cromer-mann coefficients for angular-dependent atomic form factor
+        formFactorCache (formFactorCache)      :
+            optional cache of the form factor results, default is None
     """
 
     def __init__(self, symbol, **kwargs):
@@ -58,13 +190,10 @@ class atom(object):
         self.symbol   = symbol
         self.ID       = kwargs.get('ID', symbol)
         self.ionicity = kwargs.get('ionicity', 0)
+        self.formFactorCache = None
 
         try:
-            filename = os.path.join(os.path.dirname(__file__), 'parameters/elements/elements.dat')
-            symbols  = np.genfromtxt(filename, dtype='U2', usecols = (0))
-            elements = np.genfromtxt(filename, dtype='U15,i8,f8', usecols=(1,2,3))
-            [rowIdx] = np.where(symbols == self.symbol)
-            element = elements[rowIdx[0]]
+            element = getParameterDatabase().getElement(self.symbol)
         except Exception as e:
             print('Cannot load element specific data from elements data file!')
             print(e)
@@ -72,9 +201,8 @@ class atom(object):
         self.name                   = element[0]
         self.atomicNumberZ          = element[1]
         self.massNumberA            = element[2]
-        self.mass                   = self.massNumberA * constants.atomic_mass
-        self.atomicFormFactorCoeff  = self.readAtomicFormFactorCoeff()
-        self.cromerMannCoeff        = self.readCromerMannCoeff()
+        self.mass                   = self.massNumberA * u.amu
+        self._loadParameterTables()
 
     def __str__(self):
         """String representation of this class
@@ -91,21 +219,68 @@ class atom(object):
         classStr += 'Cromer Mann coeff  : {:s}\n'.format(np.array_str(self.cromerMannCoeff))
         return(classStr)
 
+    def __getstate__(self):
+        """Returns the state of the atom for pickling. The parameter tables
+        are not pickled but are reloaded from the shared parameter database
+        and only the size limits of the form factor cache are kept.
+
+        """
+        state = self.__dict__.copy()
+        state.pop('atomicFormFactorCoeff', None)
+        state.pop('cromerMannCoeff', None)
+        if self.formFactorCache is not None:
+            state['formFactorCache'] = (self.formFactorCache.maxSize, self.formFactorCache.maxBytes)
+        return state
+
+    def __setstate__(self, state):
+        """Restores the pickled state of the atom.
+
+        """
+        cache = state.pop('formFactorCache', None)
+        self.__dict__.update(state)
+        self.formFactorCache = None if cache is None else formFactorCache(*cache)
+        self._loadParameterTables()
+
+    def _loadParameterTables(self):
+        """_loadParameterTables
+
+        Loads the atomic form factor and Cromer-Mann coefficients from the
+        parameter database.
+        """
+        self.atomicFormFactorCoeff  = self.readAtomicFormFactorCoeff()
+        self.cromerMannCoeff        = self.readCromerMannCoeff()
+
     def readAtomicFormFactorCoeff(self):
         """readAtomicFormFactorCoeff
 
         The atomic form factor $f$ in dependence from the energy $E$ is
-        read from a parameter file given by Ref. [3].
+        read from a parameter file given by Ref. [3]. The parsed table is
+        shared read-only between all atoms of the same element.
         """
-        filename = os.path.join(os.path.dirname(__file__), 'parameters/atomicFormFactors/{:s}.nff'.format(self.symbol.lower()))
         try:
-            f = np.genfromtxt(filename, skip_header=1)
+            f = getParameterDatabase().getAtomicFormFactorCoeff(self.symbol)
         except Exception as e:
-            print('File {:s} not found!\nMake sure the path /parameters/atomicFormFactors/ is in your search path!', filename)
+            print('File {:s}.nff not found!\nMake sure the path /parameters/atomicFormFactors/ is in your search path!'.format(self.symbol.lower()))
             print(e)
 
         return f
 
+    def enableFormFactorCache(self, maxSize=128, maxBytes=64*1024**2):
+        """enableFormFactorCache
+
+        Enables the caching of the results of getAtomicFormFactor and
+        getCMAtomicFormFactor with least-recently-used eviction.
+        """
+        self.formFactorCache = formFactorCache(maxSize, maxBytes)
+
+    def disableFormFactorCache(self):
+        """disableFormFactorCache
+
+        Disables the caching of the form factors and frees the cache.
+        """
+        self.formFactorCache = None
+
+    @_cachedFormFactor
     def getAtomicFormFactor(self, E):
         """getAtomicFormFactor
 
@@ -127,17 +302,18 @@ class atom(object):
 
         $$ a_1\; a_2\; a_3\; a_4\; b_1\; b_2\; b_3\; b_4\; c $$
         """
-        filename = os.path.join(os.path.dirname(__file__), 'parameters/atomicFormFactors/cromermann.txt')
         try:
-            cm = np.genfromtxt(filename, skip_header=1, usecols=(1,2,3,4,5,6,7,8,9,10,11))
+            cm = getParameterDatabase().getCromerMannCoeff(self.atomicNumberZ, self.ionicity)
         except Exception as e:
-            print('File {:s} not found!\nMake sure the path /parameters/atomicFormFactors/ is in your search path!', filename)
+            print('Cannot load Cromer-Mann coefficients for {:s} from cromermann.txt!'.format(self.symbol))
             print(e)
 
-        return cm[(cm[:,0] == self.atomicNumberZ) & (cm[:,1] == self.ionicity)][0]
+        # skip the columns of Z and ionicity
+        return cm[2:]
 
+    @_cachedFormFactor
     def getCMAtomicFormFactor(self, E, qz):
-        """getAtomicFormFactor
+        """getCMAtomicFormFactor
 
         Returns the atomic form factor $f$ in dependence of the energy
         $E$ [J] and the $z$-component of the scattering vector $q_z$
@@ -153,10 +329,8 @@ class atom(object):
         # $f_{CM}(q_z)$ is given in Ref. 1:
         #
         # $$f_{CM}(q_z) = \sum(a_i \, \exp(-b_i \, (q_z/4\pi)^2))+ c$$
-        # print(np.exp(-self.cromerMannCoeff[4:7].T * (qz/(4*np.pi))**2))
-        f_CM = np.dot(self.cromerMannCoeff[0:3] ,
-                np.exp(np.dot(-self.cromerMannCoeff[4:7], (qz/(4*np.pi))**2))) \
-                + self.cromerMannCoeff[8];
+        f_CM = np.dot(np.exp(-np.multiply.outer((qz/(4*np.pi))**2, self.cromerMannCoeff[4:8])),
+                self.cromerMannCoeff[0:4]) + self.cromerMannCoeff[8];
 
         # $\delta f_1(E)$ is the dispersion correction:
         #
@@ -168,7 +342,7 @@ class atom(object):
         #
         # $$ f(q_z,E) = \sum(a_i \, \exp(b_i \, q_z/2\pi)) + f_1(E) -\i f_2(E) - \sum(a_i) $$
         return f_CM + self.getAtomicFormFactor(E) \
-            - (np.sum(self.cromerMannCoeff[0:3]) + self.cromerMannCoeff[8]);
+            - (np.sum(self.cromerMannCoeff[0:4]) + self.cromerMannCoeff[8]);
 
 class atomMixed(atom):
     """mixed atom
@@ -192,6 +366,8 @@ class atomMixed(atom):
             form factor
         cromerMannCoeff (ndarray[float])       :
             cromer-mann coefficients for angular-dependent atomic form factor
+        formFactorCache (formFactorCache)      :
+            optional cache of the form factor results, default is None
     """
 
     def __init__(self, symbol, **kwargs):
@@ -214,6 +390,7 @@ class atomMixed(atom):
         self.atoms          = []
         self.numAtoms       = 0
         self.cromerMannCoeff= np.array([])
+        self.formFactorCache= None
 
     def __str__(self):
         """String representation of this class
@@ -227,42 +404,249 @@ class atomMixed(atom):
         return(classStr)
 
 
+    def _loadParameterTables(self):
+        """_loadParameterTables
+
+        The mixed atom has no parameter tables of its own, its constituents
+        reload their tables when they are unpickled.
+        """
+        self.cromerMannCoeff = np.array([])
+
     def addAtom(self, atom,fraction):
         """addAtom
 
         Add a atomBase instance with its stochiometric fraction to the
         atomMixed instance.
         """
-        self.atoms.append([atom, fraction])
-        self.numAtoms = self.numAtoms + 1
+        self.addAtoms([atom], [fraction])
+
+    def addAtoms(self, atoms, fractions):
+        """addAtoms
+
+        Adds a list of atomBase instances with the vector of their
+        stochiometric fractions to the atomMixed instance. The mixed
+        atomic properties are updated by one matrix product.
+        """
+        if len(atoms) != len(fractions):
+            raise ValueError('The number of atoms and fractions must be the same!')
+        fractions = np.asarray(fractions, dtype=float)
+        self.atoms.extend([a, x] for a, x in zip(atoms, fractions.tolist()))
+        self.numAtoms = self.numAtoms + len(atoms)
         # calculate the mixed atomic properties of the atomMixed
         # instance
-        self.atomicNumberZ = self.atomicNumberZ + fraction * atom.atomicNumberZ;
-        self.massNumberA   = self.massNumberA   + fraction * atom.massNumberA;
-        self.mass          = self.mass          + fraction * atom.mass;
-        self.ionicity      = self.ionicity      + fraction * atom.ionicity;
-
+        Z, A, mass, ionicity = np.dot(fractions, _getAtomProperties(atoms))
+        self.atomicNumberZ = self.atomicNumberZ + Z
+        self.massNumberA   = self.massNumberA   + A
+        self.mass          = self.mass          + mass
+        self.ionicity      = self.ionicity      + ionicity
+        # cached form factors are outdated
+        if self.formFactorCache is not None:
+            self.formFactorCache.clear()
+
+    @_cachedFormFactor
     def getAtomicFormFactor(self, E):
         """getAtomicFormFactor
 
-        Returns the mixed energy dependent atomic form factor.
+        Returns the mixed energy dependent atomic form factor. The form
+        factors of all constituents are interpolated in a single pass.
         """
-        f = 0
-        for i in range(self.numAtoms):
-            f += self.atoms[i][0].getAtomicFormFactor(E) * self.atoms[i][1]
-
-        return f
+        constituents, weights = _expandAtoms([self])
+        f1, f2 = _interpAtomicFormFactorCoeff(constituents, np.atleast_1d(E)/u.eV)
+        return np.dot(weights, f1 - f2*1j)[0].reshape(np.shape(E))[()]
 
+    @_cachedFormFactor
     def getCMAtomicFormFactor(self,E,qz):
         """getCMAtomicFormFactor
 
         Returns the mixed energy and angle dependent atomic form factor.
+        The form factors of all constituents are evaluated in a single
+        vectorized pass, see getCMAtomicFormFactors.
         """
-        f = 0
-        for i in range(self.numAtoms):
-            f += self.atoms[i][0].getCMAtomicFormFactor(E,qz) * self.atoms[i][1]
+        f = getCMAtomicFormFactors([self], np.atleast_1d(E), np.atleast_1d(qz))[0]
+        # reduce the singleton dimensions of scalar inputs
+        return f.reshape(np.shape(E) + np.shape(qz))
 
-        return f
+class atomComposition(object):
+    """atomComposition
+
+    The atomComposition class describes a series of mixed atoms of the same
+    constituents, e.g. the steps of a compositionally graded layer, by the
+    (N x constituents) array of their stochiometric fractions. The
+    properties and form factors of all N compositions are calculated by one
+    matrix product of the fractions with the stacked properties and form
+    factors of the constituents.
+
+    Attributes:
+        symbol (str)                    : symbol of the compositions
+        ID (str)                        : identifier of the compositions
+        atoms (list[atom])              : constituents
+        fractions (ndarray[float])      : (N x constituents) fractions
+        atomicNumberZ (ndarray[float])  : Z atomic numbers
+        massNumberA (ndarray[float])    : A atomic mass numbers
+        ionicity (ndarray[float])       : ionicities
+        mass (ndarray[float])           : masses of the atoms [kg]
+    """
+
+    def __init__(self, symbol, atoms, fractions, **kwargs):
+        """Initialize the class.
+
+        Args:
+            symbol (str)                : symbol of the compositions
+            atoms (list[atom])          : constituents
+            fractions (ndarray[float])  : (N x constituents) fractions
+            ID (Optional[str])          : default is the symbol
+
+        """
+        self.symbol     = symbol
+        self.ID         = kwargs.get('ID', symbol)
+        self.atoms      = list(atoms)
+        self.fractions  = np.atleast_2d(np.asarray(fractions, dtype=float))
+        if self.fractions.shape[1] != len(self.atoms):
+            raise ValueError('The fractions must have one column per constituent!')
+        self.atomicNumberZ, self.massNumberA, self.mass, self.ionicity = \
+            np.dot(self.fractions, _getAtomProperties(self.atoms)).T
+        self._mixedAtoms = None
+
+    def __str__(self):
+        """String representation of this class
+
+        """
+        classStr  = 'Atom composition with the following properties\n'
+        classStr += 'ID                 : {:s}\n'.format(self.ID)
+        classStr += 'symbol             : {:s}\n'.format(self.symbol)
+        classStr += 'compositions       : {:d}\n'.format(len(self))
+        for a, x in zip(self.atoms, self.fractions.T):
+            classStr += '\t {:s} \t {:3.2f}% - {:3.2f}%\n'.format(a.name, x.min()*100, x.max()*100)
+        return(classStr)
+
+    def __len__(self):
+        return len(self.fractions)
+
+    def getAtomicFormFactors(self, E):
+        """getAtomicFormFactors
+
+        Returns the (N x E) energy dependent atomic form factors of all
+        compositions.
+        """
+        constituents, weights = _expandAtoms(self.atoms)
+        f1, f2 = _interpAtomicFormFactorCoeff(constituents, np.atleast_1d(E)/u.eV)
+        return np.dot(np.dot(self.fractions, weights), f1 - f2*1j)
+
+    def getCMAtomicFormFactors(self, E, qz):
+        """getCMAtomicFormFactors
+
+        Returns the (N x E x qz) energy and angle dependent atomic form
+        factors of all compositions, see getCMAtomicFormFactors.
+        """
+        return np.tensordot(self.fractions, getCMAtomicFormFactors(self.atoms, E, qz), axes=1)
+
+    def getMixedAtoms(self):
+        """getMixedAtoms
+
+        Returns the list of the atomMixed instances of all compositions,
+        whose IDs are numbered. The list is created only once.
+        """
+        if self._mixedAtoms is None:
+            self._mixedAtoms = []
+            for i, x in enumerate(self.fractions):
+                a = atomMixed(self.symbol, ID='{:s}_{:d}'.format(self.ID, i))
+                a.addAtoms(self.atoms, x)
+                self._mixedAtoms.append(a)
+        return self._mixedAtoms
+
+def _getAtomProperties(atoms):
+    """_getAtomProperties
+
+    Returns the (atoms x 4) array of the atomic number, the mass number,
+    the mass and the ionicity of the atoms.
+    """
+    return np.array([[a.atomicNumberZ, a.massNumberA, a.mass, a.ionicity] for a in atoms],
+                    dtype=float).reshape(-1, 4)
+
+def getCMAtomicFormFactors(atoms, E, qz):
+    """getCMAtomicFormFactors
+
+    Returns the energy and angle dependent atomic form factors of a list of
+    atom/atomMixed instances for the energies $E$ [J] and the $z$-component
+    of the scattering vectors $q_z$ [m^-1] as complex array of shape
+    (atoms x E x qz), see atom.getCMAtomicFormFactor.
+
+    The mixed atoms are expanded into their unique constituents whose
+    Cromer-Mann coefficients are stacked into a matrix and whose $f_1$ and
+    $f_2$ tables are interpolated at once. The form factors of the atoms
+    are then given by the product of the fractions with the form factors
+    of the constituents.
+    """
+    E  = np.atleast_1d(E)/u.eV # convert energy from [J] in [eV]
+    qz = np.atleast_1d(qz)/u.angstrom**-1 # qz in [Ang^-1]
+    constituents, weights = _expandAtoms(atoms)
+
+    cm = np.array([a.cromerMannCoeff for a in constituents])
+    f_CM = np.einsum('qui,ui->qu', np.exp(-np.multiply.outer((qz/(4*np.pi))**2, cm[:,4:8])),
+                     cm[:,0:4]) + cm[:,8] # (qz x constituents)
+    f1, f2 = _interpAtomicFormFactorCoeff(constituents, E)
+
+    f = f_CM.T[:,np.newaxis,:] + (f1 - f2*1j)[:,:,np.newaxis] \
+        - (np.sum(cm[:,0:4], axis=1) + cm[:,8])[:,np.newaxis,np.newaxis]
+    return np.tensordot(weights, f, axes=1)
+
+def _expandAtoms(atoms):
+    """_expandAtoms
+
+    Returns the list of unique non-mixed atoms which are contained in the
+    given atoms and the (atoms x unique atoms) matrix of their fractions.
+    """
+    constituents = []
+    keys = {}
+    rows = []
+    for atom in atoms:
+        stack = [(atom, 1.0)]
+        row = {}
+        while stack:
+            a, fraction = stack.pop()
+            if isinstance(a, atomMixed):
+                stack.extend((b, fraction*x) for b, x in a.atoms)
+                continue
+            key = (a.symbol, a.ionicity)
+            if key not in keys:
+                keys[key] = len(constituents)
+                constituents.append(a)
+            row[keys[key]] = row.get(keys[key], 0) + fraction
+        rows.append(row)
+
+    weights = np.zeros([len(atoms), len(constituents)])
+    for i, row in enumerate(rows):
+        for j, fraction in row.items():
+            weights[i, j] = fraction
+    return constituents, weights
+
+def _interpAtomicFormFactorCoeff(atoms, E):
+    """_interpAtomicFormFactorCoeff
+
+    Linear interpolation of the $f_1$ and $f_2$ tables of all atoms for
+    the energies $E$ [eV] in one pass. The tables are concatenated with an
+    energy offset per atom, so that a single sorted search finds the
+    interpolation intervals of all atoms. As for np.interp, energies
+    outside of a table are clipped to its boundaries.
+    """
+    tables  = [a.atomicFormFactorCoeff for a in atoms]
+    lengths = np.array([len(t) for t in tables])
+    starts  = np.cumsum(lengths) - lengths
+    table   = np.concatenate(tables)
+    eMin    = np.array([t[0,0] for t in tables])
+    eMax    = np.array([t[-1,0] for t in tables])
+    shift   = np.arange(len(tables)) * (np.max(eMax) - np.min(eMin) + 1)
+
+    x = table[:,0] + np.repeat(shift, lengths)
+    E = np.clip(E[np.newaxis,:], eMin[:,np.newaxis], eMax[:,np.newaxis])
+    idx = np.searchsorted(x, E + shift[:,np.newaxis], side='right') - 1
+    idx = np.clip(idx, starts[:,np.newaxis], (starts + lengths - 2)[:,np.newaxis])
+    # the weights are calculated without the offsets to avoid their round-off
+    w = (E - table[idx,0])/(table[idx+1,0] - table[idx,0])
+
+    f1 = table[idx,1] + w*(table[idx+1,1] - table[idx,1])
+    f2 = table[idx,2] + w*(table[idx+1,2] - table[idx,2])
+    return f1, f2
 
 # References
 #
@@ -0,0 +1,101 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+"""benchmarkChunkedMap
+
+Benchmark of the chunked storage of time-resolved maps. A smooth
+(time x N) map, similar to a temperature map, is written chunk by chunk
+with and without compression. The write time, the size on disk, the peak
+memory of the writing and the read times of a single time step and of a
+single unit cell are reported.
+
+Usage:
+    python benchmarkChunkedMap.py [--cells 100000] [--steps 500] [--chunkSize 50] [--path DIR]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import importlib
+import tracemalloc
+import numpy as np
+
+modulePath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(modulePath))
+ud = importlib.import_module(os.path.basename(modulePath))
+
+
+def iterMap(cells, steps, chunkSize):
+    """iterMap
+
+    Yields the chunks of a smooth map of a heat pulse diffusing into the
+    depth of the sample as tuples of the time vector and the data.
+    """
+    z = np.arange(cells)/100
+    for start in range(0, steps, chunkSize):
+        t = np.arange(start, min(start + chunkSize, steps)) + 1.
+        yield t, 300 + 100/np.sqrt(t[:, np.newaxis])*np.exp(-z**2/t[:, np.newaxis])
+
+
+def getDiskSize(path):
+    """getDiskSize
+
+    Returns the size of all files in the directory [bytes].
+    """
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the chunked storage of maps')
+    parser.add_argument('--cells', type=int, default=100000, help='number of unit cells')
+    parser.add_argument('--steps', type=int, default=500, help='number of time steps')
+    parser.add_argument('--chunkSize', type=int, default=50, help='time steps per chunk')
+    parser.add_argument('--path', default=None, help='directory of the maps')
+    args = parser.parse_args()
+
+    base = args.path if args.path is not None else tempfile.mkdtemp()
+    print('map of {:d} time steps x {:d} unit cells ({:3.1f} MiB)'.format(
+        args.steps, args.cells, args.steps*args.cells*8/1024**2))
+    print('{:>12s} {:>10s} {:>12s} {:>12s} {:>14s} {:>14s}'.format(
+        'compression', 'write [s]', 'disk [MiB]', 'peak [MiB]', 'time step [ms]', 'unit cell [ms]'))
+    try:
+        for compress in [False, True]:
+            path = os.path.join(base, 'compressed' if compress else 'uncompressed')
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            ud.chunkedMap(path, shape=(args.cells,), compress=compress, overwrite=True).write(
+                iterMap(args.cells, args.steps, args.chunkSize))
+            tWrite = time.perf_counter() - t0
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            M = ud.chunkedMap(path)
+            t0 = time.perf_counter()
+            M[args.steps//2]
+            tStep = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            M[:, args.cells//2]
+            tCell = time.perf_counter() - t0
+            print('{:>12s} {:10.2f} {:12.1f} {:12.1f} {:14.2f} {:14.2f}'.format(
+                str(compress), tWrite, getDiskSize(path)/1024**2, peak/1024**2,
+                tStep*1e3, tCell*1e3))
+    finally:
+        if args.path is None:
+            shutil.rmtree(base)
@@ -0,0 +1,111 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+"""benchmarkGradedLayer
+
+Benchmark of compositionally graded SrTi(1-x)Ru(x)O3 layers with an
+increasing number of composition steps. The build time of a layer with
+one atomMixed and one unitCell per step by script is compared to
+structure.addGradedSubStructure with an atomComposition, and the time of
+the form factors of all steps by a loop over the mixed atoms is compared
+to the single matrix product of atomComposition.getCMAtomicFormFactors.
+
+Usage:
+    python benchmarkGradedLayer.py [--steps 100 1000 10000] [--qz 1000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import importlib
+import numpy as np
+import numericalunits as u
+
+modulePath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(modulePath))
+ud = importlib.import_module(os.path.basename(modulePath))
+u.reset_units('SI')
+
+Sr = ud.atom('Sr')
+Ti = ud.atom('Ti')
+Ru = ud.atom('Ru')
+O  = ud.atom('O')
+
+
+def buildByScript(x, c):
+    """buildByScript
+
+    Returns the graded layer with one atomMixed and one unitCell per
+    composition step.
+    """
+    S = ud.structure('graded layer')
+    for i in range(len(x)):
+        B = ud.atomMixed('B', ID='B_{:d}'.format(i))
+        B.addAtom(Ti, 1 - x[i])
+        B.addAtom(Ru, x[i])
+        UC = ud.unitCell('UC_B_{:d}'.format(i), 'SrTiRuO3', c[i], soundVel=7.8*u.nm/u.ps,
+                         heatCapacity=['lambda T: 455.2 + 0.112*T'])
+        UC.addAtoms([Sr, B, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+        S.addSubStructure(UC, 1)
+    return S
+
+
+def buildByComposition(x, c):
+    """buildByComposition
+
+    Returns the graded layer of an atomComposition and copies of a single
+    template unitCell.
+    """
+    composition = ud.atomComposition('B', [Ti, Ru], np.stack([1 - x, x], axis=1))
+    B = ud.atom('Ti')
+    UC = ud.unitCell('UC', 'SrTiRuO3', c[0], soundVel=7.8*u.nm/u.ps,
+                     heatCapacity=['lambda T: 455.2 + 0.112*T'])
+    UC.addAtoms([Sr, B, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+    S = ud.structure('graded layer')
+    S.addGradedSubStructure(UC, composition, B, cAxis=c)
+    return S, composition
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of compositionally graded layers')
+    parser.add_argument('--steps', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--qz', type=int, default=1000, help='number of qz points')
+    args = parser.parse_args()
+
+    E  = 8*u.keV
+    qz = np.linspace(1, 5, args.qz)/u.angstrom
+    print('{:>8s} {:>11s} {:>12s} {:>11s} {:>14s} {:>10s}'.format(
+        'steps', 'script [s]', 'helper [s]', 'loop [s]', 'product [s]', 'max. dF'))
+    for steps in args.steps:
+        x = np.linspace(0, 1, steps)
+        c = (3.905 + 0.045*x)*u.angstrom
+        t0 = time.perf_counter()
+        buildByScript(x, c)
+        tScript = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        S, composition = buildByComposition(x, c)
+        tHelper = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        FLoop = np.array([a.getCMAtomicFormFactor(E, qz) for a in composition.getMixedAtoms()])
+        tLoop = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        F = composition.getCMAtomicFormFactors(E, qz)[:, 0, :]
+        tProduct = time.perf_counter() - t0
+        print('{:8d} {:11.3f} {:12.3f} {:11.3f} {:14.4f} {:10.1e}'.format(
+            steps, tScript, tHelper, tLoop, tProduct, np.max(np.abs(F - FLoop))))
@@ -0,0 +1,109 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+"""benchmarkHeat
+
+Benchmark of the heat diffusion engine for a two-temperature model of a
+metal film on a substrate with 10^4 to 10^5 unit cells. The run time per
+internal time step, the peak memory of the streamed temperature map and
+the error of the energy balance are reported.
+
+Usage:
+    python benchmarkHeat.py [--cells 10000 30000 100000] [--steps 200]
+"""
+
+import os
+import sys
+import time
+import argparse
+import importlib
+import tracemalloc
+import numpy as np
+import numericalunits as u
+
+modulePath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(modulePath))
+ud = importlib.import_module(os.path.basename(modulePath))
+u.reset_units('SI')
+
+
+def buildStructure(numCells):
+    """buildStructure
+
+    Returns a structure of a metal film of a tenth of the unit cells on a
+    substrate with a two-temperature model.
+    """
+    Sr = ud.atom('Sr')
+    Ti = ud.atom('Ti')
+    O  = ud.atom('O')
+    kwargs = {'thermCond': ['lambda T: 100', 'lambda T: 10'],
+              'linThermExp': ['lambda T: 0', 'lambda T: 1e-5'],
+              'subSystemCoupling': ['lambda T: -5e17*(T[0]-T[1])', 'lambda T: 5e17*(T[0]-T[1])']}
+    film = ud.unitCell('film', 'film', 3.9*u.angstrom, optPenDepth=20*u.nm,
+                       heatCapacity=['lambda T: 0.1*T', 'lambda T: 450 + 0.1*T'], **kwargs)
+    sub  = ud.unitCell('sub', 'sub', 3.9*u.angstrom, optPenDepth=np.inf,
+                       heatCapacity=['lambda T: 0.1*T', 'lambda T: 550'], **kwargs)
+    for UC in [film, sub]:
+        UC.addAtoms([Sr, Ti, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+    S = ud.structure('sample')
+    S.addSubStructure(film, numCells//10)
+    S.addSubStructure(sub, numCells - numCells//10)
+    return S
+
+
+def runBenchmark(numCells, steps):
+    """runBenchmark
+
+    Returns the run time [s], the peak memory [bytes] and the relative
+    error of the energy balance of a heat simulation.
+    """
+    S = buildStructure(numCells)
+    fluence = 5*u.mJ/u.cm**2
+    H = ud.heat(S, excitation={'fluence': [fluence], 'delayPump': [0], 'pulseWidth': [0]},
+                maxTimeStep=0.1*u.ps)
+    t = np.linspace(0, steps*0.1, steps + 1)*u.ps
+    props = S.getUnitCellPropertyVectors(types=['cAxis', 'density'])
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    for tChunk, TChunk in H.iterTempMap(t, chunkSize=50):
+        TLast = TChunk[-1]
+    runTime = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # energy per area of the final temperatures with the analytic heat capacities
+    E = props['density']*props['cAxis']*(0.05*(TLast[:, 0]**2 - 300**2)
+                                         + np.where(np.arange(numCells) < numCells//10,
+                                                    450*(TLast[:, 1] - 300) + 0.05*(TLast[:, 1]**2 - 300**2),
+                                                    550*(TLast[:, 1] - 300)))
+    absorbed = fluence*H.getAbsorptionProfile().sum()
+    return runTime, peak, abs(E.sum() - absorbed)/absorbed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the heat diffusion engine')
+    parser.add_argument('--cells', type=int, nargs='+', default=[10000, 30000, 100000])
+    parser.add_argument('--steps', type=int, default=200)
+    args = parser.parse_args()
+
+    print('{:>10s} {:>10s} {:>14s} {:>12s} {:>12s}'.format('cells', 'time [s]', 'per step [ms]',
+                                                          'peak [MiB]', 'energy err.'))
+    for numCells in args.cells:
+        runTime, peak, err = runBenchmark(numCells, args.steps)
+        print('{:10d} {:10.2f} {:14.2f} {:12.1f} {:12.2e}'.format(numCells, runTime,
+              runTime/args.steps*1e3, peak/2**20, err))
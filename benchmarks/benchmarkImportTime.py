@@ -0,0 +1,113 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+"""benchmarkImportTime
+
+Reproducible benchmark of the import time of the module. The module is
+imported in fresh interpreters with -X importtime, the median of the
+cumulative import times of the module and of numpy as baseline are
+reported, and it is checked that no heavy dependency is loaded on import
+or during the construction of atoms, unit cells and structures.
+
+Usage:
+    python benchmarkImportTime.py [--repeat 7] [--max-overhead 0.2]
+
+The benchmark fails, if a heavy module is loaded or if the import time
+of the module without numpy exceeds the given maximum overhead [s].
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+import numpy as np
+
+modulePath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+moduleName = os.path.basename(modulePath)
+
+heavyModules = ['sympy', 'scipy', 'matplotlib', 'h5py', 'more_itertools']
+
+buildScript = """
+import sys
+import {0:s} as ud
+O  = ud.atom('O')
+Sr = ud.atom('Sr')
+Ti = ud.atom('Ti')
+STO = ud.unitCell('STO', 'STO', 3.905e-10, soundVel=8000, heatCapacity='lambda T: 400 + T')
+STO.addAtoms([Sr, Ti, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+S = ud.structure('sample')
+S.addSubStructure(STO, 100)
+S.getLength()
+print(' '.join(m for m in {1:s} if m in sys.modules))
+"""
+
+
+def getImportTime(module):
+    """getImportTime
+
+    Returns the cumulative import time [s] of the module in a fresh
+    interpreter.
+    """
+    res = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                         cwd=os.path.dirname(modulePath), capture_output=True, text=True)
+    for line in res.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1])*1e-6
+    raise RuntimeError('Import of {:s} failed:\n{:s}'.format(module, res.stderr))
+
+
+def getLoadedHeavyModules(script):
+    """getLoadedHeavyModules
+
+    Returns the list of heavy modules loaded by the script.
+    """
+    res = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(modulePath),
+                         capture_output=True, text=True)
+    if res.returncode != 0:
+        raise RuntimeError(res.stderr)
+    return res.stdout.split()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import time benchmark of ' + moduleName)
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--max-overhead', type=float, default=0.2,
+                        help='maximum import time without numpy [s]')
+    args = parser.parse_args()
+
+    tModule = np.median([getImportTime(moduleName) for i in range(args.repeat)])
+    tNumpy  = np.median([getImportTime('numpy') for i in range(args.repeat)])
+    print('import {:s} : {:7.1f} ms'.format(moduleName, tModule*1e3))
+    print('import numpy{:s} : {:7.1f} ms'.format(' '*(len(moduleName)-5), tNumpy*1e3))
+    print('overhead{:s} : {:7.1f} ms'.format(' '*(len(moduleName)-1), (tModule - tNumpy)*1e3))
+
+    failed  = False
+    loaded  = getLoadedHeavyModules('import sys\nimport {:s}\nprint(" ".join(m for m in {:s} '
+                                    'if m in sys.modules))'.format(moduleName, str(heavyModules)))
+    if loaded:
+        print('heavy modules loaded on import: {:s}'.format(', '.join(loaded)))
+        failed = True
+    loaded  = getLoadedHeavyModules(buildScript.format(moduleName, str(heavyModules)))
+    if loaded:
+        print('heavy modules loaded on construction: {:s}'.format(', '.join(loaded)))
+        failed = True
+    if tModule - tNumpy > args.max_overhead:
+        print('import overhead exceeds {:3.2f} s'.format(args.max_overhead))
+        failed = True
+
+    sys.exit(1 if failed else 0)
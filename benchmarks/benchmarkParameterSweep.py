@@ -0,0 +1,99 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+"""benchmarkParameterSweep
+
+Benchmark of a parameter sweep over the film thickness and the sound
+velocity of an SRO film on an STO substrate. Every variant runs a phonon
+simulation of a step-like thermal strain and the kinematical X-ray
+diffraction of the strain map. The sweep is run in the current process
+and in a pool of processes and the wall-clock times, the mean run time
+per task and the pickled sizes of the base structure and of an atom are
+reported.
+
+Usage:
+    python benchmarkParameterSweep.py [--processes 4] [--thicknesses 10 20 30 40] [--soundVels 5 6 7]
+"""
+
+import os
+import sys
+import time
+import pickle
+import argparse
+import importlib
+import numpy as np
+import numericalunits as u
+
+modulePath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(modulePath))
+ud = importlib.import_module(os.path.basename(modulePath))
+u.reset_units('SI')
+
+
+def buildSample():
+    """buildSample
+
+    Returns a sample of 20 SRO unit cells on 500 STO unit cells.
+    """
+    Sr = ud.atom('Sr')
+    Ti = ud.atom('Ti')
+    Ru = ud.atom('Ru')
+    O  = ud.atom('O')
+    STO = ud.unitCell('STO', 'STO', 3.905*u.angstrom, soundVel=7.8*u.nm/u.ps)
+    STO.addAtoms([Sr, Ti, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+    SRO = ud.unitCell('SRO', 'SRO', 3.95*u.angstrom, soundVel=6.3*u.nm/u.ps,
+                      linThermExp=1e-5)
+    SRO.addAtoms([Sr, Ru, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+    S = ud.structure('SRO/STO')
+    S.addSubStructure(SRO, 20)
+    S.addSubStructure(STO, 500)
+    return S
+
+
+def simulate(S):
+    """simulate
+
+    Returns the (time x qz) reflectivities of the variant for a heating of
+    the SRO film by 100 K.
+    """
+    time = np.linspace(0, 40, 41)*u.ps
+    tempMap = np.full((len(time), S.getNumberOfUnitCells()), 300.)
+    tempMap[1:, S.compile().indices == 0] = 400.
+    strainMap = ud.phonon(S).getStrainMap(time, tempMap)
+    qz = np.linspace(3.1, 3.3, 300)/u.angstrom
+    return ud.xrayKin(S, 8e3*u.eV, qz, strainBinWidth=1e-5).getReflectivity(strainMap)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of a parameter sweep')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--thicknesses', type=int, nargs='+', default=[10, 20, 30, 40])
+    parser.add_argument('--soundVels', type=float, nargs='+', default=[5, 6, 7],
+                        help='sound velocities of SRO [nm/ps]')
+    args = parser.parse_args()
+
+    S = buildSample()
+    grid = {'SRO.N': args.thicknesses, 'SRO.soundVel': [v*u.nm/u.ps for v in args.soundVels]}
+    print('pickled base structure : {:d} bytes'.format(len(pickle.dumps(S))))
+    print('pickled atom           : {:d} bytes'.format(len(pickle.dumps(ud.atom('Sr')))))
+
+    for processes in sorted({1, args.processes}):
+        sweep = ud.parameterSweep(S, simulate, grid, processes=processes, verbose=False)
+        t0 = time.perf_counter()
+        R = sweep.run()
+        print('{:d} processes: {:3.2f} s wall-clock, {:3.2f} s per task, results {:s}'.format(
+            processes, time.perf_counter() - t0, np.mean(sweep.times), str(R.shape)))
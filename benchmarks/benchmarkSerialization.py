@@ -0,0 +1,117 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+"""benchmarkSerialization
+
+Benchmark of the serialization of large samples. A sample of many unique
+unit cells with temperature-dependent material functions is built by
+script, saved with saveSample and loaded again in the current process
+and in a fresh process. The times of building, saving and loading, the
+file sizes and whether the fingerprints of the built and the loaded
+sample agree are reported. The fresh process also checks that loading
+does not import sympy.
+
+Usage:
+    python benchmarkSerialization.py [--unitCells 100 1000] [--repeats 10]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import importlib
+import subprocess
+import numericalunits as u
+
+modulePath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(modulePath))
+ud = importlib.import_module(os.path.basename(modulePath))
+u.reset_units('SI')
+
+loadScript = '''
+import sys, time, importlib
+sys.path.insert(0, {:s})
+t0 = time.perf_counter()
+ud = importlib.import_module({:s})
+S = ud.loadSample({:s})
+print(time.perf_counter() - t0, S.getFingerprint(), 'sympy' in sys.modules)
+'''
+
+
+def buildSample(numUnitCells, repeats):
+    """buildSample
+
+    Returns a superlattice of repeats bilayers of numUnitCells unique unit
+    cells of an SRO/STO gradient.
+    """
+    Sr = ud.atom('Sr')
+    Ti = ud.atom('Ti')
+    Ru = ud.atom('Ru')
+    O  = ud.atom('O')
+    bilayer = ud.structure('bilayer')
+    for i in range(numUnitCells):
+        x = i/max(numUnitCells - 1, 1)
+        UC = ud.unitCell('UC{:d}'.format(i), 'SrTiRuO3', (3.905 + 0.045*x)*u.angstrom,
+                         soundVel=(7.8 - 1.5*x)*u.nm/u.ps, optPenDepth=20*u.nm,
+                         heatCapacity=['lambda T: 455.2 + 0.112*T - 2.1935e6/T**2'],
+                         thermCond=['lambda T: 12*(300/T)'],
+                         linThermExp=['lambda T: 1e-5*(1 + 1e-3*T)'],
+                         subSystemCoupling=[0])
+        B = ud.atomMixed('B{:d}'.format(i))
+        B.addAtom(Ti, 1 - x)
+        B.addAtom(Ru, x)
+        UC.addAtoms([Sr, B, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+        # the anti-derivatives are stored as numpy code
+        UC.intHeatCapacity
+        UC.intLinThermExp
+        bilayer.addSubStructure(UC, 1)
+    S = ud.structure('gradient superlattice')
+    S.addSubStructure(bilayer, repeats)
+    return S
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the serialization of samples')
+    parser.add_argument('--unitCells', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--repeats', type=int, default=10)
+    args = parser.parse_args()
+
+    print('{:>10s} {:>10s} {:>9s} {:>9s} {:>9s} {:>10s} {:>11s} {:>7s}'.format(
+        'unit cells', 'build [s]', 'save [s]', 'load [s]', 'size [kB]', 'fresh [s]',
+        'fingerprint', 'sympy'))
+    with tempfile.TemporaryDirectory() as path:
+        for numUnitCells in args.unitCells:
+            t0 = time.perf_counter()
+            S = buildSample(numUnitCells, args.repeats)
+            tBuild = time.perf_counter() - t0
+            filename = os.path.join(path, 'sample{:d}.json.gz'.format(numUnitCells))
+            t0 = time.perf_counter()
+            ud.saveSample(S, filename)
+            tSave = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            S2 = ud.loadSample(filename)
+            tLoad = time.perf_counter() - t0
+            fingerprint = S.getFingerprint()
+
+            script = loadScript.format(repr(os.path.dirname(modulePath)),
+                                       repr(os.path.basename(modulePath)), repr(filename))
+            out = subprocess.run([sys.executable, '-c', script], capture_output=True,
+                                 text=True, check=True).stdout.split()
+            print('{:10d} {:10.3f} {:9.3f} {:9.3f} {:9.1f} {:10.3f} {:>11s} {:>7s}'.format(
+                numUnitCells, tBuild, tSave, tLoad, os.path.getsize(filename)/1024, float(out[0]),
+                str(S2.getFingerprint() == fingerprint and out[1] == fingerprint), out[2]))
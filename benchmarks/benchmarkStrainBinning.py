@@ -0,0 +1,121 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+"""benchmarkStrainBinning
+
+Benchmark of the strain binning of the kinematical and dynamical X-ray
+diffraction for a phonon-like strain map of an SRO film on an STO
+substrate, i.e. a thermal expansion of the film and a bipolar strain pulse
+which travels into the substrate. The run times with binned strains are
+compared to the run times without binning, and the reuse factors, the
+binning errors of the strains and the relative errors of the
+reflectivities are reported.
+
+Usage:
+    python benchmarkStrainBinning.py [--steps 40] [--qz 300] [--binWidths 1e-5 1e-4]
+"""
+
+import os
+import sys
+import time
+import argparse
+import importlib
+import numpy as np
+import numericalunits as u
+
+modulePath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(modulePath))
+ud = importlib.import_module(os.path.basename(modulePath))
+u.reset_units('SI')
+
+
+def buildSample():
+    """buildSample
+
+    Returns a sample of 50 SRO unit cells on 1000 STO unit cells.
+    """
+    Sr = ud.atom('Sr')
+    Ti = ud.atom('Ti')
+    Ru = ud.atom('Ru')
+    O  = ud.atom('O')
+    STO = ud.unitCell('STO', 'STO', 3.905*u.angstrom)
+    STO.addAtoms([Sr, Ti, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+    SRO = ud.unitCell('SRO', 'SRO', 3.95*u.angstrom)
+    SRO.addAtoms([Sr, Ru, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+    S = ud.structure('SRO/STO')
+    S.addSubStructure(SRO, 50)
+    S.addSubStructure(STO, 1000)
+    return S
+
+
+def getStrainMap(S, steps):
+    """getStrainMap
+
+    Returns a (steps x N) strain map of a thermal expansion of the film
+    and a bipolar strain pulse travelling with the sound velocity into
+    the substrate.
+    """
+    z = S.getDistancesOfUnitCells()[0]
+    film = 50*3.95*u.angstrom
+    t = np.linspace(0, 60, steps)[:, np.newaxis]*u.ps
+    v = 8*u.nm/u.ps
+    w = 5*u.nm
+    expansion = 5e-3*(z < film)*(1 - np.exp(-t/(2*u.ps)))
+    x = (z - film - v*t)/w
+    pulse = -5e-3*x*np.exp(-x**2)*(z > film)
+    return expansion + pulse
+
+
+def run(X, strainMap):
+    """run
+
+    Returns the reflectivities of the strain map and the run time [s].
+    """
+    t0 = time.perf_counter()
+    R = X.getReflectivity(strainMap)
+    return R, time.perf_counter() - t0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the strain binning')
+    parser.add_argument('--steps', type=int, default=40, help='number of time steps')
+    parser.add_argument('--qz', type=int, default=300, help='number of qz points')
+    parser.add_argument('--binWidths', type=float, nargs='+', default=[1e-5, 1e-4])
+    args = parser.parse_args()
+
+    S = buildSample()
+    strainMap = getStrainMap(S, args.steps)
+    qz = np.linspace(3.1, 3.3, args.qz)/u.angstrom
+    E = 8e3*u.eV
+    print('{:d} time steps x {:d} unit cells, {:d} qz points'.format(*strainMap.shape, args.qz))
+    print('{:>8s} {:>10s} {:>10s} {:>10s} {:>8s} {:>10s} {:>10s} {:>10s}'.format(
+        'engine', 'bin width', 'time [s]', 'speedup', 'pairs', 'reuse', 'max. dη', 'max. dR/R'))
+    for engine in [ud.xrayKin, ud.xrayDyn]:
+        X = engine(S, E, qz, strainBinWidth=0)
+        R0, t0 = run(X, strainMap)
+        stats = X.binning.statistics
+        print('{:>8s} {:10.1e} {:10.3f} {:10.2f} {:8d} {:10.2f} {:10.1e} {:10.1e}'.format(
+            engine.__name__, 0, t0, 1, stats['numPairs'], stats['cellReuseFactor'],
+            stats['maxError'], 0))
+        del X
+        for binWidth in args.binWidths:
+            X = engine(S, E, qz, strainBinWidth=binWidth)
+            R, t = run(X, strainMap)
+            stats = X.binning.statistics
+            print('{:>8s} {:10.1e} {:10.3f} {:10.2f} {:8d} {:10.2f} {:10.1e} {:10.1e}'.format(
+                engine.__name__, binWidth, t, t0/t, stats['numPairs'], stats['cellReuseFactor'],
+                stats['maxError'], np.max(np.abs(R - R0))/np.max(R0)))
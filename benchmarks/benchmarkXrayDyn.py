@@ -0,0 +1,109 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+"""benchmarkXrayDyn
+
+Benchmark of the dynamical X-ray diffraction of superlattices with an
+increasing number of repetitions of the bilayer. The run time of the
+unstrained reflectivity, which combines the repetitions by exponentiation
+by squaring, is compared to the sequential product of all unit cell
+matrices. The fitted exponent of the run time versus the number of
+repetitions is reported, which is well below 1 for a sublinear scaling.
+
+Usage:
+    python benchmarkXrayDyn.py [--repeats 10 100 1000 10000] [--qz 1000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import importlib
+import numpy as np
+import numericalunits as u
+
+modulePath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(modulePath))
+ud = importlib.import_module(os.path.basename(modulePath))
+xrayDynModule = importlib.import_module(os.path.basename(modulePath) + '.xrayDyn')
+u.reset_units('SI')
+
+
+def buildSuperlattice(repeats):
+    """buildSuperlattice
+
+    Returns a superlattice of repeats bilayers of 5 SRO and 7 STO unit
+    cells on 1000 unit cells of an STO substrate.
+    """
+    Sr = ud.atom('Sr')
+    Ti = ud.atom('Ti')
+    Ru = ud.atom('Ru')
+    O  = ud.atom('O')
+    STO = ud.unitCell('STO', 'STO', 3.905*u.angstrom)
+    STO.addAtoms([Sr, Ti, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+    SRO = ud.unitCell('SRO', 'SRO', 3.95*u.angstrom)
+    SRO.addAtoms([Sr, Ru, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+    bilayer = ud.structure('bilayer')
+    bilayer.addSubStructure(SRO, 5)
+    bilayer.addSubStructure(STO, 7)
+    S = ud.structure('superlattice')
+    S.addSubStructure(bilayer, repeats)
+    S.addSubStructure(STO, 1000)
+    return S
+
+
+def getSequentialTime(X, repeats):
+    """getSequentialTime
+
+    Returns the run time [s] of the sequential product of the cached unit
+    cell matrices of all unit cells, which is extrapolated from at most
+    1000 repetitions.
+    """
+    indices = X.S.compile().indices
+    numCells = min(len(indices), 12*min(repeats, 1000) + 1000)
+    matrices = [X._matrices[(int(i), 0)] for i in indices[:numCells]]
+    t0 = time.perf_counter()
+    M = matrices[0]
+    for Mi in matrices[1:]:
+        M = xrayDynModule._matmul(M, Mi)
+    return (time.perf_counter() - t0)*len(indices)/numCells
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the dynamical X-ray diffraction')
+    parser.add_argument('--repeats', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--qz', type=int, default=1000, help='number of qz points')
+    args = parser.parse_args()
+
+    qz = np.linspace(3.0, 3.4, args.qz)/u.angstrom
+    print('{:>10s} {:>12s} {:>14s} {:>16s}'.format('repeats', 'unit cells', 'squaring [ms]',
+                                                   'sequential [ms]'))
+    times = []
+    for repeats in args.repeats:
+        S = buildSuperlattice(repeats)
+        X = ud.xrayDyn(S, 8e3*u.eV, qz)
+        # the unit cell matrices are calculated once and cached
+        X.getReflectivity()
+        t0 = time.perf_counter()
+        X.getReflectivity()
+        times.append(time.perf_counter() - t0)
+        print('{:10d} {:12d} {:14.2f} {:16.2f}'.format(repeats, S.getNumberOfUnitCells(),
+              times[-1]*1e3, getSequentialTime(X, repeats)*1e3))
+
+    if len(times) > 1:
+        slope = np.polyfit(np.log(args.repeats), np.log(times), 1)[0]
+        print('run time ~ repeats^{:3.2f}'.format(slope))
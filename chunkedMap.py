@@ -0,0 +1,279 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import os
+import json
+from .helpers import atomicWrite, atomicSave
+from .materialFunction import materialFunction
+
+
+class chunkedMap(object):
+    """chunkedMap
+
+    The chunkedMap class stores a time-resolved map, such as a temperature,
+    strain or reflectivity map, in a directory on the local disk. The map
+    is written incrementally in chunks of time steps. Every chunk is a .npy
+    file, or a compressed .npz file, with the time vector of the chunk in a
+    separate file. The shape and the chunks are stored in the JSON file
+    index.json, which is updated with every chunk, and the metadata, e.g.
+    the properties of the unit cells of the structure, are written once to
+    the JSON file metadata.json.
+
+    The map is read lazily by numpy indexing, e.g. M[100] for a single
+    time step or M[:, 500] for a single unit cell, which loads only the
+    required chunks. Uncompressed chunks are memory-mapped, compressed
+    chunks are decompressed on access.
+
+    Attributes:
+        path (str)          : directory of the map
+        shape (tuple)       : shape of the map, the first axis is time
+        dtype (dtype)       : data type of the map
+        compress (bool)     : the chunks are compressed
+        metadata (dict)     : metadata of the map
+    """
+
+    version = 1
+
+    def __init__(self, path, **kwargs):
+        """Initialize the class and create a new map if the shape of the
+        time steps is given or open an existing map otherwise.
+
+        Args:
+            path (str)                  : directory of the map
+            shape (Optional[tuple])     : shape of a single time step of a
+                                          new map, e.g. (N,) or (N, K)
+            dtype (Optional[dtype])     : data type of a new map, default
+                                          is float
+            compress (Optional[bool])   : compress the chunks of a new map,
+                                          default is False
+            metadata (Optional[dict])   : JSON-serializable metadata of a
+                                          new map, see getStructureMetadata
+            overwrite (Optional[bool])  : replace an existing map in the
+                                          directory by a new map, default
+                                          is False
+
+        """
+        self.path = path
+        self._chunks = []
+        self._time   = None
+        if kwargs.get('shape') is not None:
+            os.makedirs(path, exist_ok=True)
+            existing = [filename for filename in os.listdir(path)
+                        if filename.startswith('chunk_') or filename in ['index.json', 'metadata.json']]
+            if existing and not kwargs.get('overwrite', False):
+                raise ValueError('The directory ' + path + ' already contains a map, '
+                                 'use overwrite=True to replace it!')
+            for filename in existing:
+                os.remove(os.path.join(path, filename))
+            self.shape      = (0,) + tuple(kwargs['shape'])
+            self.dtype      = np.dtype(kwargs.get('dtype', float))
+            self.compress   = kwargs.get('compress', False)
+            self.metadata   = kwargs.get('metadata', {})
+            atomicWrite(os.path.join(path, 'metadata.json'), json.dumps(self.metadata), mode='w')
+            self._writeIndex()
+        else:
+            with open(os.path.join(path, 'index.json'), 'r') as f:
+                index = json.load(f)
+            if index.get('version') != self.version:
+                raise ValueError('The map ' + path + ' has an unknown version!')
+            with open(os.path.join(path, 'metadata.json'), 'r') as f:
+                self.metadata = json.load(f)
+            self.shape      = tuple(index['shape'])
+            self.dtype      = np.dtype(index['dtype'])
+            self.compress   = index['compress']
+            self._chunks    = index['chunks']
+
+    def __str__(self):
+        """String representation of this class
+
+        """
+        classStr  = 'Chunked map with the following properties\n'
+        classStr += 'path                   : {:s}\n'.format(self.path)
+        classStr += 'shape                  : {:s}\n'.format(str(self.shape))
+        classStr += 'data type              : {:s}\n'.format(self.dtype.name)
+        classStr += 'chunks                 : {:d}\n'.format(len(self._chunks))
+        classStr += 'compressed             : {:s}\n'.format(str(self.compress))
+        return(classStr)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def __array__(self, dtype=None, copy=None):
+        res = self[:]
+        return res if dtype is None else res.astype(dtype)
+
+    def _writeIndex(self):
+        """_writeIndex
+
+        Writes the shape and the chunks of the map to index.json.
+        """
+        index = {'version': self.version, 'shape': list(self.shape), 'dtype': self.dtype.str,
+                 'compress': self.compress, 'chunks': self._chunks}
+        atomicWrite(os.path.join(self.path, 'index.json'), json.dumps(index, indent=1), mode='w')
+
+    def append(self, time, data):
+        """append
+
+        Appends a chunk of time steps with the time vector and the (time x
+        ...) data of the chunk to the map.
+        """
+        time = np.atleast_1d(np.asarray(time, dtype=float))
+        data = np.asarray(data, dtype=self.dtype)
+        if data.shape != (len(time),) + self.shape[1:]:
+            raise ValueError('The chunk must have the shape {:s}!'.format(
+                str((len(time),) + self.shape[1:])))
+        name = 'chunk_{:06d}'.format(len(self._chunks))
+        if self.compress:
+            name += '.npz'
+            atomicSave(os.path.join(self.path, name), np.savez_compressed, data=data)
+        else:
+            name += '.npy'
+            atomicSave(os.path.join(self.path, name), np.save, data)
+        atomicSave(os.path.join(self.path, name.split('.')[0] + '_time.npy'), np.save, time)
+        self._chunks.append({'file': name, 'start': self.shape[0], 'stop': self.shape[0] + len(time)})
+        self.shape = (self.shape[0] + len(time),) + self.shape[1:]
+        self._time = None
+        self._writeIndex()
+
+    def write(self, chunks):
+        """write
+
+        Appends all chunks of an iterator of tuples of the time vector
+        and the data of the chunk, such as heat.iterTempMap, and returns
+        the map.
+        """
+        for time, data in chunks:
+            self.append(time, data)
+        return self
+
+    def _loadChunk(self, i):
+        """_loadChunk
+
+        Returns the data of the chunk, which is memory-mapped if it is not
+        compressed.
+        """
+        filename = os.path.join(self.path, self._chunks[i]['file'])
+        if filename.endswith('.npz'):
+            with np.load(filename) as f:
+                return f['data']
+        return np.load(filename, mmap_mode='r')
+
+    @property
+    def time(self):
+        """time
+
+        Returns the time vector of the map.
+        """
+        if self._time is None:
+            self._time = np.concatenate([np.zeros(0)] + [
+                np.load(os.path.join(self.path, c['file'].split('.')[0] + '_time.npy'))
+                for c in self._chunks])
+        return self._time
+
+    def iterChunks(self):
+        """iterChunks
+
+        Yields the chunks of the map as tuples of the time vector and the
+        data of the chunk.
+        """
+        time = self.time
+        for i, c in enumerate(self._chunks):
+            yield time[c['start']:c['stop']], self._loadChunk(i)
+
+    def __getitem__(self, key):
+        """Returns the data of the time steps and unit cells selected by
+        numpy indexing. Only the chunks of the selected time steps are
+        loaded.
+        """
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) and key[0] is Ellipsis:
+            key = (slice(None),) + key
+        first, rest = (key[0], key[1:]) if key else (slice(None), ())
+        if isinstance(first, slice):
+            steps = np.arange(*first.indices(self.shape[0]))
+        else:
+            steps = np.arange(self.shape[0])[first]
+        scalar = np.ndim(steps) == 0
+        steps  = np.atleast_1d(steps)
+        starts = np.array([c['start'] for c in self._chunks], dtype=int)
+        chunkIdx = np.searchsorted(starts, steps, side='right') - 1
+
+        parts = []
+        # consecutive time steps of the same chunk are read at once
+        bounds = np.flatnonzero(np.diff(chunkIdx)) + 1
+        for sel in np.split(np.arange(len(steps)), bounds):
+            if len(sel) == 0:
+                continue
+            i = chunkIdx[sel[0]]
+            data = self._loadChunk(i)
+            parts.append(np.asarray(data[(steps[sel] - starts[i],) + rest]))
+        if not parts:
+            res = np.zeros((0,) + self.shape[1:], dtype=self.dtype)[(slice(None),) + rest]
+        else:
+            res = np.concatenate(parts)
+        return res[0] if scalar else res
+
+
+def getStructureMetadata(S, types='all'):
+    """getStructureMetadata
+
+    Returns the JSON-serializable metadata of the structure, i.e. its name,
+    fingerprint, number of unit cells, the unique unitCell index and the
+    depth of the top of every unit cell and the properties of the unique
+    unitCells as given by unitCell.getPropertyStruct for the types.
+    """
+    compiled = S.compile()
+    unitCells = {}
+    for UC in compiled.UCHandles:
+        props = {}
+        for name, value in UC.getPropertyStruct(types=types).items():
+            if name == 'atoms':
+                value = [[a[0].ID, a[2]] for a in value]
+            value = _toJSON(value)
+            if value is not None:
+                props[name.lstrip('_')] = value
+        unitCells[UC.ID] = props
+    dEnd = compiled.getCumulativeDepth()
+    return {'name': S.name, 'fingerprint': S.getFingerprint(), 'numUnitCells': compiled.numUnitCells,
+            'numSubSystems': S.numSubSystems, 'UCIDs': list(compiled.UCIDs),
+            'indices': compiled.indices.tolist(),
+            'depth': np.concatenate([[0], dEnd[:-1]]).tolist(), 'unitCells': unitCells}
+
+
+def _toJSON(value):
+    """_toJSON
+
+    Returns the JSON-serializable representation of numbers, strings,
+    arrays, materialFunctions and lists of them, or None for other
+    objects.
+    """
+    if isinstance(value, (str, bool)):
+        return value
+    if isinstance(value, materialFunction):
+        return value.funcStr
+    if isinstance(value, (list, tuple)):
+        res = [_toJSON(item) for item in value]
+        return None if any(item is None for item in res) else res
+    if isinstance(value, (int, float, np.number, np.ndarray)):
+        return np.asarray(value).tolist()
+    return None
@@ -0,0 +1,379 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+from math import erf, sqrt, log
+import numericalunits as u
+from .chunkedMap import chunkedMap, getStructureMetadata
+from .helpers import getTimeVector
+u.reset_units('SI')
+
+
+class heat(object):
+    """heat
+
+    The heat class simulates the one-dimensional heat diffusion in a
+    structure for an arbitrary number of coupled subsystems (N-temperature
+    model), e.g. electrons, phonons and spins, after an optical excitation.
+    The optical energy is deposited in the first subsystem.
+
+    Each unit cell is one node of the spatial grid. The energy balance per
+    area of the unit cell $i$ and the subsystem $k$ is
+
+    $$ \\rho_i\\, c_{ik}(T)\\, d_i \\frac{\\partial T_{ik}}{\\partial t} =
+       G_{i-1,k} (T_{i-1,k} - T_{ik}) + G_{ik} (T_{i+1,k} - T_{ik})
+       + d_i\\, g_{ik}(T_i) + S_{ik}(t) $$
+
+    with the interface conductances
+    $G_{ik} = 1/(d_i/(2 k_{ik}) + d_{i+1}/(2 k_{i+1,k}))$, the subsystem
+    coupling $g_{ik}$ and the optical source $S_{ik}$. The equations are
+    integrated with a linearly implicit Euler scheme: the material
+    properties are taken at the beginning of each time step and the
+    coupling terms are linearized with their Jacobian, so that every time
+    step requires a single banded linear solve. The unknowns are ordered
+    by unit cell and subsystem, which gives a bandwidth of numSubSystems.
+    The optical energy is integrated exactly over each time step and is
+    deposited before the diffusion step by inverting the anti-derivative
+    of the heat capacity, so that the deposited energy depends neither on
+    the step size nor on the temperature dependence of the heat capacity.
+
+    All unit cell properties are evaluated vectorized per unique unit cell
+    on the compiled structure.
+
+    Attributes:
+        S (structure)               : sample to do simulations with
+        initTemp (float/ndarray)    : initial temperature [K], scalar or
+                                      (N x numSubSystems) array
+        excitation (dict)           : optical excitation with the lists
+                                      'fluence' [J/m^2], 'delayPump' [s]
+                                      and 'pulseWidth' (FWHM) [s]
+        boundaryTypes (list[str])   : 'isolator' or 'temperature' for the
+                                      top and bottom boundary
+        boundaryTemps (list[float]) : temperatures of the boundaries of
+                                      type 'temperature' [K]
+        maxTimeStep (float)         : maximum internal time step [s]
+        pulseSteps (int)            : internal time steps per FWHM of the
+                                      pump pulses
+        maxNewtonSteps (int)        : maximum number of Newton iterations
+                                      for the deposition of the energy
+        absorption (dict)           : mode and keyword arguments of the
+                                      absorption profile, e.g.
+                                      {'mode': 'transferMatrix',
+                                       'wavelength': 800*u.nm}
+        resultCache (resultCache)   : optional on-disk cache of the
+                                      temperature maps, default is None
+    """
+
+    def __init__(self, S, **kwargs):
+        """Initialize the class.
+
+        Args:
+            S (structure)                       : sample
+            initTemp (Optional[float/ndarray])  : default is 300 K
+            excitation (Optional[dict])         : default is no excitation
+            boundaryTypes (Optional[list[str]]) : default is isolators
+            boundaryTemps (Optional[list])      : default is 300 K
+            maxTimeStep (Optional[float])       : default is 1 ps
+            pulseSteps (Optional[int])          : default is 10
+            maxNewtonSteps (Optional[int])      : default is 50
+            absorption (Optional[dict])         : default is Lambert-Beer
+            resultCache (Optional[resultCache]) : default is None
+
+        """
+        self.S              = S
+        self.initTemp       = kwargs.get('initTemp', 300)
+        self.excitation     = kwargs.get('excitation', {'fluence': [], 'delayPump': [], 'pulseWidth': []})
+        self.boundaryTypes  = kwargs.get('boundaryTypes', ['isolator', 'isolator'])
+        self.boundaryTemps  = kwargs.get('boundaryTemps', [300, 300])
+        self.maxTimeStep    = kwargs.get('maxTimeStep', 1*u.ps)
+        self.pulseSteps     = kwargs.get('pulseSteps', 10)
+        self.maxNewtonSteps = kwargs.get('maxNewtonSteps', 50)
+        self.absorption     = kwargs.get('absorption', {'mode': 'lambertBeer'})
+        self.resultCache    = kwargs.get('resultCache', None)
+
+    def __str__(self):
+        """String representation of this class
+
+        """
+        classStr  = 'Heat simulation with the following properties\n'
+        classStr += 'sample                 : {:s}\n'.format(self.S.name)
+        classStr += 'number of unit cells   : {:d}\n'.format(self.S.getNumberOfUnitCells())
+        classStr += 'number of subsystems   : {:d}\n'.format(self.S.numSubSystems)
+        classStr += 'boundary types         : {:s}\n'.format(', '.join(self.boundaryTypes))
+        classStr += 'max. time step         : {:3.2f} ps\n'.format(self.maxTimeStep/u.ps)
+        classStr += 'absorption mode        : {:s}\n'.format(self.absorption.get('mode', 'lambertBeer'))
+        classStr += 'excitation             :\n'
+        for F, t0, w in zip(*self._getPulses()):
+            classStr += '\t {:3.2f} mJ/cm² \t at {:3.2f} ps \t FWHM {:3.2f} ps\n'.format(
+                F/(u.mJ/u.cm**2), t0/u.ps, w/u.ps)
+        return(classStr)
+
+    def _getPulses(self):
+        """_getPulses
+
+        Returns the vectors of fluence, delay and pulse width of all pump
+        pulses.
+        """
+        F  = np.atleast_1d(np.asarray(self.excitation.get('fluence', []), dtype=float))
+        t0 = np.atleast_1d(np.asarray(self.excitation.get('delayPump', np.zeros_like(F)), dtype=float))
+        w  = np.atleast_1d(np.asarray(self.excitation.get('pulseWidth', np.zeros_like(F)), dtype=float))
+        F, t0, w = np.broadcast_arrays(F, t0, w)
+        return F, t0, w
+
+    def getAbsorptionProfile(self):
+        """getAbsorptionProfile
+
+        Returns the fraction of the incident fluence absorbed in each unit
+        cell, see structure.getAbsorptionProfile for the absorption
+        settings.
+        """
+        return self.S.getAbsorptionProfile(**self.absorption)
+
+    def _getFluenceIntegral(self, t):
+        """_getFluenceIntegral
+
+        Returns the fluence [J/m^2] of all pump pulses which arrived until
+        the time t.
+        """
+        res = 0
+        for F, t0, w in zip(*self._getPulses()):
+            if w > 0:
+                sigma = w/(2*sqrt(2*log(2)))
+                res += F*(1 + erf((t - t0)/(sqrt(2)*sigma)))/2
+            elif t >= t0:
+                res += F
+        return res
+
+    def _getInternalTime(self, time):
+        """_getInternalTime
+
+        Returns the internal time grid which contains the output time
+        points, resolves each pump pulse with pulseSteps steps per FWHM and
+        has no step larger than maxTimeStep.
+        """
+        points = [np.asarray(time, dtype=float)]
+        for F, t0, w in zip(*self._getPulses()):
+            if w > 0:
+                points.append(t0 + w*np.linspace(-3, 3, 6*self.pulseSteps + 1))
+            else:
+                points.append([t0])
+        grid = np.unique(np.concatenate(points))
+        # subdivide steps larger than the maximum time step
+        steps = np.maximum(np.ceil(np.diff(grid)/self.maxTimeStep).astype(int), 1)
+        fine  = [grid[:-1, np.newaxis] + np.diff(grid)[:, np.newaxis]*np.arange(n)/n
+                 for n in np.unique(steps)]
+        parts = [f[steps == n].ravel() for f, n in zip(fine, np.unique(steps))]
+        return np.unique(np.concatenate(parts + [grid[-1:]]))
+
+    def _getCouplingJacobian(self, T, g):
+        """_getCouplingJacobian
+
+        Returns the (N x K x K) Jacobian of the subsystem coupling by
+        finite differences, which are evaluated vectorized for all unit
+        cells.
+        """
+        N, K = T.shape
+        J = np.zeros([N, K, K])
+        for j in range(K):
+            h = 1e-4*(1 + np.abs(T[:, j]))
+            Th = T.copy()
+            Th[:, j] += h
+            J[:, :, j] = (self.S.evalUnitCellFunctions('subSystemCoupling', Th) - g)/h[:, np.newaxis]
+        return J
+
+    def _depositEnergy(self, T, energy, dz, rho):
+        """_depositEnergy
+
+        Returns the temperatures after the absorbed energy [J/m^2] per unit
+        cell is deposited in the first subsystem. The temperature rise is
+        found by Newton iterations on the anti-derivative of the heat
+        capacity, so that the energy is conserved also for large and
+        temperature-dependent temperature rises.
+        """
+        heated = energy > 0
+        if not np.any(heated):
+            return T
+        T0  = T.copy()
+        T   = T.copy()
+        # energy density per temperature [J/(m^2 K)] relative to the heat capacity
+        rhoDz = rho*dz
+        # only the first subsystem absorbs the energy
+        int0  = self.S.evalUnitCellFunctions('intHeatCapacity', T0, subSystem=0)
+        for i in range(self.maxNewtonSteps):
+            res = rhoDz*(self.S.evalUnitCellFunctions('intHeatCapacity', T, subSystem=0) - int0) - energy
+            dT  = res/(rhoDz*self.S.evalUnitCellFunctions('heatCapacity', T, subSystem=0))
+            T[:, 0] -= dT
+            if np.all(np.abs(dT) <= 1e-10*T[:, 0]):
+                break
+        return T
+
+    def _step(self, T, dt, dz, rho, boundaries):
+        """_step
+
+        Returns the temperatures after one linearly implicit Euler step of
+        length dt of the heat diffusion and the subsystem coupling.
+        """
+        from scipy.linalg import solve_banded
+
+        N, K  = T.shape
+        c     = self.S.evalUnitCellFunctions('heatCapacity', T)
+        k     = self.S.evalUnitCellFunctions('thermCond', T)
+        g     = self.S.evalUnitCellFunctions('subSystemCoupling', T)
+        M     = rho[:, np.newaxis]*c*dz[:, np.newaxis]  # J/(m^2 K)
+        # interface conductances [W/(m^2 K)]
+        G     = 1/(dz[:-1, np.newaxis]/(2*k[:-1]) + dz[1:, np.newaxis]/(2*k[1:]))
+        flux  = np.zeros([N, K])
+        flux[:-1] += G*(T[1:] - T[:-1])
+        flux[1:]  -= G*(T[1:] - T[:-1])
+
+        diag = M/dt
+        diag[:-1] += G
+        diag[1:]  += G
+        rhs = flux + dz[:, np.newaxis]*g
+        # fixed temperatures at the boundaries at half a unit cell distance
+        for idx, Tb in boundaries:
+            Gb = 2*k[idx]/dz[idx]
+            diag[idx] += Gb
+            rhs[idx]  += Gb*(Tb - T[idx])
+
+        # banded matrix of the interleaved unknowns p = i*K + k
+        ab = np.zeros([2*K + 1, N*K])
+        if K > 1:
+            J = -dz[:, np.newaxis, np.newaxis]*self._getCouplingJacobian(T, g)
+            for kk in range(K):
+                for j in range(K):
+                    if j != kk:
+                        # element (p, q) is stored at ab[K + p - q, q]
+                        ab[K + kk - j, j::K] = J[:, kk, j]
+            diag = diag + J[:, np.arange(K), np.arange(K)]
+        ab[K, :] = diag.ravel()
+        ab[0, K:]   = -G.ravel()
+        ab[2*K, :-K] = -G.ravel()
+
+        dT = solve_banded((K, K), ab, rhs.ravel(), overwrite_ab=True, overwrite_b=True,
+                          check_finite=False)
+        return T + dT.reshape(N, K)
+
+    def _getBoundaries(self):
+        """_getBoundaries
+
+        Returns the list of unit cell index and temperature of all
+        boundaries of type temperature.
+        """
+        res = []
+        for idx, bType, Tb in zip([0, -1], self.boundaryTypes, self.boundaryTemps):
+            if bType == 'temperature':
+                res.append((idx, Tb))
+            elif bType != 'isolator':
+                raise ValueError('Boundary type has to be isolator or temperature!')
+        return res
+
+    def iterTempMap(self, time, chunkSize=100):
+        """iterTempMap
+
+        Calculates the temperature map for the time vector and yields it in
+        chunks of chunkSize time steps as tuples of the time vector and the
+        (time x N x numSubSystems) temperature array of the chunk, so that
+        the full map never has to be held in memory. The time vector has
+        to be sorted in ascending order.
+        """
+        return self._iterTempMap(getTimeVector(time), chunkSize)
+
+    def _iterTempMap(self, time, chunkSize):
+        """_iterTempMap
+
+        Yields the chunks of the temperature map of iterTempMap.
+        """
+        compiled = self.S.compile()
+        N       = compiled.numUnitCells
+        K       = self.S.numSubSystems
+        props   = self.S.getUnitCellPropertyVectors(types=['cAxis', 'density'])
+        dz      = props['cAxis']
+        rho     = props['density']
+        absorbed = self.getAbsorptionProfile()
+
+        T = np.array(np.broadcast_to(np.asarray(self.initTemp, dtype=float), (N, K)))
+        boundaries = self._getBoundaries()
+
+        tGrid   = self._getInternalTime(time)
+        outIdx  = np.searchsorted(tGrid, time)
+        chunk   = np.zeros([min(chunkSize, len(time)), N, K])
+        nChunk  = 0
+        start   = 0
+        # the initial temperatures are the ones before any excitation
+        fluence = 0
+        j       = 0
+        for n, t in enumerate(tGrid):
+            if n > 0:
+                dt = t - tGrid[n-1]
+                newFluence = self._getFluenceIntegral(t)
+                T = self._depositEnergy(T, absorbed*(newFluence - fluence), dz, rho)
+                fluence = newFluence
+                T = self._step(T, dt, dz, rho, boundaries)
+            while j < len(time) and outIdx[j] == n:
+                chunk[nChunk] = T
+                nChunk += 1
+                j += 1
+                if nChunk == len(chunk) or j == len(time):
+                    yield time[start:j], chunk[:nChunk].copy()
+                    start  = j
+                    nChunk = 0
+
+    def getTempMap(self, time, chunkSize=100):
+        """getTempMap
+
+        Returns the (time x N x numSubSystems) temperature map for the time
+        vector, see iterTempMap. If a resultCache is given, the temperature
+        map is taken from the cache or is stored in it.
+        """
+        if self.resultCache is not None:
+            params = self._getCacheParameters(time)
+            tempMap = self.resultCache.get('tempMap', self.S, **params)
+            if tempMap is not None:
+                return tempMap
+        chunks = [tempChunk for _, tempChunk in self.iterTempMap(time, chunkSize)]
+        tempMap = np.concatenate(chunks)
+        if self.resultCache is not None:
+            self.resultCache.put('tempMap', self.S, tempMap, **params)
+        return tempMap
+
+    def saveTempMap(self, path, time, chunkSize=100, compress=False, overwrite=False):
+        """saveTempMap
+
+        Streams the (time x N x numSubSystems) temperature map chunk by
+        chunk into a chunkedMap in the directory path together with the
+        metadata of the structure, so that only one chunk is held in
+        memory. An existing map in path is only replaced if overwrite is
+        True. Returns the chunkedMap.
+        """
+        # the time vector is checked before the map is created
+        chunks  = self.iterTempMap(time, chunkSize)
+        tempMap = chunkedMap(path, shape=(self.S.getNumberOfUnitCells(), self.S.numSubSystems),
+                             compress=compress, metadata=getStructureMetadata(self.S, 'heat'),
+                             overwrite=overwrite)
+        return tempMap.write(chunks)
+
+    def _getCacheParameters(self, time):
+        """_getCacheParameters
+
+        Returns the dict of all parameters of the temperature map for the
+        key of the resultCache.
+        """
+        return {'time': time, 'initTemp': self.initTemp, 'excitation': self.excitation,
+                'boundaryTypes': self.boundaryTypes, 'boundaryTemps': self.boundaryTemps,
+                'maxTimeStep': self.maxTimeStep, 'pulseSteps': self.pulseSteps,
+                'maxNewtonSteps': self.maxNewtonSteps, 'absorption': self.absorption}
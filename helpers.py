@@ -0,0 +1,86 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import os
+import numpy as np
+
+
+def getCacheDir(*subDirs):
+    """getCacheDir
+
+    Returns the path of the local cache directory of the module and creates
+    it if necessary. The base path is given by the environment variable
+    UDKM1DSIMPY_CACHE_DIR and defaults to ~/.cache/udkm1Dsimpy.
+    """
+    path = os.environ.get('UDKM1DSIMPY_CACHE_DIR',
+                          os.path.join(os.path.expanduser('~'), '.cache', 'udkm1Dsimpy'))
+    path = os.path.join(path, *subDirs)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def atomicWrite(filename, data, mode='wb'):
+    """atomicWrite
+
+    Writes the data to a temporary file in the same directory and moves it
+    to its destination afterwards, so that concurrent processes never read
+    a partially written file.
+    """
+    import tempfile
+    fd, tmpName = tempfile.mkstemp(dir=os.path.dirname(filename), suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            f.write(data)
+        # mkstemp creates the file only readable for the owner
+        os.chmod(tmpName, 0o644)
+        os.replace(tmpName, filename)
+    except Exception:
+        os.remove(tmpName)
+        raise
+
+
+def atomicSave(filename, func, *args, **kwargs):
+    """atomicSave
+
+    Writes a file with the given numpy save function to a temporary file
+    and moves it to its destination afterwards.
+    """
+    import tempfile
+    fd, tmpName = tempfile.mkstemp(dir=os.path.dirname(filename), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            func(f, *args, **kwargs)
+        # mkstemp creates the file only readable for the owner
+        os.chmod(tmpName, 0o644)
+        os.replace(tmpName, filename)
+    except Exception:
+        os.remove(tmpName)
+        raise
+
+
+def getTimeVector(time):
+    """getTimeVector
+
+    Returns the time vector of a simulation as float array and raises a
+    ValueError if it is empty or not sorted in ascending order.
+    """
+    time = np.asarray(time, dtype=float)
+    if time.ndim != 1 or len(time) == 0:
+        raise ValueError('The time vector must be a non-empty vector!')
+    if np.any(np.diff(time) < 0):
+        raise ValueError('The time vector must be sorted in ascending order!')
+    return time
@@ -0,0 +1,269 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import itertools
+from .unitCell import unitCell
+
+
+class layerNode(object):
+    """layerNode
+
+    A layerNode is the lazy representation of one structure in the
+    substructures tree. Each of its entries is a run of N repetitions of
+    either a unique unit cell (given by its index) or of another
+    layerNode.
+
+    Attributes:
+        entries (list[int or layerNode]) : unique unit cell indices or
+                                           child nodes of the runs
+        repetitions (ndarray[int])       : number of repetitions N of
+                                           each run
+        lengths (ndarray[int])           : number of unit cells of a
+                                           single repetition of each run
+        starts (ndarray[int])            : index of the first unit cell
+                                           of each run in the node
+        numUnitCells (int)               : number of unit cells in the node
+        counts (ndarray[int])            : number of occurrences of each
+                                           unique unit cell in the node
+    """
+
+    def __init__(self, entries, repetitions, numUniqueUnitCells):
+        self.entries        = entries
+        self.repetitions    = np.array(repetitions, dtype=int)
+        self.lengths        = np.array([1 if self._isLeaf(e) else e.numUnitCells
+                                        for e in entries], dtype=int)
+        spans               = self.lengths*self.repetitions
+        self.starts         = np.cumsum(spans) - spans
+        self.numUnitCells   = int(np.sum(spans))
+        self.counts         = np.zeros(numUniqueUnitCells, dtype=int)
+        for entry, N in zip(entries, self.repetitions):
+            if self._isLeaf(entry):
+                self.counts[entry] += N
+            else:
+                self.counts += N*entry.counts
+
+    @staticmethod
+    def _isLeaf(entry):
+        return not isinstance(entry, layerNode)
+
+    def take(self, positions):
+        """take
+
+        Returns the unique unit cell indices at the given positions in the
+        node. The lookup descends the tree vectorized for all positions.
+        """
+        res = np.empty(len(positions), dtype=int)
+        run = np.searchsorted(self.starts, positions, side='right') - 1
+        for k in np.unique(run):
+            sel = run == k
+            if self._isLeaf(self.entries[k]):
+                res[sel] = self.entries[k]
+            else:
+                local = (positions[sel] - self.starts[k]) % self.lengths[k]
+                res[sel] = self.entries[k].take(local)
+        return res
+
+    def iterRuns(self):
+        """iterRuns
+
+        Yields the runs (unique unit cell index, number of repetitions) of
+        the node in order without expanding the unit cells.
+        """
+        for entry, N in zip(self.entries, self.repetitions):
+            if self._isLeaf(entry):
+                yield int(entry), int(N)
+            else:
+                for i in range(N):
+                    yield from entry.iterRuns()
+
+    def expand(self):
+        """expand
+
+        Returns the flat vector of unique unit cell indices of the node.
+        """
+        res = [np.zeros(0, dtype=int)]
+        for entry, N in zip(self.entries, self.repetitions):
+            if self._isLeaf(entry):
+                res.append(np.full(N, entry, dtype=int))
+            else:
+                res.append(np.tile(entry.expand(), N))
+        return np.concatenate(res)
+
+
+class layerView(object):
+    """layerView
+
+    The layerView class is a lazy, run-length encoded view of the unit
+    cells of a structure. It supports length, indexing, slicing, iteration
+    and reductions of unit cell properties without expanding the
+    repetitions of the substructures, so that the memory and time cost
+    scales with the number of substructures and not with the number of
+    unit cells. Flat arrays are only created on request.
+
+    Indexing returns the unique unit cell index of the unit cell, slicing
+    returns a vector of unique unit cell indices.
+
+    Attributes:
+        UCIDs (list[str])               : IDs of the unique unit cells
+        UCHandles (list[unitCell])      : handles of the unique unit cells
+        root (layerNode)                : node of the top level structure
+    """
+
+    def __init__(self, S):
+        """Initialize the class for the structure S.
+
+        Args:
+            S (structure) : structure to view
+
+        """
+        self.UCIDs, self.UCHandles = S.getUniqueUnitCells()
+        self.root = self._build(S)
+
+    def _build(self, S):
+        """_build
+
+        Recursively builds the layerNodes of the substructures tree.
+        """
+        entries = []
+        repetitions = []
+        for sub, N in S.substructures:
+            if isinstance(sub, unitCell):
+                entries.append(self.UCIDs.index(sub.ID))
+            else:
+                entries.append(self._build(sub))
+            repetitions.append(N)
+        return layerNode(entries, repetitions, len(self.UCIDs))
+
+    def __str__(self):
+        """String representation of this class
+
+        """
+        classStr  = 'Layer view with the following properties\n'
+        classStr += 'number of unit cells        : {:d}\n'.format(len(self))
+        classStr += 'number of unique unit cells : {:d}\n'.format(len(self.UCIDs))
+        for ID, count in zip(self.UCIDs, self.getCounts()):
+            classStr += '\t {:s} \t {:d}\n'.format(ID, count)
+        return(classStr)
+
+    def __len__(self):
+        return self.root.numUnitCells
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.take(np.arange(*key.indices(len(self))))
+        elif np.ndim(key) > 0:
+            return self.take(np.asarray(key))
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('Unit cell index out of range!')
+        return int(self.root.take(np.array([key]))[0])
+
+    def __iter__(self):
+        for index, N in self.iterRuns():
+            yield from itertools.repeat(index, N)
+
+    def take(self, positions):
+        """take
+
+        Returns the vector of unique unit cell indices of the unit cells
+        at the given positions.
+        """
+        positions = np.asarray(positions, dtype=int)
+        positions = np.where(positions < 0, positions + len(self), positions)
+        if np.any((positions < 0) | (positions >= len(self))):
+            raise IndexError('Unit cell index out of range!')
+        return self.root.take(positions.ravel()).reshape(positions.shape)
+
+    def iterRuns(self):
+        """iterRuns
+
+        Yields the runs (unique unit cell index, number of repetitions) of
+        all unit cells from the surface to the bottom. Adjacent runs of the
+        same unit cell are merged.
+        """
+        last, count = None, 0
+        for index, N in self.root.iterRuns():
+            if index == last:
+                count += N
+            else:
+                if count > 0:
+                    yield last, count
+                last, count = index, N
+        if count > 0:
+            yield last, count
+
+    def getRuns(self):
+        """getRuns
+
+        Returns the vectors of unique unit cell indices and repetitions of
+        all runs, see iterRuns.
+        """
+        runs = np.array(list(self.iterRuns()), dtype=int).reshape(-1, 2)
+        return runs[:,0], runs[:,1]
+
+    def getCounts(self):
+        """getCounts
+
+        Returns the number of occurrences of each unique unit cell.
+        """
+        return self.root.counts
+
+    def getUniquePropertyVector(self, types):
+        """getUniquePropertyVector
+
+        Returns a vector of a numeric property of all unique unit cells.
+        """
+        return np.array([getattr(handle, types) for handle in self.UCHandles])
+
+    def reduceProperty(self, types, func='sum'):
+        """reduceProperty
+
+        Returns the reduction of a numeric property over all unit cells
+        without expanding them. The reduction func can be 'sum', 'mean',
+        'min' or 'max', e.g. reduceProperty('cAxis') is the total length.
+        """
+        props  = self.getUniquePropertyVector(types)
+        counts = self.getCounts()
+        if func == 'sum':
+            return np.tensordot(counts, props, axes=1)
+        elif func == 'mean':
+            return np.tensordot(counts, props, axes=1)/len(self)
+        elif func == 'min':
+            return np.min(props[counts > 0], axis=0)
+        elif func == 'max':
+            return np.max(props[counts > 0], axis=0)
+        else:
+            raise ValueError('Reduction has to be sum, mean, min or max!')
+
+    def reduceRuns(self, types):
+        """reduceRuns
+
+        Returns the vector of the sum of a numeric property for each run,
+        e.g. reduceRuns('cAxis') gives the thickness of each run.
+        """
+        indices, repetitions = self.getRuns()
+        return self.getUniquePropertyVector(types)[indices]*repetitions
+
+    def expand(self):
+        """expand
+
+        Returns the flat vector of unique unit cell indices of all unit
+        cells.
+        """
+        return self.root.expand()
@@ -0,0 +1,158 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import numericalunits as u
+
+
+class materialFunction(object):
+    """materialFunction
+
+    The materialFunction class represents a material property given as
+    string of a lambda function, e.g. 'lambda T: 1.5*T' for a temperature-
+    dependent heat capacity or 'lambda strain: 0.5*(strain+1)' for a
+    strain-dependent atom position. The expression is parsed once and is
+    evaluated vectorized on numpy arrays. The namespace of the expression
+    contains numpy as np and numericalunits as u.
+
+    Instances are pickled by their expression string only, so that unit
+    cells can be sent to worker processes. Optionally, the function can be
+    tabulated on an interval and is then evaluated by linear interpolation
+    within this interval.
+
+    Attributes:
+        funcStr (str)       : original string of the lambda function
+        var (str)           : name of the variable
+        expr (str)          : expression of the function
+        vectorized (bool)   : the expression can be evaluated on arrays
+        table (tuple)       : optional grid and values of the tabulation
+    """
+
+    namespace = {'np': np, 'numpy': np, 'u': u}
+    # compiled expressions, which are shared by all instances of the same string
+    _codeCache = {}
+
+    def __init__(self, funcStr):
+        """Initialize the class and parse the expression.
+
+        Args:
+            funcStr (str) : string of a lambda function with one variable
+
+        """
+        funcStr = funcStr.strip()
+        if not funcStr.startswith('lambda') or ':' not in funcStr:
+            raise ValueError('Material function ' + funcStr + ' is no string of a lambda function!')
+        var, expr       = funcStr[len('lambda'):].split(':', 1)
+        self.funcStr    = funcStr
+        self.var        = var.strip()
+        self.expr       = expr.strip()
+        self.vectorized = True
+        self.table      = None
+        code = self._codeCache.get(funcStr)
+        if code is None:
+            code = self._codeCache[funcStr] = compile(funcStr, '<materialFunction>', 'eval')
+        self._func      = eval(code, dict(self.namespace))
+
+    def __call__(self, x):
+        """Evaluates the function for a scalar or an array.
+
+        """
+        if self.table is not None and np.ndim(x) > 0:
+            return self._interp(np.asarray(x, dtype=float))
+        return self._evaluate(x)
+
+    def _evaluate(self, x):
+        """_evaluate
+
+        Evaluates the expression vectorized and falls back to an
+        element-wise evaluation if it cannot be evaluated on arrays.
+        """
+        if self.vectorized:
+            try:
+                res = self._func(x)
+            except Exception:
+                # the expression cannot be evaluated on arrays
+                if np.ndim(x) == 0:
+                    raise
+                self.vectorized = False
+            else:
+                if np.ndim(res) == 0 and isinstance(x, np.ndarray) and x.ndim > 0:
+                    # constant expressions
+                    res = np.full(x.shape, res, dtype=np.result_type(res, float))
+                return res
+        if np.ndim(x) == 0:
+            return self._func(x)
+        x = np.asarray(x)
+        return np.array([self._func(xi) for xi in x.ravel()]).reshape(x.shape)
+
+    def __str__(self):
+        return self.funcStr
+
+    def __repr__(self):
+        return 'materialFunction({:s})'.format(repr(self.funcStr))
+
+    def __eq__(self, other):
+        return isinstance(other, materialFunction) and other.funcStr == self.funcStr
+
+    def __hash__(self):
+        return hash(self.funcStr)
+
+    def __reduce__(self):
+        # pickle by the expression and the parameters of the tabulation
+        tab = None
+        if self.table is not None:
+            tab = (self.table[0][0], self.table[0][-1], len(self.table[0]))
+        return (_restoreMaterialFunction, (self.funcStr, tab))
+
+    def tabulate(self, xMin, xMax, num=10001):
+        """tabulate
+
+        Tabulates the function on num points between xMin and xMax. Array
+        inputs are then evaluated by linear interpolation within the
+        interval and by the expression outside of it.
+        """
+        grid = np.linspace(xMin, xMax, num)
+        self.table = (grid, np.asarray(self._evaluate(grid), dtype=float))
+        return self
+
+    def _interp(self, x):
+        """_interp
+
+        Evaluates the tabulated function by linear interpolation and falls
+        back to the expression outside of the tabulated interval.
+        """
+        grid, values = self.table
+        # the grid is equidistant, so the interval is found without search
+        pos = (x - grid[0])*((len(grid) - 1)/(grid[-1] - grid[0]))
+        idx = np.clip(pos.astype(int), 0, len(grid) - 2)
+        w   = np.clip(pos - idx, 0, 1)
+        res = values[idx] + w*(values[idx+1] - values[idx])
+        outside = (x < grid[0]) | (x > grid[-1])
+        if np.any(outside):
+            res[outside] = self._evaluate(x[outside])
+        return res
+
+
+def _restoreMaterialFunction(funcStr, tab):
+    """_restoreMaterialFunction
+
+    Recreates a pickled materialFunction.
+    """
+    func = materialFunction(funcStr)
+    if tab is not None:
+        func.tabulate(*tab)
+    return func
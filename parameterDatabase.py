@@ -0,0 +1,384 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import os
+import glob
+import hashlib
+import time
+import threading
+import json
+if __package__:
+    from .helpers import atomicWrite, atomicSave
+else:
+    # the module is run as script to compile the parameter store
+    from helpers import atomicWrite, atomicSave
+
+
+class parameterDatabase(object):
+    """parameterDatabase
+
+    The parameterDatabase class holds the parsed content of the parameter
+    files of the atoms (elements.dat, cromermann.txt and the *.nff files).
+    Every file is parsed only once on first request and the resulting
+    arrays are shared read-only between all atom instances.
+
+    If enabled, all tables are loaded from a precompiled binary store
+    (see compileParameterStore) instead of the text files. The atomic
+    form factors are memory-mapped from the store, so that several
+    processes share the same pages. The text files remain the source of
+    truth and the store is rebuilt whenever their checksum changes. The
+    checksum is only calculated if the sizes or modification times of the
+    text files differ from the ones recorded in the stamp of the store.
+
+    Attributes:
+        paramPath (str)         : base path of the parameter files
+        storePath (str)         : path of the precompiled binary store
+        useStore (bool)         : load the tables from the binary store
+        loadCounts (dict[int])  : number of parsings per parameter file
+        loadTimes (dict[float]) : accumulated parsing time per file [s]
+    """
+
+    def __init__(self, paramPath=None, **kwargs):
+        """Initialize the class with the base path of the parameter files.
+
+        Args:
+            paramPath (Optional[str]) : base path of the parameter files,
+                                        default is the parameters folder
+                                        of the module.
+            storePath (Optional[str]) : path of the binary store, default
+                                        is the compiled folder in the
+                                        parameter path.
+            useStore (Optional[bool]) : load from the binary store,
+                                        default is True.
+
+        """
+        if paramPath is None:
+            paramPath = os.path.join(os.path.dirname(__file__), 'parameters')
+
+        self.paramPath          = paramPath
+        self.storePath          = kwargs.get('storePath', os.path.join(paramPath, 'compiled'))
+        self.useStore           = kwargs.get('useStore', True)
+        self.loadCounts         = {}
+        self.loadTimes          = {}
+        self._elements          = None
+        self._cromerMann        = None
+        self._atomicFormFactors = {}
+        self._storeLoaded       = False
+        self._lock              = threading.RLock()
+
+    def __str__(self):
+        """String representation of this class
+
+        """
+        classStr  = 'Parameter database with the following properties\n'
+        classStr += 'parameter path     : {:s}\n'.format(self.paramPath)
+        classStr += 'store path         : {:s}\n'.format(self.storePath)
+        classStr += 'use store          : {:s}\n'.format(str(self.useStore))
+        classStr += 'loaded files       :\n'
+        for key in sorted(self.loadCounts):
+            classStr += '\t {:s} \t {:d}x \t {:3.2f} ms\n'.format(
+                    key, self.loadCounts[key], self.loadTimes[key]*1e3)
+        return(classStr)
+
+    def _parse(self, key, func, *args, **kwargs):
+        """_parse
+
+        Calls the parsing function and logs the number of calls and the
+        elapsed time for the given key.
+        """
+        t0 = time.perf_counter()
+        res = func(*args, **kwargs)
+        self.loadCounts[key] = self.loadCounts.get(key, 0) + 1
+        self.loadTimes[key]  = self.loadTimes.get(key, 0) + time.perf_counter() - t0
+        return res
+
+    @staticmethod
+    def _readOnly(arr):
+        """_readOnly
+
+        Returns the array with the writeable flag removed so it can be
+        shared safely between instances.
+        """
+        arr.flags.writeable = False
+        return arr
+
+    def _loadStore(self):
+        """_loadStore
+
+        Loads all tables from the binary store once. The store is
+        (re)compiled if it does not exist or if the checksum of the text
+        files has changed. The checksum is skipped if the stamp of the
+        store matches the sizes and modification times of the text files.
+        If the store cannot be written, the tables are parsed from the
+        text files on request.
+        """
+        if self._storeLoaded or not self.useStore:
+            return
+        self._storeLoaded = True
+
+        try:
+            t0 = time.perf_counter()
+            indexFile = os.path.join(self.storePath, 'index.npz')
+            stampFile = os.path.join(self.storePath, 'stamp.json')
+            storeChecksum = None
+            if os.path.isfile(indexFile):
+                with np.load(indexFile) as index:
+                    # stores without the name of the table are recompiled
+                    if 'table' in index:
+                        storeChecksum = str(index['checksum'])
+            files = getParameterStamp(self.paramPath)
+            try:
+                with open(stampFile, 'r') as f:
+                    stamp = json.load(f)
+            except (OSError, ValueError):
+                stamp = {}
+            if storeChecksum is None or stamp.get('checksum') != storeChecksum \
+                    or stamp.get('files') != files:
+                checksum = getParameterChecksum(self.paramPath)
+                if storeChecksum != checksum:
+                    self._parse('compile', compileParameterStore, self.paramPath, self.storePath)
+                try:
+                    atomicWrite(stampFile, json.dumps({'checksum': checksum, 'files': files}), mode='w')
+                except OSError:
+                    # the checksum is calculated again on the next start
+                    pass
+
+            with np.load(indexFile) as index:
+                name     = str(index['table'])
+                symbols  = index['symbols']
+                offsets  = index['offsets']
+                elements = index['elements']
+                cm       = index['cromerMann']
+            table = np.load(os.path.join(self.storePath, name), mmap_mode='r')
+        except Exception as e:
+            print('Cannot load the parameter store {:s}, the text files are '
+                  'parsed instead!'.format(self.storePath))
+            print(e)
+            return
+
+        self._elements = dict((str(row[0]), (str(row[1]), int(row[2]), float(row[3])))
+                              for row in elements)
+        self._cromerMann = self._readOnly(cm)
+        for i, symbol in enumerate(symbols):
+            # slices of the memory map are zero-copy views
+            self._atomicFormFactors[str(symbol)] = table[offsets[i]:offsets[i+1]]
+        self.loadCounts['store'] = self.loadCounts.get('store', 0) + 1
+        self.loadTimes['store']  = self.loadTimes.get('store', 0) + time.perf_counter() - t0
+
+    def getElements(self):
+        """getElements
+
+        Returns a dict of all elements in elements.dat with the symbol as
+        key and the tuple (name, Z, A) as value.
+        """
+        with self._lock:
+            self._loadStore()
+            if self._elements is None:
+                filename = os.path.join(self.paramPath, 'elements/elements.dat')
+                data = self._parse('elements.dat', np.genfromtxt, filename,
+                                   dtype='U2,U15,i8,f8', usecols=(0,1,2,3))
+                self._elements = dict((str(row[0]), (str(row[1]), int(row[2]), float(row[3])))
+                                      for row in data)
+        return self._elements
+
+    def getElement(self, symbol):
+        """getElement
+
+        Returns the tuple (name, Z, A) of the element with the given
+        symbol.
+        """
+        try:
+            return self.getElements()[symbol]
+        except KeyError:
+            raise KeyError('Element {:s} not found in elements data file!'.format(symbol))
+
+    def getCromerMannTable(self):
+        """getCromerMannTable
+
+        Returns the full table of Cromer-Mann coefficients with the columns
+
+        $$ Z\\; I\\; a_1\\; a_2\\; a_3\\; a_4\\; b_1\\; b_2\\; b_3\\; b_4\\; c $$
+        """
+        with self._lock:
+            self._loadStore()
+            if self._cromerMann is None:
+                filename = os.path.join(self.paramPath, 'atomicFormFactors/cromermann.txt')
+                cm = self._parse('cromermann.txt', np.genfromtxt, filename,
+                                 skip_header=1, usecols=(1,2,3,4,5,6,7,8,9,10,11))
+                self._cromerMann = self._readOnly(cm)
+        return self._cromerMann
+
+    def getCromerMannCoeff(self, Z, ionicity=0):
+        """getCromerMannCoeff
+
+        Returns the first row of the Cromer-Mann table matching the atomic
+        number Z and the ionicity.
+        """
+        cm = self.getCromerMannTable()
+        rows = cm[(cm[:,0] == Z) & (cm[:,1] == ionicity)]
+        if len(rows) == 0:
+            raise KeyError('No Cromer-Mann coefficients for Z = {:d} and '
+                           'ionicity {:d} found!'.format(int(Z), int(ionicity)))
+        return rows[0]
+
+    def getAtomicFormFactorCoeff(self, symbol):
+        """getAtomicFormFactorCoeff
+
+        Returns the table of energy [eV], $f_1$ and $f_2$ of the element
+        with the given symbol (Henke tables).
+        """
+        key = symbol.lower()
+        with self._lock:
+            self._loadStore()
+            if key not in self._atomicFormFactors:
+                filename = os.path.join(self.paramPath,
+                                        'atomicFormFactors/{:s}.nff'.format(key))
+                f = self._parse('{:s}.nff'.format(key), np.genfromtxt, filename, skip_header=1)
+                self._atomicFormFactors[key] = self._readOnly(f)
+        return self._atomicFormFactors[key]
+
+    def getLoadStatistics(self):
+        """getLoadStatistics
+
+        Returns a dict with the number of parsings and the accumulated
+        parsing time [s] for each loaded parameter file.
+        """
+        return dict((key, {'count': self.loadCounts[key], 'time': self.loadTimes[key]})
+                    for key in self.loadCounts)
+
+    def clear(self):
+        """clear
+
+        Removes all loaded tables and resets the load statistics.
+        """
+        with self._lock:
+            self._elements          = None
+            self._cromerMann        = None
+            self._atomicFormFactors = {}
+            self._storeLoaded       = False
+            self.loadCounts         = {}
+            self.loadTimes          = {}
+
+
+def _getParameterFiles(paramPath):
+    """_getParameterFiles
+
+    Returns the sorted list of all parameter text files.
+    """
+    files = [os.path.join(paramPath, 'elements', 'elements.dat'),
+             os.path.join(paramPath, 'atomicFormFactors', 'cromermann.txt')]
+    files += sorted(glob.glob(os.path.join(paramPath, 'atomicFormFactors', '*.nff')))
+    return files
+
+
+def getParameterStamp(paramPath):
+    """getParameterStamp
+
+    Returns the list of the names, sizes and modification times [ns] of
+    all parameter text files.
+    """
+    stamp = []
+    for filename in _getParameterFiles(paramPath):
+        stat = os.stat(filename)
+        stamp.append([os.path.relpath(filename, paramPath), stat.st_size, stat.st_mtime_ns])
+    return stamp
+
+
+def getParameterChecksum(paramPath):
+    """getParameterChecksum
+
+    Returns the SHA1 checksum of the names and contents of all parameter
+    text files.
+    """
+    sha = hashlib.sha1()
+    for filename in _getParameterFiles(paramPath):
+        sha.update(os.path.relpath(filename, paramPath).encode())
+        with open(filename, 'rb') as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+
+def compileParameterStore(paramPath=None, storePath=None):
+    """compileParameterStore
+
+    Compiles all parameter text files into a binary store consisting of
+
+        formFactors-<checksum>.npy  : flat table of energy [eV], $f_1$ and
+                                      $f_2$ of all elements which can be
+                                      memory-mapped
+        index.npz                   : name of the table, symbols and row
+                                      offsets into the table, the elements
+                                      table, the Cromer-Mann table and the
+                                      checksum of the text files
+
+    The files are written atomically and the index is replaced last, so
+    that concurrent processes always read an index together with its own
+    table. The tables of former checksums are removed afterwards.
+    """
+    if paramPath is None:
+        paramPath = os.path.join(os.path.dirname(__file__), 'parameters')
+    if storePath is None:
+        storePath = os.path.join(paramPath, 'compiled')
+
+    checksum = getParameterChecksum(paramPath)
+    # parse the text files without any store
+    db = parameterDatabase(paramPath, useStore=False)
+    elements = db.getElements()
+    elementsArray = np.array([(key,) + value for key, value in elements.items()],
+                             dtype='U2,U15,i8,f8')
+
+    nffFiles = sorted(glob.glob(os.path.join(paramPath, 'atomicFormFactors', '*.nff')))
+    symbols  = [os.path.splitext(os.path.basename(f))[0] for f in nffFiles]
+    tables   = [np.atleast_2d(db.getAtomicFormFactorCoeff(symbol)) for symbol in symbols]
+    offsets  = np.cumsum([0] + [len(t) for t in tables])
+    table    = np.ascontiguousarray(np.vstack(tables), dtype=np.float64)
+
+    os.makedirs(storePath, exist_ok=True)
+    tableName = 'formFactors-{:s}.npy'.format(checksum)
+    atomicSave(os.path.join(storePath, tableName), np.save, table)
+    # replacing the index switches the store to the new table at once
+    atomicSave(os.path.join(storePath, 'index.npz'), np.savez, table=np.array(tableName),
+               symbols=np.array(symbols), offsets=offsets, elements=elementsArray,
+               cromerMann=np.asarray(db.getCromerMannTable()), checksum=np.array(checksum))
+    for filename in glob.glob(os.path.join(storePath, 'formFactors*.npy')):
+        if os.path.basename(filename) != tableName:
+            try:
+                os.remove(filename)
+            except OSError:
+                # the table is still memory-mapped on some platforms
+                pass
+    return storePath
+
+
+_database = None
+
+
+def getParameterDatabase():
+    """getParameterDatabase
+
+    Returns the process-wide parameterDatabase instance which is created
+    on first request.
+    """
+    global _database
+    if _database is None:
+        _database = parameterDatabase()
+    return _database
+
+
+if __name__ == '__main__':
+    print('Compiled parameter store to {:s}'.format(compileParameterStore()))
@@ -0,0 +1,311 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import os
+import time
+import itertools
+from .unitCell import unitCell
+from .structure import structure
+from .parameterDatabase import getParameterDatabase
+
+# properties of the unit cells which can be swept, they are passed to the
+# constructor of the unitCell, so that all derived properties are updated
+sweepProperties = ['cAxis', 'aAxis', 'bAxis', 'debWalFac', 'soundVel', 'phononDamping',
+                   'optPenDepth', 'optRefIndex', 'optRefIndexPerStrain',
+                   'heatCapacity', 'thermCond', 'linThermExp', 'subSystemCoupling']
+# material functions of the unit cells and their anti-derivatives
+_sweepFunctions = {'heatCapacity': 'intHeatCapacity', 'linThermExp': 'intLinThermExp',
+                   'thermCond': None, 'subSystemCoupling': None}
+
+
+class parameterSweep(object):
+    """parameterSweep
+
+    The parameterSweep class runs a simulation function for all variants of
+    a base structure on a grid of parameters in a pool of processes.
+
+    The keys of the parameter grid are either of the form 'ID.attribute',
+    which sets a property of the constructor of the unitCell with the ID,
+    e.g. 'SRO.soundVel', 'SRO.cAxis' or 'SRO.heatCapacity', see
+    sweepProperties, or 'name.N', which sets the number
+    of repetitions of all substructure entries of the unitCell or
+    structure with this ID or name. All other keys are passed as keyword
+    arguments to the simulation function, which is called as
+    func(S, **kwargs) with the variant S and has to return an array of
+    the same shape for all variants. The function must be picklable, i.e.
+    defined on module level.
+
+    The base structure is sent only once to every worker process. The
+    workers load the parameter tables from the shared parameter database
+    and compile the atom positions of the unit cells once. A variant is
+    a new substructures tree which shares all unit cells without changed
+    attributes with the base structure, so that only the parameters of a
+    task are sent to the workers.
+
+    Attributes:
+        S (structure)       : base structure of the variants
+        func (function)     : simulation function func(S, **kwargs)
+        grid (dict[list])   : values of the parameters
+        processes (int)     : number of worker processes, the tasks are
+                              run in the current process for 1
+        chunkSize (int)     : number of tasks sent to a worker at once
+        verbose (bool)      : print the progress
+        times (ndarray[float])  : run time of every task [s]
+        totalTime (float)       : wall-clock time of the last run [s]
+    """
+
+    def __init__(self, S, func, grid, **kwargs):
+        """Initialize the class.
+
+        Args:
+            S (structure)               : base structure
+            func (function)             : simulation function
+            grid (dict[list])           : values of the parameters
+            processes (Optional[int])   : default is the number of CPUs
+            chunkSize (Optional[int])   : default is 1
+            verbose (Optional[bool])    : default is True
+
+        """
+        self.S          = S
+        self.func       = func
+        self.grid       = dict(grid)
+        self.processes  = kwargs.get('processes', os.cpu_count())
+        self.chunkSize  = kwargs.get('chunkSize', 1)
+        self.verbose    = kwargs.get('verbose', True)
+        self.times      = None
+        self.totalTime  = None
+
+    def __str__(self):
+        """String representation of this class
+
+        """
+        classStr  = 'Parameter sweep with the following properties\n'
+        classStr += 'sample                 : {:s}\n'.format(self.S.name)
+        classStr += 'function               : {:s}\n'.format(getattr(self.func, '__name__', str(self.func)))
+        classStr += 'number of tasks        : {:d}\n'.format(int(np.prod(self.getShape())))
+        classStr += 'processes              : {:d}\n'.format(self.processes)
+        for key, values in self.grid.items():
+            classStr += '{:22s} : {:d} values\n'.format(key, len(values))
+        if self.times is not None:
+            classStr += 'total time             : {:3.2f} s\n'.format(self.totalTime)
+            classStr += 'mean time per task     : {:3.2f} s\n'.format(np.mean(self.times))
+        return(classStr)
+
+    def getShape(self):
+        """getShape
+
+        Returns the shape of the parameter grid.
+        """
+        return tuple(len(values) for values in self.grid.values())
+
+    def getParameters(self):
+        """getParameters
+
+        Returns the list of dicts of the parameters of all tasks in the
+        order of the flattened parameter grid.
+        """
+        keys = list(self.grid.keys())
+        return [dict(zip(keys, values)) for values in itertools.product(*self.grid.values())]
+
+    def getVariant(self, params):
+        """getVariant
+
+        Returns the variant of the base structure for a dict of parameters,
+        see applyParameters.
+        """
+        return applyParameters(self.S, params)[0]
+
+    def run(self):
+        """run
+
+        Runs the simulation function for all variants and returns the
+        stacked results with the shape of the parameter grid followed by
+        the shape of the results. The run time of every task is stored in
+        times.
+        """
+        tasks = list(enumerate(self.getParameters()))
+        results = [None]*len(tasks)
+        times   = np.zeros(len(tasks))
+        t0 = time.perf_counter()
+        if self.processes == 1:
+            _initWorker(self.S, self.func)
+            outputs = map(_runTask, tasks)
+        else:
+            import multiprocessing
+            pool = multiprocessing.Pool(self.processes, initializer=_initWorker,
+                                        initargs=(self.S, self.func))
+            outputs = pool.imap_unordered(_runTask, tasks, chunksize=self.chunkSize)
+        try:
+            for n, (i, res, dt) in enumerate(outputs):
+                results[i] = res
+                times[i]   = dt
+                if self.verbose:
+                    print('task {:d}/{:d} finished in {:3.2f} s ({:3.2f} s elapsed)'.format(
+                        n + 1, len(tasks), dt, time.perf_counter() - t0))
+        finally:
+            if self.processes != 1:
+                pool.close()
+                pool.join()
+            _initWorker(None, None)
+        self.totalTime = time.perf_counter() - t0
+        self.times = times.reshape(self.getShape())
+        results = np.stack([np.asarray(res) for res in results])
+        return results.reshape(self.getShape() + results.shape[1:])
+
+
+def applyParameters(S, params):
+    """applyParameters
+
+    Returns a variant of the structure for a dict of parameters and the
+    dict of the parameters which are no structure parameters. The keys of
+    the structure parameters are 'ID.property' for the sweepProperties of
+    unitCells and 'name.N' for the number of repetitions of unitCells or
+    structures. The variant shares all unit cells without changed
+    properties with the original structure. Unknown properties, IDs and
+    names raise a ValueError.
+    """
+    attributes  = {}
+    repetitions = {}
+    others      = {}
+    for key, value in params.items():
+        if '.' not in key:
+            others[key] = value
+            continue
+        ID, attr = key.rsplit('.', 1)
+        if attr == 'N':
+            repetitions[ID] = int(value)
+        elif attr in sweepProperties:
+            attributes.setdefault(ID, {})[attr] = value
+        else:
+            raise ValueError('The unitCell property ' + attr + ' cannot be swept, only '
+                             + ', '.join(sweepProperties) + ' and N!')
+
+    UCIDs, UCHandles = S.getUniqueUnitCells()
+    unknown = set(attributes) - set(UCIDs)
+    if unknown:
+        raise ValueError('The structure has no unitCells with the IDs ' + ', '.join(sorted(unknown)) + '!')
+    unknown = set(repetitions) - _getEntryNames(S)
+    if unknown:
+        raise ValueError('The structure has no unitCells or substructures with the IDs or names '
+                         + ', '.join(sorted(unknown)) + '!')
+    unitCells = {}
+    for ID, attrs in attributes.items():
+        unitCells[ID] = _copyUnitCell(UCHandles[UCIDs.index(ID)], attrs)
+    return _copyStructure(S, unitCells, repetitions), others
+
+
+def _copyUnitCell(UC, attrs):
+    """_copyUnitCell
+
+    Returns a new unitCell with the properties of the unitCell UC and the
+    changed properties, which is built by the constructor, so that the
+    area, volume, mass, density and spring constant are recalculated.
+    """
+    kwargs = {}
+    for name in sweepProperties[1:]:
+        if name in _sweepFunctions:
+            kwargs[name] = list(getattr(UC, name + 'Str'))
+        else:
+            kwargs[name] = getattr(UC, name)
+    kwargs.update(attrs)
+    variant = unitCell(UC.ID, UC.name, kwargs.pop('cAxis', UC.cAxis), **kwargs)
+    if UC.atoms:
+        variant.addAtoms([a[0] for a in UC.atoms], [a[2] for a in UC.atoms])
+        # the positions are relative and do not depend on the swept properties
+        variant._compiledAtomPositions = UC._compiledAtomPositions
+    if len(UC.springConst) > 1:
+        variant.setHOspringConstants(UC.springConst[1:])
+    # the anti-derivatives of unchanged material functions are kept
+    for name, intName in _sweepFunctions.items():
+        if intName is not None and name not in attrs and isinstance(getattr(UC, '_' + intName, None), list):
+            setattr(variant, '_' + intName, getattr(UC, '_' + intName))
+            setattr(variant, intName + 'Str', getattr(UC, intName + 'Str'))
+    return variant
+
+
+def _getEntryNames(S):
+    """_getEntryNames
+
+    Returns the set of the IDs of the unitCells and the names of the
+    structures of all substructure entries of the structure and its
+    substrate, whose repetitions can be swept.
+    """
+    names = set()
+    for sub, N in S.substructures:
+        if isinstance(sub, unitCell):
+            names.add(sub.ID)
+        else:
+            names.add(sub.name)
+            names |= _getEntryNames(sub)
+    if S.substrate:
+        names |= _getEntryNames(S.substrate)
+    return names
+
+
+def _copyStructure(S, unitCells, repetitions):
+    """_copyStructure
+
+    Returns a copy of the substructures tree of the structure with the
+    replaced unit cells and numbers of repetitions.
+    """
+    variant = structure(S.name)
+    for sub, N in S.substructures:
+        if isinstance(sub, unitCell):
+            N   = repetitions.get(sub.ID, N)
+            sub = unitCells.get(sub.ID, sub)
+        else:
+            N   = repetitions.get(sub.name, N)
+            sub = _copyStructure(sub, unitCells, repetitions)
+        variant.addSubStructure(sub, N)
+    if S.substrate:
+        variant.addSubstrate(_copyStructure(S.substrate, unitCells, repetitions))
+    return variant
+
+
+# base structure and simulation function of the worker process
+_worker = {}
+
+
+def _initWorker(S, func):
+    """_initWorker
+
+    Initializes a worker process with the base structure and the
+    simulation function. The parameter tables and the atom positions of
+    all unit cells are loaded once per worker.
+    """
+    _worker.clear()
+    if S is None:
+        return
+    getParameterDatabase()
+    for UC in S.getUniqueUnitCells()[1]:
+        UC.compileAtomPositions()
+    _worker['S']    = S
+    _worker['func'] = func
+
+
+def _runTask(task):
+    """_runTask
+
+    Runs the simulation function for the variant of one task and returns
+    the index of the task, the result and the run time.
+    """
+    i, params = task
+    t0 = time.perf_counter()
+    S, kwargs = applyParameters(_worker['S'], params)
+    res = _worker['func'](S, **kwargs)
+    return i, res, time.perf_counter() - t0
@@ -0,0 +1,328 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import numericalunits as u
+from .chunkedMap import chunkedMap, getStructureMetadata
+from .helpers import getTimeVector
+u.reset_units('SI')
+
+
+class phonon(object):
+    """phonon
+
+    The phonon class simulates the coherent strain propagation in a
+    structure by a linear chain of masses and springs. Each unit cell is a
+    mass $m_i$ on top of a spring with the spring constants of the unit
+    cell, the surface is free and the spring of the last unit cell is
+    attached to a fixed wall. The chain is driven by the thermal expansion
+    of the unit cells
+
+    $$ \\sigma_i(t) = \\sum_k \\int_{T_{ik}(0)}^{T_{ik}(t)} \\alpha_{ik}(T) dT $$
+
+    calculated from intLinThermExp for a temperature map, e.g. of a heat
+    simulation. The extension of the spring $i$ is
+    $e_i = x_{i+1} - x_i - c_i \\sigma_i$ and its force is
+    $\\sum_j k_{ij} e_i^{j+1}$ with the harmonic and the higher order spring
+    constants springConst of the unit cell, plus the damping force
+    $\\gamma_i (\\dot{x}_{i+1} - \\dot{x}_i)$ with the phononDamping
+    $\\gamma_i$. The strain of the unit cell is $(x_{i+1} - x_i)/c_i$.
+
+    In the eigenmode mode the harmonic and undamped chain is solved
+    analytically: the mass-weighted tridiagonal system is diagonalized
+    once and the modes are propagated exactly between the time steps with
+    the stress taken as constant at the mean of both time steps. The
+    eigenmodes require memory and time of the order N^2 and are reused as
+    long as the structure and its unit cells do not change. Therefore,
+    structures of more than maxEigenmodeCells unit cells are always
+    simulated in the ode mode, in which the equations of motion are
+    integrated numerically with memory of the order N, which also covers
+    anharmonic and damped chains. In both modes the strain maps are
+    calculated in chunks of time steps, which can be streamed to disk.
+
+    Attributes:
+        S (structure)       : sample to do simulations with
+        mode (str)          : 'eigenmode' or 'ode'
+        maxEigenmodeCells (int) : maximum number of unit cells of the
+                                  eigenmode mode
+        odeMethod (str)     : integration method of scipy's solve_ivp
+        rtol (float)        : relative tolerance of the ode mode
+        atol (float)        : absolute tolerance of the displacements of
+                              the ode mode [m]
+        resultCache (resultCache)   : optional on-disk cache of the strain
+                                      maps, default is None
+    """
+
+    def __init__(self, S, **kwargs):
+        """Initialize the class.
+
+        Args:
+            S (structure)               : sample
+            mode (Optional[str])        : default is eigenmode
+            maxEigenmodeCells (Optional[int])   : default is 5000, i.e.
+                                                  200 MB of eigenvectors
+            odeMethod (Optional[str])   : default is RK45
+            rtol (Optional[float])      : default is 1e-6
+            atol (Optional[float])      : default is 1e-18 m
+            resultCache (Optional[resultCache]) : default is None
+
+        """
+        self.S          = S
+        self.mode       = kwargs.get('mode', 'eigenmode')
+        self.maxEigenmodeCells = kwargs.get('maxEigenmodeCells', 5000)
+        self.odeMethod  = kwargs.get('odeMethod', 'RK45')
+        self.rtol       = kwargs.get('rtol', 1e-6)
+        self.atol       = kwargs.get('atol', 1e-18*u.m)
+        self.resultCache = kwargs.get('resultCache', None)
+        self._eigenKey  = None
+        self._eigen     = None
+
+    def __str__(self):
+        """String representation of this class
+
+        """
+        classStr  = 'Phonon simulation with the following properties\n'
+        classStr += 'sample                 : {:s}\n'.format(self.S.name)
+        classStr += 'number of unit cells   : {:d}\n'.format(self.S.getNumberOfUnitCells())
+        classStr += 'mode                   : {:s}\n'.format(self.getMode())
+        if self.getMode() == 'ode':
+            classStr += 'ode method             : {:s}\n'.format(self.odeMethod)
+        return(classStr)
+
+    def getMode(self):
+        """getMode
+
+        Returns the mode of the simulation, which is the ode mode for
+        structures of more than maxEigenmodeCells unit cells.
+        """
+        if self.mode == 'eigenmode' and self.S.getNumberOfUnitCells() > self.maxEigenmodeCells:
+            return 'ode'
+        return self.mode
+
+    def getChainProperties(self):
+        """getChainProperties
+
+        Returns a dict with the vectors of the c-axes, masses, damping
+        constants and the (N x orders) array of spring constants of all
+        unit cells.
+        """
+        compiled = self.S.compile()
+        springs  = compiled.getUniquePropertyVector('springConst')
+        return {'cAxis': compiled.getPropertyVector('cAxis'),
+                'mass': compiled.getPropertyVector('mass'),
+                'phononDamping': compiled.getPropertyVector('phononDamping').astype(float),
+                'springConst': np.reshape(springs, (len(compiled.UCHandles), -1))[compiled.indices]}
+
+    def getEigenmodes(self):
+        """getEigenmodes
+
+        Returns the angular frequencies [rad/s] and the mass-weighted
+        eigenvectors of the harmonic chain. They are calculated once with a
+        tridiagonal eigensolver and are recalculated only if the structure,
+        the masses or the harmonic spring constants change.
+        """
+        from scipy.linalg import eigh_tridiagonal
+
+        props = self.getChainProperties()
+        k     = props['springConst'][:, 0]
+        m     = props['mass']
+        key   = (self.S._getSignature(), k.tobytes(), m.tobytes())
+        if key != self._eigenKey:
+            # D = M^-1/2 K M^-1/2 of the chain with the fixed wall below the last spring
+            diag = (k + np.concatenate([[0], k[:-1]]))/m
+            off  = -k[:-1]/np.sqrt(m[:-1]*m[1:])
+            omega2, V = eigh_tridiagonal(diag, off)
+            self._eigen    = (np.sqrt(np.maximum(omega2, 0)), V)
+            self._eigenKey = key
+        return self._eigen
+
+    def getThermalStrain(self, tempMap, refTemp=None):
+        """getThermalStrain
+
+        Returns the (time x N) map of the thermal expansion of all unit
+        cells of the (time x N) or (time x N x numSubSystems) temperature
+        map relative to the reference temperatures, which default to the
+        first time step.
+        """
+        tempMap = np.asarray(tempMap, dtype=float)
+        if tempMap.ndim == 2:
+            tempMap = tempMap[:, :, np.newaxis]
+        if refTemp is None:
+            refTemp = tempMap[0]
+        refTemp = np.reshape(np.asarray(refTemp, dtype=float), tempMap.shape[1:])
+        ref = self.S.evalUnitCellFunctions('intLinThermExp', refTemp).sum(axis=1)
+        return np.array([self.S.evalUnitCellFunctions('intLinThermExp', T).sum(axis=1) - ref
+                         for T in tempMap])
+
+    def _getForces(self, sigma, k, c):
+        """_getForces
+
+        Returns the harmonic forces on all masses of the thermal expansion
+        sigma of the springs for a (time x N) map.
+        """
+        F = k*c*sigma
+        f = -F
+        f[..., 1:] += F[..., :-1]
+        return f
+
+    def _getStrain(self, x, c):
+        """_getStrain
+
+        Returns the strains of all unit cells for (... x N) displacements.
+        """
+        strain = -x/c
+        strain[..., :-1] += x[..., 1:]/c[:-1]
+        return strain
+
+    def iterStrainMap(self, time, tempMap, chunkSize=100):
+        """iterStrainMap
+
+        Calculates the strain map for the time vector and the temperature
+        map of the same time vector and yields it in chunks of chunkSize
+        time steps as tuples of the time vector and the (time x N) strain
+        array of the chunk. The temperature map may be a memory-mapped
+        array. The chain is at rest at the first time step. The time
+        vector has to be sorted in ascending order.
+        """
+        time = getTimeVector(time)
+        if len(time) != len(tempMap):
+            raise ValueError('The temperature map must have one entry per time step!')
+        mode = self.getMode()
+        if mode == 'eigenmode':
+            return self._iterEigenmode(time, tempMap, chunkSize)
+        elif mode == 'ode':
+            return self._iterODE(time, tempMap, chunkSize)
+        raise ValueError('The phonon mode has to be eigenmode or ode!')
+
+    def _iterEigenmode(self, time, tempMap, chunkSize):
+        """_iterEigenmode
+
+        Yields the strain map of the harmonic chain by exact propagation of
+        the eigenmodes.
+        """
+        props = self.getChainProperties()
+        if np.any(props['phononDamping'] != 0) or np.any(props['springConst'][:, 1:] != 0):
+            raise ValueError('The eigenmode mode requires a harmonic and undamped chain, '
+                             'use the ode mode instead!')
+        omega, V = self.getEigenmodes()
+        if np.any(omega <= 0):
+            raise ValueError('The spring constants of all unit cells have to be positive!')
+        k, c, m  = props['springConst'][:, 0], props['cAxis'], props['mass']
+        sqm      = np.sqrt(m)
+        q        = np.zeros(len(m))
+        dq       = np.zeros(len(m))
+        for start in range(0, len(time), chunkSize):
+            stop  = min(start + chunkSize, len(time))
+            first = max(start - 1, 0)
+            sigma = self.getThermalStrain(tempMap[first:stop], tempMap[0])
+            if start == 0:
+                sigma = np.vstack([sigma[0:1], sigma])
+            # modal forces of the mean thermal stress of the intervals ending at each time step
+            p = (self._getForces((sigma[:-1] + sigma[1:])/2, k, c)/sqm) @ V
+            Q = np.empty((stop - start, len(q)))
+            for i, n in enumerate(range(start, stop)):
+                if n > 0:
+                    h = time[n] - time[n-1]
+                    # equilibrium of the modes for the constant force
+                    q0 = p[i]/omega**2
+                    cos, sin = np.cos(omega*h), np.sin(omega*h)
+                    q, dq = (cos*(q - q0) + sin/omega*dq + q0, -omega*sin*(q - q0) + cos*dq)
+                Q[i] = q
+            yield time[start:stop], self._getStrain((Q @ V.T)/sqm, c)
+
+    def _iterODE(self, time, tempMap, chunkSize):
+        """_iterODE
+
+        Yields the strain map by numerical integration of the equations of
+        motion of the anharmonic and damped chain.
+        """
+        from scipy.integrate import solve_ivp
+
+        props = self.getChainProperties()
+        k, c, m, gamma = props['springConst'], props['cAxis'], props['mass'], props['phononDamping']
+        N      = len(m)
+        state  = np.zeros(2*N)
+        # the velocities are weighted with the highest eigenfrequency of the chain
+        atol   = np.concatenate([np.full(N, self.atol),
+                                 np.full(N, self.atol*2*np.sqrt(np.max(k[:, 0]/m)))])
+        tLast  = time[0]
+
+        def rhs(t, y, tSigma, sigma):
+            x, v = y[:N], y[N:]
+            # thermal expansion linearly interpolated in time
+            j = min(max(np.searchsorted(tSigma, t) - 1, 0), len(tSigma) - 2)
+            w = (t - tSigma[j])/(tSigma[j+1] - tSigma[j])
+            e = np.append(x[1:], 0) - x - c*((1 - w)*sigma[j] + w*sigma[j+1])
+            de = np.append(v[1:], 0) - v
+            F = gamma*de
+            ePow = np.ones(N)
+            for order in range(k.shape[1]):
+                ePow = ePow*e
+                F += k[:, order]*ePow
+            a = F.copy()
+            a[1:] -= F[:-1]
+            return np.concatenate([v, a/m])
+
+        for start in range(0, len(time), chunkSize):
+            stop   = min(start + chunkSize, len(time))
+            first  = max(start - 1, 0)
+            tSigma = time[first:stop]
+            sigma  = self.getThermalStrain(tempMap[first:stop], tempMap[0])
+            X      = np.zeros((stop - start, N))
+            if len(tSigma) > 1:
+                res = solve_ivp(rhs, (tLast, time[stop-1]), state, method=self.odeMethod,
+                                t_eval=time[start:stop], args=(tSigma, sigma), rtol=self.rtol,
+                                atol=atol)
+                if not res.success:
+                    raise RuntimeError(res.message)
+                X[-res.y.shape[1]:] = res.y[:N].T
+                state = res.y[:, -1]
+                tLast = time[stop-1]
+            yield time[start:stop], self._getStrain(X, c)
+
+    def getStrainMap(self, time, tempMap, chunkSize=100):
+        """getStrainMap
+
+        Returns the (time x N) strain map, see iterStrainMap. If a
+        resultCache is given, the strain map is taken from the cache or is
+        stored in it.
+        """
+        if self.resultCache is not None:
+            params = {'time': time, 'tempMap': tempMap, 'mode': self.getMode(),
+                      'odeMethod': self.odeMethod, 'rtol': self.rtol, 'atol': self.atol}
+            strainMap = self.resultCache.get('strainMap', self.S, **params)
+            if strainMap is not None:
+                return strainMap
+        strainMap = np.concatenate([strain for _, strain in self.iterStrainMap(time, tempMap, chunkSize)])
+        if self.resultCache is not None:
+            self.resultCache.put('strainMap', self.S, strainMap, **params)
+        return strainMap
+
+    def saveStrainMap(self, path, time, tempMap, chunkSize=100, compress=False, overwrite=False):
+        """saveStrainMap
+
+        Streams the (time x N) strain map chunk by chunk into a chunkedMap
+        in the directory path together with the metadata of the structure,
+        so that only one chunk is held in memory. The temperature map may
+        be a chunkedMap as well. An existing map in path is only replaced
+        if overwrite is True. Returns the chunkedMap.
+        """
+        # the time vector is checked before the map is created
+        chunks    = self.iterStrainMap(time, tempMap, chunkSize)
+        strainMap = chunkedMap(path, shape=(self.S.getNumberOfUnitCells(),), compress=compress,
+                               metadata=getStructureMetadata(self.S, 'phonon'), overwrite=overwrite)
+        return strainMap.write(chunks)
@@ -0,0 +1,361 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import os
+import io
+import json
+import time
+import hashlib
+from .helpers import getCacheDir, atomicWrite
+from .materialFunction import materialFunction
+
+# properties of the unit cells which are derived from other properties
+_derivedProperties = ['intHeatCapacityStr', 'intLinThermExpStr', 'compiledAtomPositions']
+
+
+class resultCache(object):
+    """resultCache
+
+    The resultCache class stores results of simulations, such as
+    temperature maps, strain maps and structure factors, as .npy files on
+    the local disk. The results are keyed on the name of the result, the
+    fingerprint of the structure, see getFingerprintComponents, and the
+    parameters of the simulation, so that identical simulations are reused
+    across processes and sessions. Every result is accompanied by a JSON
+    file of its metadata.
+
+    The size of the cache is bounded by maxBytes. The least recently used
+    results are evicted first. If a result is not found, the invalidation
+    report lists the components of the structure and the parameters which
+    changed compared to the last stored result of the same name.
+
+    Attributes:
+        path (str)                  : directory of the cached results
+        maxBytes (int)              : maximum size of all results [bytes]
+        hits (int)                  : number of cache hits
+        misses (int)                : number of cache misses
+        lastReport (list[str])      : invalidation report of the last miss
+    """
+
+    version = 1
+
+    def __init__(self, path=None, maxBytes=1024**3):
+        """Initialize the class.
+
+        Args:
+            path (Optional[str])        : directory of the cached results,
+                                          default is the results folder in
+                                          the cache directory.
+            maxBytes (Optional[int])    : maximum size of all results,
+                                          default is 1 GiB.
+
+        """
+        self.path       = path if path is not None else getCacheDir('results')
+        self.maxBytes   = maxBytes
+        self.hits       = 0
+        self.misses     = 0
+        self.lastReport = []
+        os.makedirs(self.path, exist_ok=True)
+
+    def __str__(self):
+        """String representation of this class
+
+        """
+        stats = self.getStatistics()
+        classStr  = 'Result cache with the following properties\n'
+        classStr += 'path                   : {:s}\n'.format(self.path)
+        classStr += 'results                : {:d}\n'.format(stats['size'])
+        classStr += 'size                   : {:3.2f} / {:3.2f} MiB\n'.format(
+            stats['nbytes']/1024**2, self.maxBytes/1024**2)
+        classStr += 'hits / misses          : {:d} / {:d}\n'.format(self.hits, self.misses)
+        return(classStr)
+
+    def getKey(self, name, S, **params):
+        """getKey
+
+        Returns the key of the result, the fingerprint components of the
+        structure and the hashes of the parameters.
+        """
+        components = getFingerprintComponents(S)
+        paramHashes = dict((key, getHash(value)) for key, value in params.items())
+        key = getHash([self.version, name, sorted(components.items()), sorted(paramHashes.items())])
+        return key, components, paramHashes
+
+    def _getFilenames(self, key):
+        return os.path.join(self.path, key + '.npy'), os.path.join(self.path, key + '.json')
+
+    def get(self, name, S, **params):
+        """get
+
+        Returns the cached result for the structure and the parameters or
+        None. The invalidation report of a miss is stored in lastReport.
+        """
+        key, components, paramHashes = self.getKey(name, S, **params)
+        dataFile, metaFile = self._getFilenames(key)
+        try:
+            value = np.load(dataFile)
+            # the modification time marks the last use for the eviction
+            os.utime(dataFile)
+        except (OSError, ValueError):
+            self.misses += 1
+            self.lastReport = self._getReport(name, components, paramHashes)
+            return None
+        self.hits += 1
+        self.lastReport = []
+        return value
+
+    def put(self, name, S, value, **params):
+        """put
+
+        Stores the result for the structure and the parameters, evicts the
+        least recently used results if the cache exceeds maxBytes and
+        returns the result.
+        """
+        key, components, paramHashes = self.getKey(name, S, **params)
+        dataFile, metaFile = self._getFilenames(key)
+        buffer = io.BytesIO()
+        np.save(buffer, np.asarray(value), allow_pickle=False)
+        if buffer.tell() > self.maxBytes:
+            return value
+        meta = {'version': self.version, 'name': name, 'created': time.time(),
+                'nbytes': buffer.tell(), 'components': components, 'parameters': paramHashes}
+        try:
+            atomicWrite(metaFile, json.dumps(meta, indent=1, sort_keys=True), mode='w')
+            atomicWrite(dataFile, buffer.getvalue())
+        except OSError as e:
+            print('Cannot write the result {:s} to the cache {:s}!'.format(name, self.path))
+            print(e)
+            return value
+        self.evict()
+        return value
+
+    def _getEntries(self):
+        """_getEntries
+
+        Returns the list of (last use, size, key) of all cached results.
+        """
+        entries = []
+        for filename in os.listdir(self.path):
+            if not filename.endswith('.npy'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, filename))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, filename[:-4]))
+        return entries
+
+    def evict(self):
+        """evict
+
+        Removes the least recently used results until the size of the
+        cache is below maxBytes.
+        """
+        entries = sorted(self._getEntries())
+        nbytes  = sum(entry[1] for entry in entries)
+        for _, size, key in entries:
+            if nbytes <= self.maxBytes:
+                break
+            for filename in self._getFilenames(key):
+                try:
+                    os.remove(filename)
+                except OSError:
+                    pass
+            nbytes -= size
+
+    def _getReport(self, name, components, paramHashes):
+        """_getReport
+
+        Returns the list of changes of the structure components and the
+        parameters compared to the most recently created result of the
+        same name.
+        """
+        last = None
+        for filename in os.listdir(self.path):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.path, filename), 'r') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if meta.get('name') == name and (last is None or meta['created'] > last['created']):
+                last = meta
+        if last is None:
+            return ['no cached result {:s}'.format(name)]
+        report = []
+        for kind, old, new in [('component', last['components'], components),
+                               ('parameter', last['parameters'], paramHashes)]:
+            for key in sorted(set(old) | set(new)):
+                if key not in old:
+                    report.append('{:s} {:s} added'.format(kind, key))
+                elif key not in new:
+                    report.append('{:s} {:s} removed'.format(kind, key))
+                elif old[key] != new[key]:
+                    report.append('{:s} {:s} changed'.format(kind, key))
+        return report
+
+    def getInvalidationReport(self, name, S, **params):
+        """getInvalidationReport
+
+        Returns the list of the components of the structure and the
+        parameters which changed compared to the most recently created
+        result of the same name. The list is empty if the result is
+        cached.
+        """
+        key, components, paramHashes = self.getKey(name, S, **params)
+        if os.path.exists(self._getFilenames(key)[0]):
+            return []
+        return self._getReport(name, components, paramHashes)
+
+    def getStatistics(self):
+        """getStatistics
+
+        Returns a dict with the cache statistics.
+        """
+        entries = self._getEntries()
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(entries),
+                'nbytes': sum(entry[1] for entry in entries), 'maxBytes': self.maxBytes}
+
+    def clear(self):
+        """clear
+
+        Removes all cached results and resets the statistics.
+        """
+        for filename in os.listdir(self.path):
+            if filename.endswith('.npy') or filename.endswith('.json'):
+                try:
+                    os.remove(os.path.join(self.path, filename))
+                except OSError:
+                    pass
+        self.hits   = 0
+        self.misses = 0
+
+
+def getHash(value):
+    """getHash
+
+    Returns the SHA1 hash of the canonical JSON representation of numbers,
+    strings, arrays, materialFunctions and nested lists, tuples and dicts
+    of them.
+    """
+    return hashlib.sha1(json.dumps(_canonical(value), sort_keys=True).encode()).hexdigest()
+
+
+def _canonical(value):
+    """_canonical
+
+    Returns the JSON-serializable representation of the value, arrays
+    are represented by their shape, type and the hash of their data.
+    """
+    if isinstance(value, dict):
+        return dict((str(key), _canonical(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, materialFunction):
+        return value.funcStr
+    if isinstance(value, (str, bool, type(None))):
+        return value
+    value = np.asarray(value)
+    if value.ndim == 0 and value.dtype.kind in 'biuf':
+        return float(value)
+    if value.dtype.kind == 'c' and value.ndim == 0:
+        return [float(value.real), float(value.imag)]
+    if value.dtype.kind not in 'biufc':
+        raise ValueError('Values of type ' + value.dtype.name + ' cannot be hashed!')
+    value = np.ascontiguousarray(value)
+    return [list(value.shape), value.dtype.str, hashlib.sha1(value.tobytes()).hexdigest()]
+
+
+def getFingerprintComponents(S):
+    """getFingerprintComponents
+
+    Returns the dict of the hashes of all components of the structure,
+    i.e. the substructures tree, every property of the unique unitCells
+    including the expression strings and the atom IDs and positions, and
+    every property of the atoms including their parameter tables.
+    """
+    from .atoms import atomMixed
+    components = {'structure': getHash(_getTree(S))}
+    atoms = {}
+    for UC in S.getUniqueUnitCells()[1]:
+        for name, value in sorted(vars(UC).items()):
+            name = name.lstrip('_')
+            if name in _derivedProperties:
+                continue
+            if name == 'atoms':
+                value = [[a[0].ID, a[2]] for a in value]
+                for a in UC.atoms:
+                    atoms[id(a[0])] = a[0]
+            elif isinstance(value, list) and value and isinstance(value[0], materialFunction):
+                # the functions are given by their string representation
+                continue
+            try:
+                components['unitCell {:s}/{:s}'.format(UC.ID, name)] = getHash(value)
+            except (ValueError, TypeError):
+                # objects such as the compiled atom positions
+                continue
+
+    # the constituents of mixed atoms are atoms as well
+    stack = list(atoms.values())
+    while stack:
+        a = stack.pop()
+        if isinstance(a, atomMixed):
+            for b, _ in a.atoms:
+                if id(b) not in atoms:
+                    atoms[id(b)] = b
+                    stack.append(b)
+
+    IDs = {}
+    for a in sorted(atoms.values(), key=lambda a: a.ID):
+        # atoms with the same ID are numbered
+        ID = a.ID if a.ID not in IDs else '{:s}#{:d}'.format(a.ID, IDs[a.ID])
+        IDs[a.ID] = IDs.get(a.ID, 0) + 1
+        for name, value in sorted(vars(a).items()):
+            if name == 'formFactorCache':
+                continue
+            if name == 'atoms':
+                value = [[b.ID, fraction] for b, fraction in value]
+            components['atom {:s}/{:s}'.format(ID, name)] = getHash(value)
+    return components
+
+
+def getFingerprint(S):
+    """getFingerprint
+
+    Returns the deterministic SHA1 fingerprint of the structure, see
+    getFingerprintComponents.
+    """
+    return getHash(sorted(getFingerprintComponents(S).items()))
+
+
+def _getTree(S):
+    """_getTree
+
+    Returns the nested list of the names, unitCell IDs and repetitions of
+    the substructures tree of the structure and its substrate.
+    """
+    from .unitCell import unitCell
+    tree = []
+    for sub, N in S.substructures:
+        if isinstance(sub, unitCell):
+            tree.append(['unitCell', sub.ID, N])
+        else:
+            tree.append(['structure', sub.name, _getTree(sub), N])
+    substrate = _getTree(S.substrate) if S.substrate else None
+    return [S.name, S.numSubSystems, tree, substrate]
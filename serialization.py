@@ -0,0 +1,284 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+"""serialization
+
+Versioned JSON serialization of atoms, mixed atoms, unit cells and
+structures. A sample is stored as tables of its atoms, unitCells and
+structures, which reference each other by keys, so that shared objects
+are stored and restored only once. The unitCells are stored by their
+physical properties, the string representations of their material
+functions and the keys and position strings of their atoms. The
+anti-derivatives of the material functions are stored as numpy code, so
+that loading a sample neither imports sympy nor parses the text files of
+the parameters, which are taken from the parameter database.
+"""
+
+import numpy as np
+import json
+import gzip
+from .atoms import atom, atomMixed
+from .unitCell import unitCell
+from .structure import structure
+from .materialFunction import materialFunction
+from .helpers import atomicWrite
+
+formatName = 'udkm1Dsimpy sample'
+formatVersion = 1
+
+# numeric properties of the unit cells which are passed to the constructor
+_unitCellProperties = ['aAxis', 'bAxis', 'debWalFac', 'soundVel', 'phononDamping',
+                       'optPenDepth', 'optRefIndex', 'optRefIndexPerStrain']
+# material functions of the unit cells which are passed to the constructor
+_unitCellFunctions = ['heatCapacity', 'thermCond', 'linThermExp', 'subSystemCoupling']
+# anti-derivatives of the material functions of the unit cells
+_unitCellIntegrals = ['intHeatCapacity', 'intLinThermExp']
+
+
+def getSampleDict(obj):
+    """getSampleDict
+
+    Returns the JSON-serializable dict of an atom, atomMixed, unitCell or
+    structure with the tables of all contained atoms, unitCells and
+    structures.
+    """
+    tables = {'atoms': {}, 'unitCells': {}, 'structures': {}}
+    keys   = {}
+    if isinstance(obj, structure):
+        kind = 'structure'
+        key  = _addStructure(obj, tables, keys)
+    elif isinstance(obj, unitCell):
+        kind = 'unitCell'
+        key  = _addUnitCell(obj, tables, keys)
+    elif isinstance(obj, atom):
+        kind = 'atom'
+        key  = _addAtom(obj, tables, keys)
+    else:
+        raise ValueError('Only atom, atomMixed, unitCell and structure instances can be serialized!')
+    return dict({'format': formatName, 'version': formatVersion,
+                 'root': {'type': kind, 'key': key}}, **tables)
+
+
+def sampleFromDict(data):
+    """sampleFromDict
+
+    Returns the atom, atomMixed, unitCell or structure of a dict created by
+    getSampleDict.
+    """
+    if data.get('format') != formatName:
+        raise ValueError('The data is no serialized sample!')
+    if data.get('version', 0) > formatVersion:
+        raise ValueError('The sample has the version {:d}, but only versions up to {:d} '
+                         'are supported!'.format(data['version'], formatVersion))
+    objects = {'atoms': {}, 'unitCells': {}, 'structures': {}}
+    root = data['root']
+    if root['type'] == 'structure':
+        return _getStructure(root['key'], data, objects)
+    elif root['type'] == 'unitCell':
+        return _getUnitCell(root['key'], data, objects)
+    return _getAtom(root['key'], data, objects)
+
+
+def saveSample(obj, filename):
+    """saveSample
+
+    Saves an atom, atomMixed, unitCell or structure to a JSON file, which
+    is compressed if the filename ends with .gz.
+    """
+    data = json.dumps(getSampleDict(obj), separators=(',', ':'))
+    if filename.endswith('.gz'):
+        atomicWrite(filename, gzip.compress(data.encode()))
+    else:
+        atomicWrite(filename, data, mode='w')
+
+
+def loadSample(filename):
+    """loadSample
+
+    Loads an atom, atomMixed, unitCell or structure from a file written by
+    saveSample.
+    """
+    opener = gzip.open if filename.endswith('.gz') else open
+    with opener(filename, 'rt') as f:
+        return sampleFromDict(json.load(f))
+
+
+def _getKey(obj, name, table, keys):
+    """_getKey
+
+    Returns the key of the object in its table and whether it is new.
+    Objects with the same name are numbered.
+    """
+    if id(obj) in keys:
+        return keys[id(obj)], False
+    key = name
+    n = 1
+    while key in table:
+        key = '{:s}#{:d}'.format(name, n)
+        n += 1
+    keys[id(obj)] = key
+    table[key] = None
+    return key, True
+
+
+def _addAtom(a, tables, keys):
+    key, new = _getKey(a, a.ID, tables['atoms'], keys)
+    if new:
+        entry = {'symbol': a.symbol, 'ID': a.ID}
+        if isinstance(a, atomMixed):
+            entry['type'] = 'atomMixed'
+            entry['name'] = a.name
+            entry['constituents'] = [[_addAtom(b, tables, keys), _encode(fraction)]
+                                     for b, fraction in a.atoms]
+        else:
+            entry['type'] = 'atom'
+            entry['ionicity'] = _encode(a.ionicity)
+            entry['name'] = a.name
+            entry['atomicNumberZ'] = _encode(a.atomicNumberZ)
+            entry['massNumberA'] = _encode(a.massNumberA)
+            entry['mass'] = _encode(a.mass)
+        tables['atoms'][key] = entry
+    return key
+
+
+def _addUnitCell(UC, tables, keys):
+    key, new = _getKey(UC, UC.ID, tables['unitCells'], keys)
+    if new:
+        entry = {'ID': UC.ID, 'name': UC.name, 'cAxis': _encode(UC.cAxis)}
+        for name in _unitCellProperties:
+            entry[name] = _encode(getattr(UC, name))
+        for name in _unitCellFunctions:
+            entry[name] = list(getattr(UC, name + 'Str'))
+        # the anti-derivatives are stored only if they are known as numpy code
+        for name in _unitCellIntegrals:
+            funcs = getattr(UC, '_' + name, None)
+            if isinstance(funcs, list) and all(isinstance(f, materialFunction) for f in funcs):
+                entry[name] = {'code': [f.funcStr for f in funcs],
+                               'str': list(getattr(UC, name + 'Str'))}
+        entry['higherSpringConst'] = _encode(UC.springConst[1:])
+        entry['atoms'] = [[_addAtom(a[0], tables, keys), a[2]] for a in UC.atoms]
+        tables['unitCells'][key] = entry
+    return key
+
+
+def _addStructure(S, tables, keys):
+    key, new = _getKey(S, S.name, tables['structures'], keys)
+    if new:
+        subs = []
+        for sub, N in S.substructures:
+            if isinstance(sub, unitCell):
+                subs.append(['unitCell', _addUnitCell(sub, tables, keys), int(N)])
+            else:
+                subs.append(['structure', _addStructure(sub, tables, keys), int(N)])
+        substrate = _addStructure(S.substrate, tables, keys) if S.substrate else None
+        tables['structures'][key] = {'name': S.name, 'substructures': subs, 'substrate': substrate}
+    return key
+
+
+def _getAtom(key, data, objects):
+    if key in objects['atoms']:
+        return objects['atoms'][key]
+    entry = data['atoms'][key]
+    if entry['type'] == 'atomMixed':
+        a = atomMixed(entry['symbol'], ID=entry['ID'], name=entry['name'])
+        a.addAtoms([_getAtom(constituent, data, objects) for constituent, _ in entry['constituents']],
+                   [_decode(fraction) for _, fraction in entry['constituents']])
+    else:
+        # the atom is restored like an unpickled one, so that the element
+        # data are not looked up again
+        a = atom.__new__(atom)
+        a.__setstate__({'symbol': entry['symbol'], 'ID': entry['ID'],
+                        'ionicity': _decode(entry['ionicity']), 'name': entry['name'],
+                        'atomicNumberZ': _decode(entry['atomicNumberZ']),
+                        'massNumberA': _decode(entry['massNumberA']),
+                        'mass': _decode(entry['mass'])})
+    objects['atoms'][key] = a
+    return a
+
+
+def _getUnitCell(key, data, objects):
+    if key in objects['unitCells']:
+        return objects['unitCells'][key]
+    entry  = data['unitCells'][key]
+    kwargs = dict((name, _decode(entry[name])) for name in _unitCellProperties)
+    for name in _unitCellFunctions:
+        kwargs[name] = entry[name]
+    UC = unitCell(entry['ID'], entry['name'], _decode(entry['cAxis']), **kwargs)
+    if entry['atoms']:
+        UC.addAtoms([_getAtom(a, data, objects) for a, _ in entry['atoms']],
+                    [position for _, position in entry['atoms']])
+    higher = _decode(entry['higherSpringConst'])
+    if len(higher):
+        UC.setHOspringConstants(higher)
+    for name in _unitCellIntegrals:
+        if name in entry:
+            setattr(UC, name, entry[name]['code'])
+            setattr(UC, name + 'Str', entry[name]['str'])
+    objects['unitCells'][key] = UC
+    return UC
+
+
+def _getStructure(key, data, objects):
+    if key in objects['structures']:
+        return objects['structures'][key]
+    entry = data['structures'][key]
+    S = structure(entry['name'])
+    for kind, subKey, N in entry['substructures']:
+        if kind == 'unitCell':
+            S.addSubStructure(_getUnitCell(subKey, data, objects), N)
+        else:
+            S.addSubStructure(_getStructure(subKey, data, objects), N)
+    if entry['substrate'] is not None:
+        S.addSubstrate(_getStructure(entry['substrate'], data, objects))
+    objects['structures'][key] = S
+    return S
+
+
+def _encode(value):
+    """_encode
+
+    Returns the JSON-serializable representation of numbers, complex
+    numbers, lists and arrays.
+    """
+    if isinstance(value, np.ndarray):
+        return {'array': [_encode(v) for v in value.ravel().tolist()],
+                'shape': list(value.shape), 'dtype': value.dtype.str}
+    if isinstance(value, (list, tuple)):
+        return {'list': [_encode(v) for v in value]}
+    if isinstance(value, (complex, np.complexfloating)):
+        return {'complex': [float(value.real), float(value.imag)]}
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return float(value)
+
+
+def _decode(value):
+    """_decode
+
+    Returns the number, complex number, list or array of its JSON
+    representation.
+    """
+    if isinstance(value, dict):
+        if 'complex' in value:
+            return complex(*value['complex'])
+        if 'list' in value:
+            return [_decode(v) for v in value['list']]
+        return np.array([_decode(v) for v in value['array']],
+                        dtype=value['dtype']).reshape(value['shape'])
+    return value
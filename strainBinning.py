@@ -0,0 +1,119 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+
+
+class strainBinning(object):
+    """strainBinning
+
+    The strainBinning class quantizes the strains of a (time x N) strain
+    map to bins of the width binWidth and deduplicates the pairs of unique
+    unit cell index, as given by structure.getUnitCellVectors, and strain
+    bin over all time steps. Quantities which depend only on the unit cell
+    and its strain, such as structure factors or scattering matrices, are
+    then calculated once per pair and are scattered back to the time steps
+    and unit cells by the inverse index map.
+
+    The statistics report the maximum and rms binning error of the strains
+    and the reuse factors, i.e. the number of pair evaluations which are
+    saved compared to a deduplication per time step and compared to an
+    evaluation per unit cell and time step.
+
+    For a binWidth of 0, the strains are not quantized and only identical
+    strains are deduplicated.
+
+    Attributes:
+        S (structure)       : structure of the strain maps
+        binWidth (float)    : width of the strain bins
+        statistics (dict)   : statistics of the last binned strain map
+    """
+
+    def __init__(self, S, binWidth=1e-5):
+        """Initialize the class.
+
+        Args:
+            S (structure)               : structure
+            binWidth (Optional[float])  : default is 1e-5
+
+        """
+        self.S          = S
+        self.binWidth   = binWidth
+        self.statistics = {}
+
+    def __str__(self):
+        """String representation of this class
+
+        """
+        classStr  = 'Strain binning with the following properties\n'
+        classStr += 'bin width              : {:3.2e}\n'.format(self.binWidth)
+        if self.statistics:
+            stats = self.statistics
+            classStr += 'time steps x cells     : {:d} x {:d}\n'.format(stats['numTimeSteps'],
+                                                                        stats['numUnitCells'])
+            classStr += 'pairs per time step    : {:d}\n'.format(stats['numPairsPerStep'])
+            classStr += 'distinct pairs         : {:d}\n'.format(stats['numPairs'])
+            classStr += 'reuse factor per step  : {:3.2f}\n'.format(stats['reuseFactor'])
+            classStr += 'reuse factor per cell  : {:3.2f}\n'.format(stats['cellReuseFactor'])
+            classStr += 'max. binning error     : {:3.2e}\n'.format(stats['maxError'])
+            classStr += 'rms binning error      : {:3.2e}\n'.format(stats['rmsError'])
+        return(classStr)
+
+    def getBins(self, strain):
+        """getBins
+
+        Returns the integer bins and the binned values of the strains. For
+        a binWidth of 0 the bins are the bit patterns of the strains.
+        """
+        strain = np.asarray(strain, dtype=float)
+        if self.binWidth > 0:
+            bins = np.round(strain/self.binWidth).astype(np.int64)
+            return bins, bins*self.binWidth
+        # adding 0. turns -0. into 0.
+        return (strain + 0.).view(np.int64), strain + 0.
+
+    def bin(self, strainMap):
+        """bin
+
+        Returns the vectors of the unique unit cell indices, strain bins and
+        binned strains of all distinct pairs of the strain vector or (time x
+        N) strain map, and the (time x N) index map of the pair of each unit
+        cell at each time step. The statistics of the binning are updated.
+        """
+        strainMap = np.atleast_2d(np.asarray(strainMap, dtype=float))
+        indices   = self.S.compile().indices
+        if strainMap.shape[1] != len(indices):
+            raise ValueError('The strain map must have one column per unitCell!')
+        bins, binned = self.getBins(strainMap)
+        # the pairs are encoded as one integer key by the rank of their strain bin
+        uniqueBins, rank = np.unique(bins, return_inverse=True)
+        numUC = int(indices.max()) + 1 if len(indices) else 1
+        keys  = np.reshape(rank, bins.shape)*numUC + indices
+        pairs, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        inverse = np.reshape(inverse, strainMap.shape)
+
+        # number of distinct pairs of each time step, which have to be calculated without reuse
+        sortedPairs = np.sort(inverse, axis=1)
+        perStep = np.sum(sortedPairs[:, 1:] != sortedPairs[:, :-1]) + len(strainMap)
+        error = strainMap - binned
+        self.statistics = {'numTimeSteps': len(strainMap), 'numUnitCells': len(indices),
+                           'numPairs': len(pairs), 'numPairsPerStep': int(perStep),
+                           'reuseFactor': perStep/len(pairs),
+                           'cellReuseFactor': strainMap.size/len(pairs),
+                           'maxError': float(np.max(np.abs(error))),
+                           'rmsError': float(np.sqrt(np.mean(error**2)))}
+        return pairs % numUC, uniqueBins[pairs//numUC], binned.ravel()[first], inverse
@@ -20,8 +20,67 @@
 #
 # Copyright (C) 2017 Daniel Schick
 
-import more_itertools
-import itertools
+import numpy as np
+import copy
+from .unitCell import unitCell
+from . import absorption
+from .resultCache import getFingerprint, getFingerprintComponents
+
+class compiledStructure(object):
+
+    """compiledStructure
+    The compiledStructure class holds the flattened representation of a structure as contiguous arrays.
+    It is created by structure.compile() and is only valid as long as the substructures tree does not change.
+    The properties of the unit cells are gathered on request, so changes of the unit cells are always respected.
+    """
+
+    def __init__(self, UCIDs, UCHandles, indices, signature):
+        """
+        UCIDs       % CELL ARRAY of IDs of the unique unitCells
+        UCHandles   % CELL ARRAY of handles of the unique unitCells
+        indices     % VECTOR of the unique unitCell index of each unitCell in the structure
+        positions   % CELL ARRAY of vectors of the positions of each unique unitCell in the structure
+        signature   % TUPLE of the state of the substructures tree at compilation
+        """
+        self.UCIDs          = UCIDs
+        self.UCHandles      = UCHandles
+        self.indices        = indices
+        self.numUnitCells   = len(indices)
+        self.signature      = signature
+        # a stable sort keeps the positions of each unique unitCell in ascending order
+        order               = np.argsort(indices, kind='stable')
+        counts              = np.bincount(indices, minlength=len(UCIDs))
+        self.positions      = np.split(order, np.cumsum(counts)[:-1])
+        self.indices.flags.writeable = False
+        self._depthKey      = None
+        self._dEnd          = None
+
+    def getUniquePropertyVector(self, types):
+        
+        """Returns a vector of a property of all unique unitCells."""
+        
+        return structure._stackUnitCellProperties([structure._getUnitCellProperty(handle, types)
+                                                   for handle in self.UCHandles])
+
+    def getPropertyVector(self, types):
+        
+        """Returns a vector of a numeric property of all unitCells by gathering the property 
+        of the unique unitCells with the indices vector."""
+        
+        return self.getUniquePropertyVector(types)[self.indices]
+
+    def getCumulativeDepth(self):
+        
+        """Returns the cached vector of the distance of the end of each unitCell from the surface. 
+        It is only recalculated if the c-axis of one of the unique unitCells has changed."""
+        
+        cAxes = self.getUniquePropertyVector('cAxis')
+        key   = tuple(cAxes)
+        if self._depthKey != key:
+            self._dEnd     = np.cumsum(cAxes[self.indices])
+            self._dEnd.flags.writeable = False
+            self._depthKey = key
+        return self._dEnd
 
 class structure(object):
     
@@ -29,6 +88,8 @@ class structure(object):
     """structure
     The structure class can hold various substructures. Each substructure can be either a layer of N unitCell 
     objects or a structure by itself. Thus it is possible to recursively build up 1D structures.
+    The nested substructures can be flattened once into contiguous arrays by compile(), which is 
+    done automatically by the queries and repeated only if the substructures tree changed.
     """
     
     def __init__(self, name, **kwargs):
@@ -43,6 +104,8 @@ class structure(object):
         self.numSubSystems    =  1
         self.substructures    =  []
         self.substrate        =  []
+        self._version         =  0
+        self._compiled        =  None
    
         
     
@@ -71,6 +134,41 @@ class structure(object):
         
         #add a substructure of N repetitions to the structure with
         self.substructures.append([subStructure, N])
+        self._version += 1
+    
+    
+    def addGradedSubStructure(self,UC,composition,site,N=1,**kwargs):
+        
+        """Add a compositionally graded layer with one unitCell of N repetitions per composition 
+        of the atomComposition. The unitCells are light copies of the template unitCell UC, in which 
+        the atom site is replaced by the mixed atom of the composition, and share the material 
+        functions and atom positions of the template. Their IDs are given by the ID of the template 
+        and the IDs of the mixed atoms. Further properties of the unitCells are graded by vectors of 
+        one value per composition given as keyword arguments, e.g. cAxis or soundVel."""
+        
+        mixedAtoms = composition.getMixedAtoms()
+        sites = [i for i, atom in enumerate(UC.atoms) if atom[0] is site]
+        if not sites:
+            raise ValueError('The atom '+site.ID+' is not part of the unitCell '+UC.ID+'!')
+        for name, values in kwargs.items():
+            if len(values) != len(mixedAtoms):
+                raise ValueError('The property '+name+' must have one value per composition!')
+        
+        for i, mixed in enumerate(mixedAtoms):
+            grade             = copy.copy(UC)
+            grade.ID          = UC.ID + '_' + mixed.ID
+            grade.atoms       = list(UC.atoms)
+            for j in sites:
+                grade.atoms[j] = [mixed, UC.atoms[j][1], UC.atoms[j][2]]
+            grade.rawMass     = sum(atom[0].mass for atom in grade.atoms)
+            # the spring constants are changed in place
+            grade.springConst = UC.springConst.copy()
+            for name, values in kwargs.items():
+                setattr(grade, name, values[i])
+            grade.area        = grade.aAxis * grade.bAxis
+            grade.volume      = grade.area * grade.cAxis
+            grade.updateMass()
+            self.addSubStructure(grade, N)
          
     
     
@@ -83,6 +181,7 @@ class structure(object):
             raise ValueError('Class '+type(subStructure).__name__+' is no possible substrate. Only structure class is allowed!')
             
         self.substrate = subStructure
+        self._version += 1
     
     def getNumberOfSubStructures(self):
         
@@ -101,16 +200,8 @@ class structure(object):
     def getNumberOfUnitCells(self):
         
         """Returns the number of all unitCells in the structure."""
-        N = 0
-        #%traverse the substructres
-        for i in range(len(self.substructures)):
-            if isinstance(self.substructures[i][0],unitCell):
-                N = N + self.substructures[i][1]
-            else:
-                #% its a sturcture, so call the method recursively
-                N = N + self.substructures[i][0].getNumberOfUnitCells()*self.substructures[i][1]
-                    
-        return N  
+        
+        return self.compile().numUnitCells
     
     
     def getNumberOfUniqueUnitCells(self):
@@ -124,7 +215,8 @@ class structure(object):
         
         """Returns the length from surface to bottom of the structure"""
         
-        pass
+        dEnd = self.compile().getCumulativeDepth()
+        return dEnd[-1] if len(dEnd) > 0 else 0
     
 
     
@@ -136,95 +228,90 @@ class structure(object):
         UCIDs = []
         UCHandles = []
         #traverse the substructures
+        self._addUniqueUnitCells(UCIDs, UCHandles)
+        return UCIDs,UCHandles
+    
+    
+    def _addUniqueUnitCells(self,UCIDs,UCHandles):
+        
+        """Recursively adds the IDs and handles of all unitCells which are not yet in UCIDs."""
+        
         for i in range(len(self.substructures)):
             if isinstance(self.substructures[i][0],unitCell):
-                #its a UnitCell
-                ID = self.substructures[i][0].ID
-                if not UCIDs:
-                    #the cell array is empty at the beginning so add
-                    #the first unitCell
-                    UCIDs = UCIDs + [ID]
-                    UCHandles = UCHandles + [S.substructures[i][0]]
-                else:
-                    #the cell array is not empty so check if the ID is
-                    #already in the UCs ID vector
-                    if ID not in UCIDs:
-                        #if ID not in list, so add it
-                        UCIDs = UCIDs + [ID]
-                        UCHandles = UCHandles + [S.substructures[i][0]]
+                #its a UnitCell, add it if its ID is not yet in the list
+                if self.substructures[i][0].ID not in UCIDs:
+                    UCIDs.append(self.substructures[i][0].ID)
+                    UCHandles.append(self.substructures[i][0])
             else:
-                #its a substructure
-                if not UCIDs:
-                    #the cell array is empty at the beginning so call
-                    #the method recursively and add the result to the
-                    #UCs array
-                    UCIDs = self.substructures[i][0].getUniqueUnitCells()[0]
-                    UCHandles = self.substructures[i][0].getUniqueUnitCells()[1]
-                else:
-                    #the cell array is not empty so check if the IDs
-                    #from the recursive call are already in the UCs ID
-                    #vector.
-                    temp1 = self.substructures[i][0].getUniqueUnitCells()[0]
-                    temp2 = self.substructures[i][0].getUniqueUnitCells()[1]
-                    for j in range(len(temp1)):
-                        #check all IDs from recursive call
-                        if temp1[j] not in UCIDs:
-                            #IDs not in list, so add them
-                            UCIDs = UCIDs + [temp1[j]]
-                            UCHandles = UCHandles + [temp2[j]] 
-                            
-        return UCIDs,UCHandles
+                #its a substructure, so call the method recursively
+                self.substructures[i][0]._addUniqueUnitCells(UCIDs, UCHandles)
+    
+    
+    def _getSignature(self):
+        
+        """Returns a tuple which changes whenever the substructures tree of the structure changes. 
+        The substructures and their repetitions are part of the signature, so that entries of the 
+        substructures list which are changed in place are detected as well."""
+        
+        return (id(self), self._version,
+                tuple((id(sub), N, sub._getSignature() if isinstance(sub, structure) else None)
+                      for sub, N in self.substructures))
+    
+    
+    def _getIndices(self,UCIDs):
+        
+        """Returns the vector of unique unitCell indices of all unitCells for the list of unique unitCell IDs."""
+        
+        Indices = [np.zeros(0, dtype=int)]
+        # traverse the substructres
+        for i in range(len(self.substructures)):
+            if isinstance(self.substructures[i][0],unitCell):
+                #its a UnitCell, so add its index N times
+                Index = UCIDs.index(self.substructures[i][0].ID)
+                Indices.append(np.full(self.substructures[i][1], Index, dtype=int))
+            else:
+                #its a structure, so repeat the indices of the recursive call N times
+                Indices.append(np.tile(self.substructures[i][0]._getIndices(UCIDs), self.substructures[i][1]))
+        return np.concatenate(Indices)
+    
+    
+    def compile(self):
+        
+        """Flattens the substructures tree into a compiledStructure holding the vector of unique unitCell 
+        indices of all unitCells and the table of unique unitCells. 
+        The result is cached and only recompiled if the substructures tree has changed."""
+        
+        signature = self._getSignature()
+        if self._compiled is None or self._compiled.signature != signature:
+            UCIDs, UCHandles = self.getUniqueUnitCells()
+            self._compiled = compiledStructure(UCIDs, UCHandles, self._getIndices(UCIDs), signature)
+        return self._compiled
+    
+    
+    def getLayerView(self):
+        
+        """Returns a lazy, run-length encoded layerView of the unitCells in the structure, 
+        which does not expand the repetitions of the substructures."""
+        
+        from .layerView import layerView
+        return layerView(self)
     
     
-
     def getUnitCellVectors(self,*args):
         
         """Returns three vectors with the numeric index of all unit cells in a structure given by the getUniqueUnitCells() method and addidionally vectors with the IDs and Handles of the corresponding unitCell instances. 
         The list and order of the unique unitCells can be either handed as an input parameter or is requested at the beginning."""
         
-
-        Indices     =  []
-        UCIDs       =  []
-        UCHandles   =  []
-        # if no UCs (UniqueUnitCells) are given, we have to get them
+        # if no UCs (UniqueUnitCells) are given, we use the compiled structure
         if (len(args)<1):
-            UCs = self.getUniqueUnitCells()
+            compiled = self.compile()
+            UCs      = [compiled.UCIDs, compiled.UCHandles]
+            Indices  = compiled.indices
         else:
-            UCs = args[0]
-        # traverse the substructres
-        for i in range(len(self.substructures)):
-            if isinstance(self.substructures[i][0],unitCell):
-            #its a UnitCell
-            #find the index of the current UC ID in the unique
-            #unitCell vector
-                Index = UCs[0].index(self.substructures[i][0].ID)
-                #add the index N times to the Indices vector
-                Indices = np.append(Indices,Index*np.ones(self.substructures[i][1]))
-                #create a cell array of N unitCell IDs and add them to
-                #the IDs cell array
-                temp1 = list(itertools.repeat(self.substructures[i][0].ID, self.substructures[i][1]))
-                UCIDs = UCIDs + list(temp1)
-                #% create a cell array of N unitCell handles and add them to
-                #the Handles cell array
-                temp2 = list(itertools.repeat(self.substructures[i][0], self.substructures[i][1]))
-                UCHandles = UCHandles + list(temp2)
-            else:
-                #its a structure
-                #make a recursive call and hand in the same unique
-                #unit cell vector as we used before
-                [temp1, temp2, temp3] =  self.substructures[i][0].getUnitCellVectors(UCs)
-                temp11 = []
-                temp22 = []
-                temp33 = []
-                # concat the temporary arrays N times
-                for j in range(self.substructures[i][1]):
-                    temp11 = temp11 + list(temp1)
-                    temp22 = temp22 + list(temp2)
-                    temp33 = temp33 + list(temp3)
-                #add the temporary arrays to the outputs
-                Indices = np.append(Indices,temp11)
-                UCIDs = UCIDs + list(temp22)
-                UCHandles = UCHandles + list(temp33)
+            UCs      = args[0]
+            Indices  = self._getIndices(UCs[0])
+        UCIDs     = [UCs[0][i] for i in Indices]
+        UCHandles = [UCs[1][i] for i in Indices]
         return Indices, UCIDs, UCHandles
     
     
@@ -232,11 +319,10 @@ class structure(object):
         
             """Returns a cell array with one vector of position indices for each unique unitCell in the structure."""
             
-            UCs     = self.getUniqueUnitCells()
-            Indices = self.getUnitCellVectors()[0]
-            Pos     = {} # Dictionary used instead of array
-            for i in range(len(UCs[0])):
-                Pos[UCs[0][i]] = list(np.where(Indices == i))
+            compiled = self.compile()
+            Pos      = {} # Dictionary used instead of array
+            for i in range(len(compiled.UCIDs)):
+                Pos[compiled.UCIDs[i]] = [compiled.positions[i]]
             #Each element accessible through Unit cell ID
             return Pos
     
@@ -246,58 +332,191 @@ class structure(object):
         """Returns a vector of the distance from the surface for each unit cell starting at 0 (dStart) 
         and starting at the end of the first UC (dEnd) and from the center of each UC (dMid)."""
         
-        cAxes = self.getUnitCellPropertyVector(types = 'cAxis')
-        dEnd  = np.cumsum(cAxes)
+        dEnd  = self.compile().getCumulativeDepth()
         dStart= np.hstack([[0],dEnd[0:-1]])
-        dMid  = (dStart + cAxes)/2
+        dMid  = (dStart + dEnd)/2
         return dStart,dEnd,dMid 
     
     
-   def getUnitCellPropertyVector(self,**kwargs):
+    def getUnitCellIndicesAtDepth(self,z):
+        
+        """Returns the indices of the unitCells at the distances z from the surface. 
+        The lookup is vectorized by a binary search in the cumulative depth of the unitCells. 
+        Distances outside of the structure return the index -1."""
+        
+        dEnd    = self.compile().getCumulativeDepth()
+        z       = np.asarray(z)
+        Indices = np.searchsorted(dEnd, z, side='right')
+        return np.where((z < 0) | (Indices >= len(dEnd)), -1, Indices)
+    
+    
+    def mapToDepth(self,values,z):
+        
+        """Resamples values per unitCell, e.g. temperature or strain profiles, onto the spatial grid z. 
+        The last axis of values has to be the unitCell axis. Distances outside of the structure are NaN."""
+        
+        Indices = self.getUnitCellIndicesAtDepth(z)
+        res     = np.take(np.asarray(values, dtype=float), np.maximum(Indices, 0), axis=-1)
+        res[..., Indices < 0] = np.nan
+        return res
+    
+    
+    def getAbsorptionProfile(self,mode='lambertBeer',**kwargs):
+        
+        """Returns the fraction of the incident optical intensity absorbed in each unitCell. 
+        The mode lambertBeer uses the optPenDepth of the unitCells and the cumulative optical depth. 
+        The mode transferMatrix uses the optRefIndex of the unitCells and requires the wavelength, 
+        the optional angle of incidence theta and polarization 's' or 'p', see 
+        absorption.getTransferMatrixAbsorption for further keyword arguments."""
+        
+        if mode == 'lambertBeer':
+            return absorption.getLambertBeerAbsorption(self)
+        elif mode == 'transferMatrix':
+            return absorption.getTransferMatrixAbsorption(self, **kwargs)
+        raise ValueError('The absorption mode has to be lambertBeer or transferMatrix!')
+    
+    
+    def getReflectivity(self,wavelength,theta=0,polarization='s',**kwargs):
+        
+        """Returns the optical reflectivity of the structure for the wavelengths and angles of 
+        incidence theta by the transfer-matrix method. A (... x N) strain map given as keyword 
+        strain yields the transient reflectivity via the optRefIndexPerStrain of the unitCells."""
+        
+        return absorption.getReflectivity(self, wavelength, theta, polarization, **kwargs)
+    
+    
+    def getFingerprint(self):
+        
+        """Returns the deterministic fingerprint of the structure, which changes whenever the 
+        substructures tree, a property of a unitCell or a property of an atom changes. The 
+        hashes of the single components are given by getFingerprintComponents."""
+        
+        return getFingerprint(self)
+    
+    
+    def getFingerprintComponents(self):
+        
+        """Returns the dict of the hashes of the substructures tree, of all properties of the 
+        unique unitCells and of all properties of their atoms, see resultCache."""
+        
+        return getFingerprintComponents(self)
+    
+    
+    def getUnitCellPropertyVector(self,**kwargs):
         
-   
         """Returns a vector for a property of all unitCells in the structure.
-        The property is determined by the propertyName and returns a scalar value or a function handle."""
+        The property is determined by the propertyName and returns a scalar value or a function handle.
+        The property is evaluated only once per unique unitCell and gathered with the unique unitCell indices."""
         
         types = kwargs.get('types')
         
-
-        #get the Handle to all unitCells in the Structure
-        Handles = self.getUnitCellVectors()[2]
-
+        compiled = self.compile()
+        #evaluate the property once for each unique unitCell
+        UCProps  = [self._getUnitCellProperty(handle, types) for handle in compiled.UCHandles]
         
-        if callable(getattr(Handles[0],types)):
-            Prop = np.zeros([self.getNumberOfUnitCells()])
-            for i in range(self.getNumberOfUnitCells()):
-                Prop[i] = getattr(Handles[i],types)
-        
-        elif type(getattr(Handles[0],types)) is list:
-            #Prop = np.zeros([self.getNumberOfUnitCells(),len(getattr(Handles[0],types))])
-            #Prop[]
-            Prop = {} 
-            for i in range(self.getNumberOfUnitCells()):
-                #Prop = Prop + getattr(Handles[i],types)
-                Prop[i] =  getattr(Handles[i],types)
+        if type(UCProps[0]) is list:
+            #lists of function handles are returned per unitCell
+            Prop = dict(enumerate(UCProps[i] for i in compiled.indices))
         else:
-            
-            UCs = self.getUniqueUnitCells()
-            Prop = np.zeros([self.getNumberOfUnitCells()])
-        
-            #% traverse all unitCells
-            
-            for i in range(self.getNumberOfUnitCells()):
-                temp = getattr(Handles[i],types)
-                Prop[i] = temp
+            #gather the numeric properties of all unitCells
+            Prop = self._stackUnitCellProperties(UCProps)[compiled.indices]
                 
         return Prop    
     
     
+    def getUnitCellPropertyVectors(self,**kwargs):
+        
+        """Returns a dict with a vector for each of several numeric properties of all unitCells in the structure,
+        e.g. types = ['cAxis', 'mass', 'springConst', 'optPenDepth'].
+        All properties are gathered in one pass with the unique unitCell indices."""
+        
+        types = kwargs.get('types')
+        
+        compiled = self.compile()
+        Props    = {}
+        for prop in types:
+            UCProps     = [self._getUnitCellProperty(handle, prop) for handle in compiled.UCHandles]
+            Props[prop] = self._stackUnitCellProperties(UCProps)[compiled.indices]
+        return Props
+    
+    
+    @staticmethod
+    def _stackUnitCellProperties(UCProps):
+        
+        """Stacks the properties of the unique unitCells into an array. Vectors of different length, 
+        such as spring constants of different anharmonic orders, are padded with zeros."""
+        
+        lengths = [np.size(prop) for prop in UCProps]
+        if any(np.ndim(prop) > 0 for prop in UCProps) and len(set(lengths)) > 1:
+            Props = np.zeros([len(UCProps), max(lengths)], dtype=np.result_type(*UCProps))
+            for i, prop in enumerate(UCProps):
+                Props[i, :lengths[i]] = np.ravel(prop)
+            return Props
+        return np.array(UCProps)
+    
+    
+    @staticmethod
+    def _getUnitCellProperty(handle,types):
+        
+        """Returns the property of a unitCell, methods are called without arguments."""
+        
+        prop = getattr(handle,types)
+        if callable(prop):
+            prop = prop()
+        return prop
+    
+    
+    def evalUnitCellFunctions(self,types,T,subSystem=None):
+        
+        """Evaluates the temperature-dependent function handles of a property, e.g. heatCapacity, 
+        for a (N x numSubSystems) array of temperatures T of all unitCells. 
+        Each function is called only once per unique unitCell on the temperatures of all of its unitCells. 
+        The subSystemCoupling functions are called with the list of temperatures of all subsystems, 
+        all other functions with the temperature of their own subsystem. Returns a (N x numSubSystems) array, 
+        or the vector of the N values of a single subsystem if its index subSystem is given."""
+        
+        compiled = self.compile()
+        T        = np.asarray(T, dtype=float)
+        squeeze  = T.ndim == 1
+        if squeeze:
+            T = T[:,np.newaxis]
+        if T.shape[0] != compiled.numUnitCells:
+            raise ValueError('The temperature array must have one row per unitCell!')
+        
+        res = np.zeros(T.shape)
+        for handle, pos in zip(compiled.UCHandles, compiled.positions):
+            if len(pos) == 0:
+                continue
+            funcs  = getattr(handle, types)
+            if len(funcs) != T.shape[1]:
+                raise ValueError('The temperature array must have one column per subsystem!')
+            TSlice = T[pos]
+            for k, func in enumerate(funcs):
+                if subSystem is not None and k != subSystem:
+                    continue
+                if types == 'subSystemCoupling':
+                    res[pos,k] = func(TSlice.T)
+                else:
+                    res[pos,k] = func(TSlice[:,k])
+        if subSystem is not None:
+            return res[:,subSystem]
+        return res[:,0] if squeeze else res
+    
+    
+    def evalHeatProperties(self,T):
+        
+        """Returns a dict with the heat capacity C(T), the thermal conductivity k(T), the linear thermal 
+        expansion alpha(T) and the subsystem coupling terms as (N x numSubSystems) arrays for the 
+        (N x numSubSystems) array of temperatures T of all unitCells, see evalUnitCellFunctions."""
+        
+        return dict((types, self.evalUnitCellFunctions(types, T)) for types in 
+                    ['heatCapacity', 'thermCond', 'linThermExp', 'subSystemCoupling'])
+    
+    
     def getUnitCellHandle(self,i):
         
         """Returns the handle to the unitCell at position i in the structure."""
         
-        Handles = self.getUnitCellVectors()[2]
-        Handle  = Handles[i]
+        compiled = self.compile()
+        Handle   = compiled.UCHandles[compiled.indices[i]]
         return Handle
-    
-    
@@ -0,0 +1,108 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+"""conftest
+
+Common fixtures of the regression tests. The module is imported from the
+parent directory of the repository as in the benchmarks and all caches
+of the module are written to a temporary directory.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import importlib
+import pytest
+import numericalunits as u
+
+cacheDir = tempfile.mkdtemp(prefix='udkm1Dsimpy_tests_')
+os.environ['UDKM1DSIMPY_CACHE_DIR'] = cacheDir
+
+modulePath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(modulePath))
+_ud = importlib.import_module(os.path.basename(modulePath))
+u.reset_units('SI')
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(cacheDir, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def ud():
+    """ud
+
+    Returns the module.
+    """
+    return _ud
+
+
+@pytest.fixture(scope='session')
+def getModule():
+    """getModule
+
+    Returns a function which returns a submodule of the module by name.
+    """
+    return lambda name: importlib.import_module(_ud.__name__ + '.' + name)
+
+
+@pytest.fixture
+def sample(ud):
+    """sample
+
+    Returns a new structure of 5 SRO unit cells, a superlattice of 4 x
+    (3 SRO + 2 STO) unit cells and 10 STO unit cells. SRO absorbs light and
+    expands thermally, both unit cells have a temperature-dependent heat
+    capacity.
+    """
+    Sr, Ti, Ru, O = ud.atom('Sr'), ud.atom('Ti'), ud.atom('Ru'), ud.atom('O')
+    STO = ud.unitCell('STO', 'SrTiO3', 3.905*u.angstrom, soundVel=7.8*u.nm/u.ps,
+                      heatCapacity='lambda T: 455.2 + 0.112*T - 2.1935e6/T**2',
+                      thermCond=12*u.W/(u.m*u.K), linThermExp=1e-5, debWalFac=0,
+                      optRefIndex=[2.4, 0.01])
+    STO.addAtoms([Sr, Ti, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+    SRO = ud.unitCell('SRO', 'SrRuO3', 3.95*u.angstrom, soundVel=6.3*u.nm/u.ps,
+                      heatCapacity='lambda T: 400 + 0.1*T', thermCond=5.72*u.W/(u.m*u.K),
+                      linThermExp='lambda T: 1.03e-5 + 1e-9*T', optPenDepth=43.8*u.nm,
+                      optRefIndex=[1.6, 0.9])
+    SRO.addAtoms([Sr, Ru, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+    SL = ud.structure('SL')
+    SL.addSubStructure(SRO, 3)
+    SL.addSubStructure(STO, 2)
+    S = ud.structure('sample')
+    S.addSubStructure(SRO, 5)
+    S.addSubStructure(SL, 4)
+    S.addSubStructure(STO, 10)
+    return S
+
+
+def expandUnitCells(S):
+    """expandUnitCells
+
+    Returns the list of all unitCells of the structure by a plain
+    recursion of the substructures tree.
+    """
+    res = []
+    for sub, N in S.substructures:
+        res += N*([sub] if not hasattr(sub, 'substructures') else expandUnitCells(sub))
+    return res
+
+
+@pytest.fixture(scope='session')
+def expand():
+    return expandUnitCells
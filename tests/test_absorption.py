@@ -0,0 +1,104 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import numericalunits as u
+import pytest
+
+
+def getSequentialFluxes(S, wavelength, theta, polarization, nSubstrate):
+    """getSequentialFluxes
+
+    Returns the reflectivity and the Poynting fluxes at the top of all unit
+    cells and at the substrate by the sequential products of the
+    characteristic matrices of the unit cells.
+    """
+    cells = [S.getUnitCellHandle(i) for i in range(S.getNumberOfUnitCells())]
+    nSinTheta = np.sin(theta)
+
+    def admittance(n):
+        nCos = np.sqrt(n**2 - nSinTheta**2 + 0j)
+        nCos = -nCos if nCos.imag < 0 else nCos
+        return nCos if polarization == 's' else n**2/nCos
+
+    eta0, etaS = admittance(1 + 0j), admittance(nSubstrate)
+    fields = [np.array([1, etaS])]
+    for UC in reversed(cells):
+        n = complex(*UC.optRefIndex)
+        nCos = np.sqrt(n**2 - nSinTheta**2 + 0j)
+        nCos = -nCos if nCos.imag < 0 else nCos
+        delta = 2*np.pi*nCos*UC.cAxis/wavelength
+        eta = admittance(n)
+        M = np.array([[np.cos(delta), -1j*np.sin(delta)/eta], [-1j*eta*np.sin(delta), np.cos(delta)]])
+        fields.insert(0, M @ fields[0])
+    B, C = fields[0]
+    R = abs((eta0*B - C)/(eta0*B + C))**2
+    # the fields are scaled to a unit incident field
+    t = 2*eta0/(eta0*B + C)
+    flux = np.array([(E*np.conj(H)).real for E, H in fields])*abs(t)**2/eta0.real
+    return R, flux
+
+
+@pytest.mark.parametrize('polarization', ['s', 'p'])
+def testTransferMatrix(ud, sample, polarization):
+    wavelength = 800*u.nm
+    nSub = 1.5 + 0.001j
+    for theta in [0, 0.3, 1.2]:
+        R, flux = getSequentialFluxes(sample, wavelength, theta, polarization, nSub)
+        A = sample.getAbsorptionProfile('transferMatrix', wavelength=wavelength, theta=theta,
+                                        polarization=polarization, nSubstrate=nSub)
+        np.testing.assert_allclose(A, flux[:-1] - flux[1:], rtol=1e-9, atol=1e-13)
+        refl = ud.absorption.getReflectivity(sample, wavelength, theta, polarization, nSubstrate=nSub)
+        assert np.isclose(refl, R, rtol=1e-10)
+        # the energy is conserved
+        assert np.isclose(R + A.sum() + flux[-1], 1, rtol=1e-12)
+        assert np.all(A >= -1e-15)
+
+
+def testBatches(ud, sample, monkeypatch):
+    wavelength = np.array([400, 800])*u.nm
+    theta = np.array([0, 0.2, 0.4])
+    strain = np.zeros([4, 35])
+    A = ud.absorption.getTransferMatrixAbsorption(sample, wavelength, theta, strain=strain)
+    assert A.shape == (4, 2, 3, 35)
+    R = ud.absorption.getReflectivity(sample, wavelength, theta, strain=strain)
+    assert R.shape == (4, 2, 3)
+    for i, wl in enumerate(wavelength):
+        for j, th in enumerate(theta):
+            single = ud.absorption.getTransferMatrixAbsorption(sample, wl, th)
+            np.testing.assert_allclose(A[:, i, j], np.broadcast_to(single, (4, 35)), rtol=1e-12,
+                                       atol=1e-15)
+    # the result does not depend on the size of the chunks
+    monkeypatch.setattr(ud.absorption, '_maxBatchElements', 40)
+    np.testing.assert_allclose(ud.absorption.getTransferMatrixAbsorption(sample, wavelength, theta,
+                               strain=strain), A, rtol=1e-12, atol=1e-15)
+    np.testing.assert_allclose(ud.absorption.getReflectivity(sample, wavelength, theta, strain=strain),
+                               R, rtol=1e-12)
+
+
+def testLambertBeer(sample, expand):
+    A = sample.getAbsorptionProfile()
+    cells = expand(sample)
+    intensity = 1
+    for i, UC in enumerate(cells):
+        transmitted = intensity*np.exp(-UC.cAxis/UC.optPenDepth) if UC.optPenDepth > 0 else intensity
+        assert np.isclose(A[i], intensity - transmitted, rtol=1e-12, atol=1e-15)
+        intensity = transmitted
+    assert np.all(A[[UC.name == 'SrTiO3' for UC in cells]] == 0)
+    assert A.sum() < 1
+    with pytest.raises(ValueError):
+        sample.getAbsorptionProfile('unknown')
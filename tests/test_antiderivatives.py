@@ -0,0 +1,77 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import pickle
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def cache(getModule, tmp_path):
+    return getModule('antiderivatives').antiderivativeCache(filename=str(tmp_path / 'cache.json'))
+
+
+def checkDerivative(func, funcStr, T):
+    # the central difference of the anti-derivative is the function
+    h = 1e-3
+    deriv = (func(T + h) - func(T - h))/(2*h)
+    np.testing.assert_allclose(deriv, eval(funcStr)(T), rtol=1e-7)
+
+
+def testSymbolicIntegral(cache):
+    funcStr = 'lambda T: 455.2 + 0.112*T - 2.1935e6/T**2'
+    func, intStr = cache.getAntiderivative(funcStr)
+    assert 'tabulated' not in intStr
+    checkDerivative(func, funcStr, np.linspace(10, 1000, 50))
+    # numpy functions and constants are mapped to sympy
+    funcStr = 'lambda T: np.arctan(T/100) + np.log10(T) + np.exp(-T/np.pi)'
+    func, intStr = cache.getAntiderivative(funcStr)
+    assert 'tabulated' not in intStr
+    checkDerivative(func, funcStr, np.linspace(10, 1000, 50))
+
+
+def testPersistentCache(cache, getModule):
+    funcStr = 'lambda T: 400 + 0.1*T'
+    func, intStr = cache.getAntiderivative(funcStr)
+    assert (cache.hits, cache.misses) == (0, 1)
+    # expressions are normalized before the lookup
+    cache.getAntiderivative('lambda  T :400+0.1 * T')
+    assert (cache.hits, cache.misses) == (1, 1)
+    other = getModule('antiderivatives').antiderivativeCache(filename=cache.filename)
+    func2, intStr2 = other.getAntiderivative(funcStr)
+    assert (other.hits, other.misses) == (1, 0)
+    assert intStr2 == intStr
+    T = np.linspace(1, 500, 20)
+    np.testing.assert_array_equal(func2(T), func(T))
+    cache.clear()
+    cache.getAntiderivative(funcStr)
+    assert cache.misses == 2
+
+
+def testTabulatedIntegral(getModule):
+    funcStr = 'lambda T: 400 + 0.1*T'
+    integral = getModule('antiderivatives').tabulatedIntegral(funcStr, np.linspace(100, 300, 401))
+
+    def exact(T):
+        return 400*(T - 100) + 0.05*(T**2 - 100**2)
+
+    # linear functions are integrated exactly on the grid and outside of it
+    T = np.array([[50, 100, 123.5], [250, 300, 700]])
+    np.testing.assert_allclose(integral(T), exact(T), rtol=1e-12, atol=1e-9)
+    assert np.isclose(integral(20.), exact(20.), rtol=1e-12)
+    copy = pickle.loads(pickle.dumps(integral))
+    np.testing.assert_array_equal(copy(T), integral(T))
@@ -0,0 +1,179 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import os
+import numpy as np
+import numericalunits as u
+import pytest
+
+
+@pytest.fixture(scope='module')
+def allAtoms(ud):
+    """allAtoms
+
+    Returns the atoms of all elements with atomic form factors and
+    Cromer-Mann coefficients.
+    """
+    db = ud.getParameterDatabase()
+    cm = db.getCromerMannTable()
+    atoms = []
+    for symbol, (name, Z, A) in sorted(db.getElements().items()):
+        if os.path.isfile(os.path.join(db.paramPath, 'atomicFormFactors', symbol.lower() + '.nff')) \
+                and np.any((cm[:, 0] == Z) & (cm[:, 1] == 0)):
+            atoms.append(ud.atom(symbol))
+    return atoms
+
+
+def testInterpolationParity(getModule, allAtoms):
+    atoms = getModule('atoms')
+    # energies below, within and above the tables
+    E = np.concatenate([[1, 10], np.geomspace(30, 30000, 200), [30000, 1e5]])
+    f1, f2 = atoms._interpAtomicFormFactorCoeff(allAtoms, E)
+    for i, a in enumerate(allAtoms):
+        table = a.atomicFormFactorCoeff
+        np.testing.assert_allclose(f1[i], np.interp(E, table[:, 0], table[:, 1]), rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(f2[i], np.interp(E, table[:, 0], table[:, 2]), rtol=1e-12, atol=1e-12)
+
+
+def testBatchedFormFactors(ud, allAtoms):
+    E  = np.array([2, 8, 12])*u.keV
+    qz = np.linspace(0, 8, 50)/u.angstrom
+    f  = ud.getCMAtomicFormFactors(allAtoms, E, qz)
+    assert f.shape == (len(allAtoms), len(E), len(qz))
+    for i, a in enumerate(allAtoms):
+        for j, e in enumerate(E):
+            np.testing.assert_allclose(f[i, j], a.getCMAtomicFormFactor(e, qz), rtol=1e-12, atol=1e-12)
+
+
+def testBatchedMixedFormFactors(ud):
+    Ti, Ru, O = ud.atom('Ti'), ud.atom('Ru'), ud.atom('O')
+    B = ud.atomMixed('B')
+    B.addAtom(Ti, 0.3)
+    B.addAtom(Ru, 0.7)
+    E  = 8*u.keV
+    qz = np.linspace(1, 5, 20)/u.angstrom
+    f  = ud.getCMAtomicFormFactors([B, O], E, qz)[:, 0, :]
+    np.testing.assert_allclose(f[0], 0.3*Ti.getCMAtomicFormFactor(E, qz) + 0.7*Ru.getCMAtomicFormFactor(E, qz),
+                               rtol=1e-12)
+    np.testing.assert_allclose(f[1], O.getCMAtomicFormFactor(E, qz), rtol=1e-12)
+
+
+def testFormFactorCache(ud):
+    a  = ud.atom('Sr')
+    qz = np.linspace(1, 5, 100)/u.angstrom
+    E  = 8*u.keV
+    ref = a.getCMAtomicFormFactor(E, qz)
+    a.enableFormFactorCache()
+    f = a.getCMAtomicFormFactor(E, qz)
+    assert a.getCMAtomicFormFactor(E, qz.copy()) is f
+    np.testing.assert_array_equal(f, ref)
+    assert not f.flags.writeable
+    a.disableFormFactorCache()
+    assert a.getCMAtomicFormFactor(E, qz) is not f
+
+
+def testKeywordCalls(ud):
+    E, qz = 8000*u.eV, np.linspace(0, 5, 11)/u.angstrom
+    O = ud.atom('O')
+    TiRu = ud.atomMixed('TiRu')
+    TiRu.addAtoms([ud.atom('Ti'), ud.atom('Ru')], [0.3, 0.7])
+    for a in [O, TiRu]:
+        f  = a.getCMAtomicFormFactor(E, qz)
+        f0 = a.getAtomicFormFactor(E)
+        for enabled in [False, True]:
+            if enabled:
+                a.enableFormFactorCache()
+            np.testing.assert_array_equal(a.getCMAtomicFormFactor(E=E, qz=qz), f)
+            np.testing.assert_array_equal(a.getCMAtomicFormFactor(E, qz=qz), f)
+            np.testing.assert_array_equal(a.getAtomicFormFactor(E=E), f0)
+        # positional and keyword calls share the cache entries
+        assert a.formFactorCache.misses == 2
+        with pytest.raises(TypeError):
+            a.getCMAtomicFormFactor(E, qz, qz=qz)
+
+
+def testFormFactorCacheEviction(ud):
+    a = ud.atom('Sr')
+    E = np.linspace(5, 10, 10)*u.keV
+    a.enableFormFactorCache(maxSize=2)
+    f = a.getAtomicFormFactor(E)
+    a.getAtomicFormFactor(E + 1*u.keV)
+    assert a.getAtomicFormFactor(E) is f
+    # the least recently used result is evicted
+    a.getAtomicFormFactor(E + 2*u.keV)
+    assert len(a.formFactorCache) == 2
+    assert a.getAtomicFormFactor(E) is f
+    stats = a.formFactorCache.getStatistics()
+    assert (stats['hits'], stats['misses']) == (2, 3)
+    a.getAtomicFormFactor(E + 1*u.keV)
+    assert a.formFactorCache.misses == 4
+
+
+def testFormFactorCacheBytes(getModule):
+    cache = getModule('atoms').formFactorCache(maxSize=10, maxBytes=1000)
+    for i in range(3):
+        cache.put(('f', i), np.zeros(50))
+    assert len(cache) == 2
+    assert cache.nbytes == 800
+    assert cache.get(('f', 0)) is None
+    # results larger than the cache are not stored
+    cache.put(('f', 3), np.zeros(200))
+    assert len(cache) == 2
+
+
+def testMixedFormFactorCache(ud):
+    Ti, Ru = ud.atom('Ti'), ud.atom('Ru')
+    B = ud.atomMixed('B')
+    B.enableFormFactorCache()
+    B.addAtom(Ti, 0.5)
+    f = B.getAtomicFormFactor(8*u.keV)
+    # adding atoms clears the cached form factors
+    B.addAtom(Ru, 0.5)
+    np.testing.assert_allclose(B.getAtomicFormFactor(8*u.keV),
+                               0.5*(Ti.getAtomicFormFactor(8*u.keV) + Ru.getAtomicFormFactor(8*u.keV)))
+    assert B.getAtomicFormFactor(8*u.keV) != f
+
+
+def testPickledCache(ud):
+    import pickle
+    a = ud.atom('O')
+    a.enableFormFactorCache(maxSize=5, maxBytes=1024)
+    a.getAtomicFormFactor(8*u.keV)
+    b = pickle.loads(pickle.dumps(a))
+    assert len(b.formFactorCache) == 0
+    assert (b.formFactorCache.maxSize, b.formFactorCache.maxBytes) == (5, 1024)
+    assert b.atomicFormFactorCoeff is a.atomicFormFactorCoeff
+
+
+def testAtomComposition(ud):
+    Ti, Ru = ud.atom('Ti'), ud.atom('Ru')
+    x = np.linspace(0, 1, 11)
+    composition = ud.atomComposition('TiRu', [Ti, Ru], np.stack([1 - x, x], axis=1))
+    mixed = composition.getMixedAtoms()
+    assert len(composition) == len(mixed) == 11
+    assert composition.getMixedAtoms() is mixed
+    assert [a.ID for a in mixed[:2]] == ['TiRu_0', 'TiRu_1']
+    for name in ['atomicNumberZ', 'massNumberA', 'mass', 'ionicity']:
+        np.testing.assert_allclose(getattr(composition, name), [getattr(a, name) for a in mixed],
+                                   rtol=1e-14)
+    E, qz = np.array([6000, 8000])*u.eV, np.linspace(0, 5, 11)/u.angstrom
+    np.testing.assert_allclose(composition.getCMAtomicFormFactors(E, qz),
+                               [a.getCMAtomicFormFactor(E, qz) for a in mixed], rtol=1e-12)
+    np.testing.assert_allclose(composition.getAtomicFormFactors(E),
+                               [a.getAtomicFormFactor(E) for a in mixed], rtol=1e-12)
+    with pytest.raises(ValueError):
+        ud.atomComposition('TiRu', [Ti, Ru], [[0.5, 0.3, 0.2]])
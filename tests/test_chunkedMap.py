@@ -0,0 +1,77 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import numericalunits as u
+import pytest
+
+
+def chunks(data, size):
+    for start in range(0, len(data), size):
+        yield np.arange(start, min(start + size, len(data)))*u.ps, data[start:start + size]
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def testRoundTrip(ud, tmp_path, compress):
+    data = np.random.default_rng(3).normal(size=(23, 10, 2))
+    path = str(tmp_path / 'map')
+    M = ud.chunkedMap(path, shape=(10, 2), compress=compress, metadata={'name': 'test'})
+    M.write(chunks(data, 5))
+    M = ud.chunkedMap(path)
+    assert M.shape == (23, 10, 2)
+    assert (M.compress, M.metadata) == (compress, {'name': 'test'})
+    np.testing.assert_array_equal(M.time, np.arange(23)*u.ps)
+    np.testing.assert_array_equal(np.asarray(M), data)
+    # lazy indexing gives the same data as indexing the full array
+    for key in [7, -1, slice(3, 17), slice(None, None, 4), [0, 6, 22], (slice(4, 12), 3),
+                (Ellipsis, 1), (slice(None), slice(2, 5), 0), slice(30, 40)]:
+        np.testing.assert_array_equal(M[key], data[key])
+    assert [len(t) for t, _ in M.iterChunks()] == [5, 5, 5, 5, 3]
+
+
+def testShape(ud, tmp_path):
+    M = ud.chunkedMap(str(tmp_path / 'map'), shape=(10,))
+    with pytest.raises(ValueError):
+        M.append(np.arange(3), np.zeros([3, 11]))
+    assert len(M) == 0 and M[:].shape == (0, 10)
+
+
+def testOverwrite(ud, tmp_path):
+    path = str(tmp_path / 'map')
+    ud.chunkedMap(path, shape=(4,)).append([0, 1], np.ones([2, 4]))
+    # an existing map is not replaced by accident
+    with pytest.raises(ValueError):
+        ud.chunkedMap(path, shape=(4,))
+    np.testing.assert_array_equal(ud.chunkedMap(path)[:], np.ones([2, 4]))
+    M = ud.chunkedMap(path, shape=(3,), overwrite=True)
+    M.append([0], np.zeros([1, 3]))
+    assert ud.chunkedMap(path).shape == (1, 3)
+
+
+def testSaveTempMap(ud, tmp_path, sample):
+    H = ud.heat(sample, excitation={'fluence': [5*u.mJ/u.cm**2], 'delayPump': [0], 'pulseWidth': [0]})
+    time = np.linspace(0, 5, 11)*u.ps
+    M = H.saveTempMap(str(tmp_path / 'temp'), time, chunkSize=4)
+    np.testing.assert_array_equal(M[:], H.getTempMap(time))
+    assert M.metadata['fingerprint'] == sample.getFingerprint()
+    assert M.metadata['indices'] == sample.compile().indices.tolist()
+    # the strain map is calculated from the memory-mapped temperature map
+    P = ud.phonon(sample)
+    S = P.saveStrainMap(str(tmp_path / 'strain'), time, ud.chunkedMap(str(tmp_path / 'temp')),
+                        chunkSize=3)
+    strainMap = P.getStrainMap(time, H.getTempMap(time))
+    np.testing.assert_allclose(S[:], strainMap, rtol=0, atol=1e-10*np.abs(strainMap).max())
@@ -0,0 +1,135 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import numericalunits as u
+import pytest
+
+
+def buildStructure(ud, heatCapacity, subSystems=1):
+    """buildStructure
+
+    Returns a structure of 20 absorbing and 30 transparent unit cells.
+    """
+    Sr, Ru, Ti, O = ud.atom('Sr'), ud.atom('Ru'), ud.atom('Ti'), ud.atom('O')
+    kwargs = dict(heatCapacity=heatCapacity, thermCond=5*u.W/(u.m*u.K))
+    if subSystems == 2:
+        kwargs.update(thermCond=[1*u.W/(u.m*u.K), 5*u.W/(u.m*u.K)], linThermExp=[0, 1e-5],
+                      subSystemCoupling=['lambda T: 5e17*(T[1] - T[0])',
+                                         'lambda T: 5e17*(T[0] - T[1])'])
+    SRO = ud.unitCell('SRO', 'SrRuO3', 3.95*u.angstrom, soundVel=6.3*u.nm/u.ps,
+                      optPenDepth=43.8*u.nm, **kwargs)
+    SRO.addAtoms([Sr, Ru, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+    STO = ud.unitCell('STO', 'SrTiO3', 3.905*u.angstrom, soundVel=7.8*u.nm/u.ps, **kwargs)
+    STO.addAtoms([Sr, Ti, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+    S = ud.structure('sample')
+    S.addSubStructure(SRO, 20)
+    S.addSubStructure(STO, 30)
+    return S
+
+
+def getEnergy(S, T):
+    """getEnergy
+
+    Returns the energy per area [J/m^2] of the (time x N x K) temperatures
+    relative to 300 K by the anti-derivatives of the heat capacities.
+    """
+    props = S.getUnitCellPropertyVectors(types=['cAxis', 'density'])
+    T0 = np.full(T.shape[1:], 300.)
+    res = [np.sum(props['density'][:, np.newaxis]*props['cAxis'][:, np.newaxis]*(
+           S.evalUnitCellFunctions('intHeatCapacity', Ti) - S.evalUnitCellFunctions('intHeatCapacity', T0)))
+           for Ti in T]
+    return np.array(res)
+
+
+def testEnergyConservation(ud):
+    # the diffusion conserves the energy exactly for constant heat capacities
+    S = buildStructure(ud, 450)
+    fluence = 5*u.mJ/u.cm**2
+    H = ud.heat(S, excitation={'fluence': [fluence], 'delayPump': [0], 'pulseWidth': [0.1*u.ps]},
+                maxTimeStep=0.5*u.ps)
+    time = np.linspace(-1, 20, 43)*u.ps
+    tempMap = H.getTempMap(time, chunkSize=10)
+    assert tempMap.shape == (43, 50, 1)
+    absorbed = fluence*np.sum(H.getAbsorptionProfile())
+    energy = getEnergy(S, tempMap)
+    np.testing.assert_allclose(energy[time < -0.5*u.ps], 0, atol=1e-12*absorbed)
+    np.testing.assert_allclose(energy[time > 0.5*u.ps], absorbed, rtol=1e-9)
+    # the heat diffuses from the absorbing layer into the substrate
+    assert np.all(tempMap[-1, 20:, 0] > 300)
+    assert np.all(np.diff(tempMap[-1, :, 0]) <= 0)
+
+
+def testEnergyDeposition(ud):
+    # the deposited energy does not depend on the temperature dependence of the heat capacity
+    S = buildStructure(ud, 'lambda T: 455.2 + 0.112*T - 2.1935e6/T**2')
+    props = S.getUnitCellPropertyVectors(types=['cAxis', 'density'])
+    H = ud.heat(S)
+    energy = 20*u.mJ/u.cm**2*H.getAbsorptionProfile()
+    T0 = np.full([50, 1], 300.)
+    T = H._depositEnergy(T0, energy, props['cAxis'], props['density'])
+    assert T[0, 0] > 1000
+    deposited = props['density']*props['cAxis']*(S.evalUnitCellFunctions('intHeatCapacity', T[:, 0])
+                                                - S.evalUnitCellFunctions('intHeatCapacity', T0[:, 0]))
+    np.testing.assert_allclose(deposited, energy, rtol=1e-9, atol=1e-12*energy.max())
+
+
+def testTwoTemperatures(ud):
+    S = buildStructure(ud, [100, 'lambda T: 450'], subSystems=2)
+    H = ud.heat(S, excitation={'fluence': [2*u.mJ/u.cm**2], 'delayPump': [0], 'pulseWidth': [0]},
+                maxTimeStep=0.1*u.ps)
+    time = np.linspace(0, 10, 11)*u.ps
+    tempMap = H.getTempMap(time)
+    assert tempMap.shape == (11, 50, 2)
+    energy = getEnergy(S, tempMap)
+    np.testing.assert_allclose(energy[1:], energy[-1], rtol=1e-9)
+    # the subsystems equilibrate after the excitation of the first one
+    assert tempMap[1, 0, 0] > tempMap[1, 0, 1]
+    assert abs(tempMap[-1, 0, 0] - tempMap[-1, 0, 1]) < 1e-3*(tempMap[1, 0, 0] - 300)
+
+
+def testBoundaries(ud):
+    S = buildStructure(ud, 450)
+    time = np.linspace(0, 50, 6)*u.ps
+    H = ud.heat(S, initTemp=300)
+    np.testing.assert_array_equal(H.getTempMap(time), 300)
+    H = ud.heat(S, initTemp=300, boundaryTypes=['temperature', 'isolator'], boundaryTemps=[400, 0])
+    tempMap = H.getTempMap(time)
+    assert np.all(np.diff(tempMap[:, 0, 0]) > 0)
+    assert np.all(tempMap <= 400)
+    H.boundaryTypes = ['temperature', 'mirror']
+    with pytest.raises(ValueError):
+        H.getTempMap(time)
+
+
+def testTimeVector(ud, tmp_path):
+    S = buildStructure(ud, 450)
+    H = ud.heat(S, excitation={'fluence': [5*u.mJ/u.cm**2], 'delayPump': [0], 'pulseWidth': [0]})
+    P = ud.phonon(S)
+    for time in [[], [5*u.ps, 1*u.ps, 10*u.ps], [[0, 1]]]:
+        with pytest.raises(ValueError):
+            H.iterTempMap(time)
+        with pytest.raises(ValueError):
+            H.getTempMap(time)
+        with pytest.raises(ValueError):
+            P.getStrainMap(time, np.full([len(time), 50], 300.))
+    with pytest.raises(ValueError):
+        H.saveTempMap(str(tmp_path / 'temp'), [])
+    assert not (tmp_path / 'temp').exists()
+    # repeated time steps are allowed
+    tempMap = H.getTempMap(np.array([0, 1, 1, 2])*u.ps)
+    np.testing.assert_array_equal(tempMap[1], tempMap[2])
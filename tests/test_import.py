@@ -0,0 +1,50 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import os
+import sys
+import subprocess
+
+modulePath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+heavyModules = ['sympy', 'scipy', 'matplotlib', 'h5py']
+
+buildScript = """
+import sys
+import numericalunits as u
+import {0:s} as ud
+u.reset_units('SI')
+Sr, Ti, O = ud.atom('Sr'), ud.atom('Ti'), ud.atom('O')
+STO = ud.unitCell('STO', 'SrTiO3', 3.905*u.angstrom, soundVel=7.8*u.nm/u.ps,
+                  heatCapacity='lambda T: 455.2 + 0.112*T - 2.1935e6/T**2')
+STO.addAtoms([Sr, Ti, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+S = ud.structure('sample')
+S.addSubStructure(STO, 100)
+S.getLength()
+S.getUnitCellPropertyVector(types='springConst')
+print(' '.join(m for m in {1:s} if m in sys.modules))
+"""
+
+
+def testNoHeavyImports():
+    # the module and its caches are loaded in a fresh interpreter
+    res = subprocess.run([sys.executable, '-c',
+                          buildScript.format(os.path.basename(modulePath), repr(heavyModules))],
+                         cwd=os.path.dirname(modulePath), capture_output=True, text=True,
+                         env=os.environ.copy())
+    assert res.returncode == 0, res.stderr
+    assert res.stdout.split() == []
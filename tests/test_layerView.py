@@ -0,0 +1,61 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import pytest
+
+
+def testLayerView(sample):
+    view = sample.getLayerView()
+    flat = sample.compile().indices
+    assert len(view) == len(flat)
+    np.testing.assert_array_equal(view.expand(), flat)
+    np.testing.assert_array_equal(list(view), flat)
+    np.testing.assert_array_equal(view[3:30:4], flat[3:30:4])
+    np.testing.assert_array_equal(view[[0, 7, -1]], flat[[0, 7, -1]])
+    assert view[-1] == flat[-1]
+    with pytest.raises(IndexError):
+        view[len(flat)]
+    np.testing.assert_array_equal(view.getCounts(), np.bincount(flat))
+
+
+def testRuns(sample):
+    view = sample.getLayerView()
+    indices, repetitions = view.getRuns()
+    np.testing.assert_array_equal(np.repeat(indices, repetitions), sample.compile().indices)
+    # adjacent runs of the same unit cell are merged
+    assert np.all(indices[1:] != indices[:-1])
+    assert repetitions[0] == 8
+
+
+def testReductions(sample, expand):
+    view  = sample.getLayerView()
+    cAxes = np.array([UC.cAxis for UC in expand(sample)])
+    assert np.isclose(view.reduceProperty('cAxis'), cAxes.sum(), rtol=1e-14)
+    assert np.isclose(view.reduceProperty('cAxis', 'mean'), cAxes.mean(), rtol=1e-14)
+    assert view.reduceProperty('cAxis', 'max') == cAxes.max()
+    assert np.isclose(view.reduceRuns('cAxis').sum(), cAxes.sum(), rtol=1e-14)
+
+
+def testLargeRepetitions(ud, sample):
+    # the view does not expand the repetitions
+    S = ud.structure('large')
+    S.addSubStructure(sample, 10**9)
+    view = S.getLayerView()
+    assert len(view) == 35*10**9
+    assert view[35*10**9 - 1] == sample.compile().indices[-1]
+    assert view.getCounts().sum() == len(view)
@@ -0,0 +1,69 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import pickle
+import numpy as np
+import numericalunits as u
+import pytest
+
+
+def testVectorized(ud):
+    funcStr = 'lambda T: 455.2 + 0.112*T - 2.1935e6/T**2 + np.exp(-T/u.K/100)'
+    func = ud.materialFunction(funcStr)
+    T = np.linspace(10, 1000, 101).reshape(1, 101)
+    res = func(T)
+    assert res.shape == T.shape
+    assert func.vectorized
+    np.testing.assert_array_equal(res[0], [eval(funcStr, {'np': np, 'u': u})(Ti) for Ti in T[0]])
+    # constant expressions are broadcast to the shape of the input
+    np.testing.assert_array_equal(ud.materialFunction('lambda T: 3')(T), np.full(T.shape, 3.))
+    with pytest.raises(ValueError):
+        ud.materialFunction('T**2')
+
+
+def testFallback(ud):
+    func = ud.materialFunction('lambda T: 1 if T > 300 else 0.5')
+    T = np.array([[100, 300], [301, 1000]])
+    np.testing.assert_array_equal(func(T), [[0.5, 0.5], [1, 1]])
+    assert not func.vectorized
+    assert func(400) == 1
+
+
+def testPickle(ud):
+    func = ud.materialFunction('lambda T: 400 + 0.1*T')
+    copy = pickle.loads(pickle.dumps(func))
+    assert copy == func and hash(copy) == hash(func)
+    assert copy(300.) == func(300.)
+    func.tabulate(100, 500, 401)
+    copy = pickle.loads(pickle.dumps(func))
+    np.testing.assert_array_equal(copy.table[0], func.table[0])
+    np.testing.assert_array_equal(copy.table[1], func.table[1])
+
+
+def testTabulate(ud):
+    funcStr = 'lambda T: 400 + 0.1*T + 1e-4*T**2'
+    func = ud.materialFunction(funcStr).tabulate(100, 500, 4001)
+    exact = ud.materialFunction(funcStr)
+    T = np.linspace(50, 600, 1001)
+    inside = (T >= 100) & (T <= 500)
+    res = func(T)
+    # the interpolation error of the quadratic term is bounded by h^2/8 * f''
+    np.testing.assert_allclose(res[inside], exact(T[inside]), rtol=0, atol=0.1**2/8*2e-4 + 1e-10)
+    np.testing.assert_array_equal(res[~inside], exact(T[~inside]))
+    np.testing.assert_allclose(func(func.table[0]), func.table[1], rtol=1e-14)
+    # scalars are evaluated by the expression
+    assert func(123.45) == exact(123.45)
@@ -0,0 +1,178 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import os
+import numpy as np
+import pytest
+
+
+def testSharedDatabase(ud):
+    assert ud.getParameterDatabase() is ud.getParameterDatabase()
+
+
+def testSharedReadOnlyTables(ud):
+    a = ud.atom('Fe')
+    b = ud.atom('Fe', ID='Fe2')
+    assert a.atomicFormFactorCoeff is b.atomicFormFactorCoeff
+    assert not a.atomicFormFactorCoeff.flags.writeable
+    with pytest.raises(ValueError):
+        a.atomicFormFactorCoeff[0, 0] = 0
+
+
+def testParseOnce(ud):
+    db = ud.parameterDatabase(useStore=False)
+    f = db.getAtomicFormFactorCoeff('Fe')
+    assert db.getAtomicFormFactorCoeff('fe') is f
+    db.getElements()
+    db.getElement('O')
+    db.getCromerMannCoeff(26)
+    stats = db.getLoadStatistics()
+    assert stats['fe.nff']['count'] == 1
+    assert stats['elements.dat']['count'] == 1
+    assert stats['cromermann.txt']['count'] == 1
+
+
+def testParsedValues(ud):
+    db = ud.parameterDatabase(useStore=False)
+    filename = os.path.join(db.paramPath, 'atomicFormFactors', 'sr.nff')
+    np.testing.assert_array_equal(db.getAtomicFormFactorCoeff('Sr'),
+                                  np.genfromtxt(filename, skip_header=1))
+    name, Z, A = db.getElement('Sr')
+    assert Z == 38
+    assert db.getCromerMannCoeff(38)[0] == 38
+
+
+def testUnknownElement(ud):
+    db = ud.parameterDatabase(useStore=False)
+    with pytest.raises(KeyError):
+        db.getElement('Xx')
+    with pytest.raises(KeyError):
+        db.getCromerMannCoeff(26, 7)
+
+
+@pytest.fixture
+def paramCopy(ud, tmp_path):
+    """paramCopy
+
+    Returns the path of a copy of the parameter text files.
+    """
+    import shutil
+    source = ud.parameterDatabase().paramPath
+    for folder in ['elements', 'atomicFormFactors']:
+        shutil.copytree(os.path.join(source, folder), str(tmp_path / folder))
+    return str(tmp_path)
+
+
+def testStoreParity(ud, paramCopy):
+    text  = ud.parameterDatabase(paramCopy, useStore=False)
+    store = ud.parameterDatabase(paramCopy)
+    assert store.getElements() == text.getElements()
+    np.testing.assert_array_equal(store.getCromerMannTable(), text.getCromerMannTable())
+    symbols = [f[:-4] for f in os.listdir(os.path.join(paramCopy, 'atomicFormFactors'))
+               if f.endswith('.nff')]
+    for symbol in symbols:
+        np.testing.assert_array_equal(store.getAtomicFormFactorCoeff(symbol),
+                                      text.getAtomicFormFactorCoeff(symbol))
+    stats = store.getLoadStatistics()
+    assert 'compile' in stats
+    assert not any(key.endswith('.nff') for key in stats)
+    assert not store.getAtomicFormFactorCoeff('fe').flags.writeable
+
+
+def testStoreStamp(ud, getModule, paramCopy, monkeypatch):
+    pdb = getModule('parameterDatabase')
+    ud.parameterDatabase(paramCopy).getElements()
+    calls = []
+    checksum = pdb.getParameterChecksum
+    monkeypatch.setattr(pdb, 'getParameterChecksum', lambda path: calls.append(path) or checksum(path))
+
+    # unchanged files are validated by their stamp only
+    db = ud.parameterDatabase(paramCopy)
+    db.getElements()
+    assert calls == []
+    assert 'compile' not in db.getLoadStatistics()
+
+    # a new modification time without changed content does not recompile
+    filename = os.path.join(paramCopy, 'atomicFormFactors', 'fe.nff')
+    os.utime(filename, ns=(0, 0))
+    db = ud.parameterDatabase(paramCopy)
+    db.getElements()
+    assert len(calls) == 1
+    assert 'compile' not in db.getLoadStatistics()
+    ud.parameterDatabase(paramCopy).getElements()
+    assert len(calls) == 1
+
+    # changed content recompiles the store
+    table = np.genfromtxt(filename, skip_header=1)
+    with open(filename, 'a') as f:
+        f.write('{:f} 1.0 2.0\n'.format(table[-1, 0] + 1))
+    db = ud.parameterDatabase(paramCopy)
+    assert len(db.getAtomicFormFactorCoeff('fe')) == len(table) + 1
+    assert 'compile' in db.getLoadStatistics()
+
+
+def testCompileScript(ud, tmp_path):
+    # the store is compiled by running the module as script, see README
+    import shutil
+    import subprocess
+    import sys
+    source = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for filename in ['parameterDatabase.py', 'helpers.py']:
+        shutil.copy(os.path.join(source, filename), str(tmp_path))
+    for folder in ['elements', 'atomicFormFactors']:
+        shutil.copytree(os.path.join(source, 'parameters', folder), str(tmp_path / 'parameters' / folder))
+    res = subprocess.run([sys.executable, 'parameterDatabase.py'], cwd=str(tmp_path),
+                         capture_output=True, text=True)
+    assert res.returncode == 0, res.stderr
+    storePath = str(tmp_path / 'parameters' / 'compiled')
+    assert res.stdout.strip() == 'Compiled parameter store to {:s}'.format(storePath)
+    store = ud.parameterDatabase(str(tmp_path / 'parameters'))
+    np.testing.assert_array_equal(store.getAtomicFormFactorCoeff('fe'),
+                                  ud.parameterDatabase(useStore=False).getAtomicFormFactorCoeff('fe'))
+    assert 'compile' not in store.getLoadStatistics()
+
+
+def testStoreTable(ud, getModule, paramCopy):
+    pdb = getModule('parameterDatabase')
+    storePath = pdb.compileParameterStore(paramCopy)
+    with np.load(os.path.join(storePath, 'index.npz')) as index:
+        oldName = str(index['table'])
+        checksum = str(index['checksum'])
+    assert oldName == 'formFactors-{:s}.npy'.format(checksum)
+    old = ud.parameterDatabase(paramCopy)
+    coeff = np.array(old.getAtomicFormFactorCoeff('fe'))
+
+    # a recompiled store replaces the table by a new file
+    filename = os.path.join(paramCopy, 'atomicFormFactors', 'fe.nff')
+    with open(filename, 'a') as f:
+        f.write('{:f} 1.0 2.0\n'.format(coeff[-1, 0] + 1))
+    pdb.compileParameterStore(paramCopy)
+    with np.load(os.path.join(storePath, 'index.npz')) as index:
+        name = str(index['table'])
+    assert name != oldName
+    assert [f for f in os.listdir(storePath) if f.startswith('formFactors')] == [name]
+    np.testing.assert_array_equal(old.getAtomicFormFactorCoeff('fe'), coeff)
+    assert len(ud.parameterDatabase(paramCopy).getAtomicFormFactorCoeff('fe')) == len(coeff) + 1
+
+    # stores of the former layout are recompiled
+    os.remove(os.path.join(storePath, name))
+    with np.load(os.path.join(storePath, 'index.npz')) as index:
+        arrays = {key: index[key] for key in index.files if key != 'table'}
+    np.savez(os.path.join(storePath, 'index.npz'), **arrays)
+    db = ud.parameterDatabase(paramCopy)
+    assert len(db.getAtomicFormFactorCoeff('fe')) == len(coeff) + 1
+    assert 'compile' in db.getLoadStatistics()
@@ -0,0 +1,85 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import numericalunits as u
+import pytest
+
+
+def getProperties(S, scale=1):
+    """getProperties
+
+    Simulation function of the sweeps, which returns the length, the mass
+    and the mean spring constant of the structure.
+    """
+    props = S.getUnitCellPropertyVectors(types=['mass', 'springConst'])
+    return scale*np.array([S.getLength(), props['mass'].sum(), np.mean(props['springConst'])])
+
+
+def testApplyParameters(ud, sample):
+    SRO, STO = sample.getUniqueUnitCells()[1]
+    SRO.intHeatCapacity
+    variant, others = ud.applyParameters(sample, {'SRO.cAxis': 4*u.angstrom,
+                                                  'STO.heatCapacity': 'lambda T: 500',
+                                                  'SL.N': 2, 'scale': 3})
+    assert others == {'scale': 3}
+    assert variant.getNumberOfUnitCells() == 25
+    newSRO, newSTO = variant.getUniqueUnitCells()[1]
+    # the derived properties are recalculated as for a new unit cell
+    manual = ud.unitCell('SRO', 'SrRuO3', 4*u.angstrom, aAxis=SRO.aAxis, soundVel=SRO.soundVel,
+                         heatCapacity=SRO.heatCapacityStr, thermCond=SRO.thermCond[0](300),
+                         linThermExp=SRO.linThermExpStr, optPenDepth=SRO.optPenDepth)
+    manual.addAtoms([a[0] for a in SRO.atoms], [a[2] for a in SRO.atoms])
+    for attr in ['volume', 'mass', 'density', 'springConst']:
+        np.testing.assert_allclose(getattr(newSRO, attr), getattr(manual, attr), rtol=1e-14)
+    assert newSRO.getAtomPositions(0.01).tolist() == SRO.getAtomPositions(0.01).tolist()
+    # the unchanged anti-derivatives are kept, the swept ones are recalculated
+    assert newSRO.intHeatCapacityStr == SRO.intHeatCapacityStr
+    assert newSTO.intHeatCapacity[0](400.) - newSTO.intHeatCapacity[0](300.) == pytest.approx(5e4)
+    # the original structure is unchanged
+    assert SRO.cAxis == 3.95*u.angstrom
+    assert sample.getNumberOfUnitCells() == 35
+    # unchanged unit cells are shared
+    variant = ud.applyParameters(sample, {'SRO.soundVel': 5*u.nm/u.ps})[0]
+    assert variant.getUniqueUnitCells()[1][1] is STO
+
+
+def testInvalidParameters(ud, sample):
+    with pytest.raises(ValueError):
+        ud.applyParameters(sample, {'SRO.mass': 1})
+    with pytest.raises(ValueError):
+        ud.applyParameters(sample, {'LAO.cAxis': 1})
+    # mistyped repetitions would give variants identical to the base structure
+    with pytest.raises(ValueError):
+        ud.applyParameters(sample, {'SLx.N': 2})
+    with pytest.raises(ValueError):
+        ud.applyParameters(sample, {'sample.N': 2})
+    assert ud.applyParameters(sample, {'SRO.N': 2})[0].getNumberOfUnitCells() == 28
+
+
+def testRun(ud, sample):
+    grid = {'SRO.cAxis': [3.9*u.angstrom, 4*u.angstrom], 'SL.N': [1, 2, 4], 'scale': [1, 2]}
+    sweep = ud.parameterSweep(sample, getProperties, grid, processes=1, verbose=False)
+    res = sweep.run()
+    assert res.shape == (2, 3, 2, 3)
+    assert sweep.times.shape == (2, 3, 2)
+    for params, r in zip(sweep.getParameters(), res.reshape(-1, 3)):
+        S, others = ud.applyParameters(sample, params)
+        np.testing.assert_array_equal(r, getProperties(S, **others))
+    # the results of a pool of processes are the same
+    sweep.processes = 2
+    np.testing.assert_array_equal(sweep.run(), res)
@@ -0,0 +1,75 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import numericalunits as u
+import pytest
+
+
+def getTempMap(S, time):
+    """getTempMap
+
+    Returns a smooth (time x N) temperature map of a heating of the top
+    unit cells with a rise time of 1 ps.
+    """
+    dStart, dEnd, dMid = S.getDistancesOfUnitCells()
+    profile = 100*np.exp(-dMid/(5*u.nm))
+    rise = 1 - np.exp(-(np.maximum(time, 0)/u.ps)**2)
+    return 300 + rise[:, np.newaxis]*profile
+
+
+def testModes(ud, sample):
+    time = np.linspace(-2, 18, 401)*u.ps
+    tempMap = getTempMap(sample, time)
+    P = ud.phonon(sample)
+    eigen = P.getStrainMap(time, tempMap, chunkSize=50)
+    assert eigen.shape == (401, 35)
+    P = ud.phonon(sample, mode='ode', rtol=1e-8)
+    ode = P.getStrainMap(time, tempMap)
+    scale = np.abs(ode).max()
+    assert scale > 1e-5
+    np.testing.assert_allclose(eigen, ode, rtol=0, atol=1e-2*scale)
+    # the chain is at rest before the heating
+    np.testing.assert_array_equal(eigen[time < 0], 0)
+
+
+def testChunks(ud, sample):
+    time = np.linspace(0, 10, 101)*u.ps
+    tempMap = getTempMap(sample, time)
+    P = ud.phonon(sample)
+    strainMap = P.getStrainMap(time, tempMap)
+    np.testing.assert_allclose(P.getStrainMap(time, tempMap, chunkSize=7), strainMap, rtol=0,
+                               atol=1e-10*np.abs(strainMap).max())
+    # the eigenmodes are reused until the structure changes
+    eigen = P.getEigenmodes()
+    assert P.getEigenmodes() is eigen
+    sample.addSubStructure(sample.getUniqueUnitCells()[1][1], 1)
+    assert P.getEigenmodes()[0].shape == (36,)
+
+
+def testModeSwitch(ud, sample):
+    P = ud.phonon(sample, maxEigenmodeCells=35)
+    assert P.getMode() == 'eigenmode'
+    P.maxEigenmodeCells = 34
+    assert P.getMode() == 'ode'
+    assert ud.phonon(sample, mode='ode').getMode() == 'ode'
+    with pytest.raises(ValueError):
+        ud.phonon(sample, mode='unknown').iterStrainMap([0], np.full([1, 35], 300))
+    # damped chains require the ode mode
+    sample.getUniqueUnitCells()[1][0].phononDamping = 1e-12
+    with pytest.raises(ValueError):
+        ud.phonon(sample).getStrainMap(np.arange(3)*u.ps, np.full([3, 35], 300.))
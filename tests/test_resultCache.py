@@ -0,0 +1,102 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import os
+import pickle
+import numpy as np
+import numericalunits as u
+import pytest
+
+
+@pytest.fixture
+def cache(ud, tmp_path):
+    return ud.resultCache(str(tmp_path / 'results'))
+
+
+def testHitsAndMisses(cache, sample):
+    value = np.arange(12.).reshape(3, 4)
+    assert cache.get('map', sample, time=np.arange(3)) is None
+    cache.put('map', sample, value, time=np.arange(3))
+    np.testing.assert_array_equal(cache.get('map', sample, time=np.arange(3)), value)
+    assert cache.get('map', sample, time=np.arange(4)) is None
+    assert cache.get('other', sample, time=np.arange(3)) is None
+    stats = cache.getStatistics()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 3, 1)
+    cache.clear()
+    assert cache.get('map', sample, time=np.arange(3)) is None
+    assert cache.getStatistics()['size'] == 0
+
+
+def testFingerprint(ud, sample):
+    fingerprint = ud.getFingerprint(sample)
+    assert ud.getFingerprint(pickle.loads(pickle.dumps(sample))) == fingerprint
+    # derived and cached data do not change the fingerprint
+    sample.compile()
+    SRO, STO = sample.getUniqueUnitCells()[1]
+    for UC in [SRO, STO]:
+        UC.compileAtomPositions()
+        UC.intHeatCapacity
+        UC.atoms[0][0].getCMAtomicFormFactor(8000*u.eV, np.array([1, 2])/u.angstrom)
+    assert ud.getFingerprint(sample) == fingerprint
+    # every change of the structure does
+    fingerprints = {fingerprint}
+    for change in [lambda: setattr(SRO, 'cAxis', 4*u.angstrom),
+                   lambda: setattr(STO, 'soundVel', 7*u.nm/u.ps),
+                   lambda: STO.addAtom(ud.atom('O'), 0.75),
+                   lambda: sample.addSubStructure(SRO, 1)]:
+        change()
+        fingerprints.add(ud.getFingerprint(sample))
+    assert len(fingerprints) == 5
+
+
+def testInvalidationReport(cache, sample):
+    cache.put('map', sample, np.zeros(3), time=np.arange(3), fluence=5)
+    assert cache.getInvalidationReport('map', sample, time=np.arange(3), fluence=5) == []
+    SRO = sample.getUniqueUnitCells()[1][0]
+    SRO.cAxis = 4*u.angstrom
+    assert cache.get('map', sample, time=np.arange(3), fluence=6) is None
+    assert cache.lastReport == ['component unitCell SRO/cAxis changed', 'parameter fluence changed']
+    assert cache.getInvalidationReport('other', sample) == ['no cached result other']
+
+
+def testEviction(cache, sample):
+    value = np.zeros(1000)
+    cache.maxBytes = 2*value.nbytes + 1000
+    for i, t in enumerate([100, 200]):
+        cache.put('map', sample, value, index=i)
+        key = cache.getKey('map', sample, index=i)[0]
+        os.utime(cache._getFilenames(key)[0], (t, t))
+    # the first result is used and the second one is evicted
+    assert cache.get('map', sample, index=0) is not None
+    cache.put('map', sample, value, index=2)
+    assert cache.get('map', sample, index=1) is None
+    assert cache.get('map', sample, index=0) is not None
+    assert cache.get('map', sample, index=2) is not None
+    assert cache.getStatistics()['nbytes'] <= cache.maxBytes
+
+
+def testSimulationCache(ud, cache, sample):
+    H = ud.heat(sample, excitation={'fluence': [5*u.mJ/u.cm**2], 'delayPump': [0],
+                                    'pulseWidth': [0]}, resultCache=cache)
+    time = np.linspace(0, 5, 6)*u.ps
+    tempMap = H.getTempMap(time)
+    assert (cache.hits, cache.misses) == (0, 1)
+    np.testing.assert_array_equal(H.getTempMap(time), tempMap)
+    assert (cache.hits, cache.misses) == (1, 1)
+    H.excitation['fluence'] = [6*u.mJ/u.cm**2]
+    H.getTempMap(time)
+    assert cache.lastReport == ['parameter excitation changed']
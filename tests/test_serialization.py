@@ -0,0 +1,104 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import os
+import sys
+import subprocess
+import numpy as np
+import numericalunits as u
+import pytest
+
+modulePath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+loadScript = """
+import sys
+import {0:s} as ud
+S = ud.loadSample({1:s})
+S.getUnitCellPropertyVector(types='springConst')
+print(S.getFingerprint(), 'sympy' in sys.modules)
+"""
+
+
+@pytest.fixture
+def fullSample(ud, sample):
+    """fullSample
+
+    Returns the sample with a mixed atom, higher order spring constants,
+    evaluated anti-derivatives and a substrate.
+    """
+    SRO, STO = sample.getUniqueUnitCells()[1]
+    TiRu = ud.atomMixed('TiRu')
+    TiRu.addAtoms([ud.atom('Ti'), ud.atom('Ru')], [0.3, 0.7])
+    SRO.addAtom(TiRu, 'lambda strain: 0.75*(1 + 0.5*strain)')
+    SRO.setHOspringConstants([1e3, -2e2])
+    SRO.optRefIndexPerStrain = [0.1, -0.02]
+    STO.intHeatCapacity
+    substrate = ud.structure('substrate')
+    substrate.addSubStructure(STO, 100)
+    sample.addSubstrate(substrate)
+    return sample
+
+
+@pytest.mark.parametrize('filename', ['sample.json', 'sample.json.gz'])
+def testRoundTrip(ud, tmp_path, fullSample, filename):
+    filename = str(tmp_path / filename)
+    ud.saveSample(fullSample, filename)
+    S = ud.loadSample(filename)
+    assert S.getFingerprint() == fullSample.getFingerprint()
+    SRO, STO = S.getUniqueUnitCells()[1]
+    # shared objects are restored once
+    assert S.substructures[1][0].substructures[0][0] is SRO
+    assert S.substrate.substructures[0][0] is STO
+    assert STO.intHeatCapacityStr == fullSample.getUniqueUnitCells()[1][1].intHeatCapacityStr
+    T = np.linspace(100, 1000, 10)
+    np.testing.assert_array_equal(STO.intHeatCapacity[0](T),
+                                  fullSample.getUniqueUnitCells()[1][1].intHeatCapacity[0](T))
+    for types in ['springConst', 'mass', 'density']:
+        np.testing.assert_array_equal(S.getUnitCellPropertyVector(types=types),
+                                      fullSample.getUnitCellPropertyVector(types=types))
+    E, qz = 8000*u.eV, np.linspace(1, 4, 31)/u.angstrom
+    np.testing.assert_allclose(ud.xrayDyn(S, E, qz).getReflectivity(),
+                               ud.xrayDyn(fullSample, E, qz).getReflectivity(), rtol=1e-12)
+
+
+def testObjects(ud, fullSample):
+    SRO = fullSample.getUniqueUnitCells()[1][0]
+    UC = ud.sampleFromDict(ud.getSampleDict(SRO))
+    assert [a[2] for a in UC.atoms] == [a[2] for a in SRO.atoms]
+    TiRu = ud.sampleFromDict(ud.getSampleDict(SRO.atoms[-1][0]))
+    np.testing.assert_array_equal(TiRu.getCMAtomicFormFactor(8000*u.eV, np.array([1, 2])/u.angstrom),
+                                  SRO.atoms[-1][0].getCMAtomicFormFactor(8000*u.eV,
+                                                                         np.array([1, 2])/u.angstrom))
+    data = ud.getSampleDict(fullSample)
+    data['version'] += 1
+    with pytest.raises(ValueError):
+        ud.sampleFromDict(data)
+    with pytest.raises(ValueError):
+        ud.sampleFromDict({'format': 'other'})
+    with pytest.raises(ValueError):
+        ud.getSampleDict(fullSample.substructures)
+
+
+def testFreshProcess(ud, tmp_path, fullSample):
+    filename = str(tmp_path / 'sample.json.gz')
+    ud.saveSample(fullSample, filename)
+    res = subprocess.run([sys.executable, '-c', loadScript.format(os.path.basename(modulePath),
+                                                                  repr(filename))],
+                         cwd=os.path.dirname(modulePath), capture_output=True, text=True,
+                         env=os.environ.copy())
+    assert res.returncode == 0, res.stderr
+    assert res.stdout.split() == [fullSample.getFingerprint(), 'False']
@@ -0,0 +1,69 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import numericalunits as u
+import pytest
+
+
+@pytest.fixture
+def strainMap():
+    rng = np.random.default_rng(2)
+    strainMap = np.round(rng.normal(0, 1e-3, [20, 35]), 5)
+    strainMap[:5] = 0
+    strainMap[5, :3] = -0.
+    return strainMap
+
+
+@pytest.mark.parametrize('binWidth', [0, 1e-5, 1e-4])
+def testBinning(ud, sample, strainMap, binWidth):
+    binning = ud.strainBinning(sample, binWidth)
+    UCIndices, bins, strains, inverse = binning.bin(strainMap)
+    indices = sample.compile().indices
+    assert inverse.shape == strainMap.shape
+    np.testing.assert_array_equal(UCIndices[inverse], np.broadcast_to(indices, strainMap.shape))
+    # the pairs are distinct
+    assert len(set(zip(UCIndices.tolist(), bins.tolist()))) == len(UCIndices)
+    error = strainMap - strains[inverse]
+    if binWidth == 0:
+        np.testing.assert_array_equal(error, 0)
+    else:
+        assert np.all(np.abs(error) <= binWidth/2*(1 + 1e-9))
+        np.testing.assert_array_equal(strains, bins*binWidth)
+    stats = binning.statistics
+    assert stats['numPairs'] == len(UCIndices)
+    assert stats['maxError'] == np.abs(error).max()
+    assert stats['numPairsPerStep'] == sum(len(np.unique(row)) for row in inverse)
+    assert stats['cellReuseFactor'] == strainMap.size/len(UCIndices)
+    with pytest.raises(ValueError):
+        binning.bin(strainMap[:, :-1])
+
+
+def testBinnedReflectivity(ud, sample, strainMap):
+    E, qz = 8000*u.eV, np.linspace(1.5, 3.4, 191)/u.angstrom
+    binWidth = 1e-4
+    binned = np.round(strainMap/binWidth)*binWidth
+    for engine in [ud.xrayKin, ud.xrayDyn]:
+        exact = engine(sample, E, qz).getReflectivity(strainMap)
+        # no binning gives the reflectivity of each time step
+        for t in [0, 5, 19]:
+            np.testing.assert_allclose(exact[t], engine(sample, E, qz).getReflectivity(strainMap[t]),
+                                       rtol=1e-12)
+        # the binned reflectivity is the one of the binned strains
+        R = engine(sample, E, qz, strainBinWidth=binWidth).getReflectivity(strainMap)
+        np.testing.assert_allclose(R, engine(sample, E, qz).getReflectivity(binned), rtol=1e-10)
+        assert not np.allclose(R, exact, rtol=1e-10)
@@ -0,0 +1,180 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import numericalunits as u
+import pytest
+
+
+def testCompile(sample, expand):
+    compiled = sample.compile()
+    cells = expand(sample)
+    assert compiled.numUnitCells == len(cells) == 35
+    assert [compiled.UCHandles[i] for i in compiled.indices] == cells
+    for i, pos in enumerate(compiled.positions):
+        np.testing.assert_array_equal(pos, np.flatnonzero(compiled.indices == i))
+    assert sample.compile() is compiled
+    assert not compiled.indices.flags.writeable
+
+
+def testRecompile(sample, expand):
+    SRO, STO = sample.getUniqueUnitCells()[1]
+    compiled = sample.compile()
+    sample.substructures[1][0].addSubStructure(SRO, 1)
+    assert sample.getNumberOfUnitCells() == 39
+    # substructure entries which are replaced or changed in place
+    sample.substructures[0] = [SRO, 7]
+    assert sample.getNumberOfUnitCells() == 41
+    sample.substructures[2][1] = 1
+    assert sample.compile() is not compiled
+    assert [sample.compile().UCHandles[i] for i in sample.compile().indices] == expand(sample)
+
+
+def testPropertyVectors(sample, expand):
+    cells = expand(sample)
+    for prop in ['cAxis', 'mass', 'optPenDepth', 'soundVel']:
+        np.testing.assert_array_equal(sample.getUnitCellPropertyVector(types=prop),
+                                      [getattr(UC, prop) for UC in cells])
+    props = sample.getUnitCellPropertyVectors(types=['cAxis', 'mass'])
+    np.testing.assert_array_equal(props['mass'], [UC.mass for UC in cells])
+    funcs = sample.getUnitCellPropertyVector(types='heatCapacity')
+    assert [funcs[i] for i in range(len(cells))] == [UC.heatCapacity for UC in cells]
+    # changed unit cells are respected without recompiling
+    SRO = cells[0]
+    SRO.optPenDepth = 20*u.nm
+    assert sample.getUnitCellPropertyVector(types='optPenDepth')[0] == 20*u.nm
+
+
+def testPaddedSpringConstants(sample, expand):
+    SRO, STO = sample.getUniqueUnitCells()[1]
+    SRO.setHOspringConstants([1, 2])
+    k = sample.getUnitCellPropertyVector(types='springConst')
+    assert k.shape == (35, 3)
+    for row, UC in zip(k, expand(sample)):
+        np.testing.assert_array_equal(row[:len(UC.springConst)], UC.springConst)
+        assert np.all(row[len(UC.springConst):] == 0)
+
+
+def testDepth(sample, expand):
+    cAxes = np.array([UC.cAxis for UC in expand(sample)])
+    dEnd = np.cumsum(cAxes)
+    dStart, dEnd2, dMid = sample.getDistancesOfUnitCells()
+    np.testing.assert_allclose(dEnd2, dEnd, rtol=1e-14)
+    np.testing.assert_allclose(dStart[1:], dEnd[:-1], rtol=1e-14)
+    assert dStart[0] == 0
+    assert np.isclose(sample.getLength(), dEnd[-1], rtol=1e-14)
+    # the cumulative depth is recalculated after a change of the c-axis
+    SRO, STO = sample.getUniqueUnitCells()[1]
+    SRO.cAxis = 4*u.angstrom
+    cAxes = np.array([UC.cAxis for UC in expand(sample)])
+    np.testing.assert_allclose(sample.getDistancesOfUnitCells()[1], np.cumsum(cAxes), rtol=1e-14)
+
+
+def testIndicesAtDepth(sample):
+    dStart, dEnd, dMid = sample.getDistancesOfUnitCells()
+    z = np.linspace(-10, 160, 1001)*u.angstrom
+    expected = np.array([np.flatnonzero((dStart <= zi) & (zi < dEnd))[0]
+                         if 0 <= zi < dEnd[-1] else -1 for zi in z])
+    np.testing.assert_array_equal(sample.getUnitCellIndicesAtDepth(z), expected)
+    np.testing.assert_array_equal(sample.getUnitCellIndicesAtDepth(dMid), np.arange(len(dMid)))
+    values = np.vstack([np.arange(35.), -np.arange(35.)])
+    res = sample.mapToDepth(values, z)
+    assert res.shape == (2, len(z))
+    assert np.all(np.isnan(res[:, expected < 0]))
+    np.testing.assert_array_equal(res[:, expected >= 0], values[:, expected[expected >= 0]])
+
+
+def testUnitCellFunctions(sample, expand):
+    cells = expand(sample)
+    T = np.linspace(50, 800, 35)
+    for types in ['heatCapacity', 'thermCond', 'linThermExp']:
+        expected = np.array([getattr(UC, types)[0](Ti) for UC, Ti in zip(cells, T)])
+        np.testing.assert_allclose(sample.evalUnitCellFunctions(types, T), expected, rtol=1e-14)
+        np.testing.assert_allclose(sample.evalUnitCellFunctions(types, T[:, np.newaxis]),
+                                   expected[:, np.newaxis], rtol=1e-14)
+    with pytest.raises(ValueError):
+        sample.evalUnitCellFunctions('heatCapacity', T[:-1])
+
+
+def testSubSystemFunctions(ud):
+    Sr, Ru, O = ud.atom('Sr'), ud.atom('Ru'), ud.atom('O')
+    kwargs = dict(soundVel=6.3*u.nm/u.ps, thermCond=[5.72*u.W/(u.m*u.K), 1*u.W/(u.m*u.K)],
+                  linThermExp=[1e-5, 'lambda T: 1e-6 + 1e-9*T'])
+    hot = ud.unitCell('hot', 'SrRuO3', 3.95*u.angstrom,
+                      heatCapacity=['lambda T: 0.1*T', 'lambda T: 400 + 0.1*T'],
+                      subSystemCoupling=['lambda T: 5e17*(T[1] - T[0])',
+                                         'lambda T: 5e17*(T[0] - T[1])'], **kwargs)
+    cold = ud.unitCell('cold', 'SrRuO3', 3.95*u.angstrom,
+                       heatCapacity=['lambda T: 0.2*T', 'lambda T: 300'],
+                       subSystemCoupling=['lambda T: 1e17*(T[1] - T[0])',
+                                          'lambda T: 1e17*(T[0] - T[1])'], **kwargs)
+    for UC in [hot, cold]:
+        UC.addAtoms([Sr, Ru, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+    S = ud.structure('twoTemperatures')
+    S.addSubStructure(hot, 3)
+    S.addSubStructure(cold, 2)
+    S.addSubStructure(hot, 1)
+    cells = [hot]*3 + [cold]*2 + [hot]
+    T = np.stack([np.linspace(300, 2000, 6), np.linspace(300, 400, 6)], axis=1)
+    for types in ['heatCapacity', 'thermCond', 'linThermExp', 'subSystemCoupling']:
+        if types == 'subSystemCoupling':
+            expected = np.array([[func(Ti[:, np.newaxis])[0] for func in getattr(UC, types)]
+                                 for UC, Ti in zip(cells, T)])
+        else:
+            expected = np.array([[func(Ti[k]) for k, func in enumerate(getattr(UC, types))]
+                                 for UC, Ti in zip(cells, T)])
+        np.testing.assert_allclose(S.evalUnitCellFunctions(types, T), expected, rtol=1e-14)
+        np.testing.assert_allclose(S.evalUnitCellFunctions(types, T, subSystem=1), expected[:, 1],
+                                   rtol=1e-14)
+    props = S.evalHeatProperties(T)
+    np.testing.assert_array_equal(props['heatCapacity'], S.evalUnitCellFunctions('heatCapacity', T))
+    with pytest.raises(ValueError):
+        S.evalUnitCellFunctions('heatCapacity', T[:, :1])
+
+
+def testGradedSubStructure(ud):
+    Sr, Ti, Ru, O = ud.atom('Sr'), ud.atom('Ti'), ud.atom('Ru'), ud.atom('O')
+    STO = ud.unitCell('STO', 'SrTiO3', 3.905*u.angstrom, soundVel=7.8*u.nm/u.ps,
+                      heatCapacity='lambda T: 455.2 + 0.112*T', optRefIndex=[2.4, 0.01])
+    STO.addAtoms([Sr, Ti, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+    x = np.linspace(0, 1, 6)
+    composition = ud.atomComposition('TiRu', [Ti, Ru], np.stack([1 - x, x], axis=1))
+    cAxes = 3.905*u.angstrom + x*0.045*u.angstrom
+    S = ud.structure('graded')
+    S.addGradedSubStructure(STO, composition, Ti, 2, cAxis=cAxes)
+    assert S.getNumberOfUnitCells() == 12
+    grades = S.getUniqueUnitCells()[1]
+    assert [UC.ID for UC in grades] == ['STO_TiRu_{:d}'.format(i) for i in range(6)]
+    manualStructure = ud.structure('manual')
+    for UC, mixed, c in zip(grades, composition.getMixedAtoms(), cAxes):
+        # the same unit cell built by hand
+        manual = ud.unitCell('manual_' + mixed.ID, 'SrTiO3', c, aAxis=STO.aAxis, soundVel=STO.soundVel,
+                             heatCapacity=STO.heatCapacityStr)
+        manual.addAtoms([Sr, mixed, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+        manualStructure.addSubStructure(manual, 2)
+        assert UC.atoms[1][0] is mixed
+        for attr in ['volume', 'rawMass', 'mass', 'density', 'springConst']:
+            np.testing.assert_allclose(getattr(UC, attr), getattr(manual, attr), rtol=1e-14)
+    E, qz = 8000*u.eV, np.linspace(1, 4, 31)/u.angstrom
+    np.testing.assert_allclose(ud.xrayDyn(S, E, qz).getReflectivity(),
+                               ud.xrayDyn(manualStructure, E, qz).getReflectivity(), rtol=1e-12)
+    # the template is unchanged
+    assert STO.atoms[1][0] is Ti and STO.cAxis == 3.905*u.angstrom
+    with pytest.raises(ValueError):
+        S.addGradedSubStructure(STO, composition, Ru)
+    with pytest.raises(ValueError):
+        S.addGradedSubStructure(STO, composition, Ti, soundVel=[1, 2])
@@ -0,0 +1,91 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import numericalunits as u
+import pytest
+
+
+def newUnitCell(ud):
+    return ud.unitCell('STO', 'SrTiO3', 3.905*u.angstrom, aAxis=3.9*u.angstrom,
+                       soundVel=7.8*u.nm/u.ps)
+
+
+def testMassBookkeeping(ud):
+    Sr, Ti, O = ud.atom('Sr'), ud.atom('Ti'), ud.atom('O')
+    bulk = newUnitCell(ud)
+    bulk.addAtoms([Sr, Ti, O, O, O], [0, 0.5, 0, 0.5, 0.5])
+    single = newUnitCell(ud)
+    single.addAtom(Sr, 0)
+    single.addAtom(Ti, 0.5)
+    single.addAtom(O, 0)
+    single.addMultipleAtoms(O, 0.5, 2)
+    rawMass = Sr.mass + Ti.mass + 3*O.mass
+    for UC in [bulk, single]:
+        assert UC.numAtoms == 5
+        assert UC.rawMass == pytest.approx(rawMass, rel=1e-14)
+        assert UC.density == pytest.approx(rawMass/UC.volume, rel=1e-14)
+        assert UC.mass == pytest.approx(rawMass*u.angstrom**2/UC.area, rel=1e-14)
+        assert UC.springConst.dtype == float
+        assert UC.springConst[0] == pytest.approx(UC.mass*(UC.soundVel/UC.cAxis)**2, rel=1e-14)
+    assert [a[2] for a in bulk.atoms] == [a[2] for a in single.atoms]
+
+
+def testManyAtoms(ud):
+    # the bookkeeping does not drift with the number of added atoms
+    O = ud.atom('O')
+    UC = newUnitCell(ud)
+    UC.addMultipleAtoms(O, 0.5, 1000)
+    assert UC.numAtoms == 1000
+    assert UC.rawMass == pytest.approx(1000*O.mass, rel=1e-12)
+    assert len(set(id(a[1]) for a in UC.atoms)) == 1
+    with pytest.raises(ValueError):
+        UC.addAtoms([O, O], [0])
+    # unhashable positions are rejected as invalid input
+    for position in [[0.5], np.array([0.5]), {'z': 0.5}]:
+        with pytest.raises(ValueError):
+            UC.addAtoms([O], [position])
+    assert UC.numAtoms == 1000
+
+
+def testAtomPositions(ud):
+    Sr, Ti, O = ud.atom('Sr'), ud.atom('Ti'), ud.atom('O')
+    UC = newUnitCell(ud)
+    UC.addAtoms([Sr, Ti, O, O], [0, 0.5, 'lambda strain: 0.1*(0.5*strain + 1)',
+                                 'lambda strain: 0.6 + 0.01*np.sin(strain)'])
+    # a position function which cannot be evaluated vectorized
+    UC.addAtom(O, 'lambda strain: 0.9 if strain > 0 else 0.8')
+    strains = np.linspace(-0.02, 0.02, 11)
+    expected = np.array([[atom[1](strain) for atom in UC.atoms] for strain in strains])
+    np.testing.assert_allclose(UC.getAtomPositions(strains), expected, rtol=1e-14)
+    np.testing.assert_allclose(UC.getAtomPositions(strains.reshape(1, 11)), expected[np.newaxis],
+                               rtol=1e-14)
+    np.testing.assert_allclose(UC.getAtomPositions(0.02), expected[-1], rtol=1e-14)
+    np.testing.assert_allclose(UC.getAtomPositions(), [0, 0.5, 0.1, 0.6, 0.8], rtol=1e-14)
+    assert UC.getAtomPositions(strains).shape == (11, 5)
+
+
+def testAtomPositionsCache(ud):
+    O = ud.atom('O')
+    UC = newUnitCell(ud)
+    UC.addAtom(O, 0.5)
+    compiled = UC.compileAtomPositions()
+    assert UC.compileAtomPositions() is compiled
+    # the cache is reset when atoms are added
+    UC.addAtom(O, 0.25)
+    assert UC.compileAtomPositions() is not compiled
+    np.testing.assert_allclose(UC.getAtomPositions(0.1), [0.55, 0.275], rtol=1e-14)
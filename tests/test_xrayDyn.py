@@ -0,0 +1,113 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import numericalunits as u
+import pytest
+
+E = 8000*u.eV
+qz = np.linspace(1.5, 3.4, 191)/u.angstrom
+
+
+def getSequentialReflectivity(S, strain, pol=1):
+    """getSequentialReflectivity
+
+    Returns the dynamical reflectivity by the sequential product of the
+    matrices of all atomic layers of the strained structure.
+    """
+    r0 = 2.8179403227e-15*u.m
+
+    def L(d):
+        res = np.zeros((len(qz), 2, 2), dtype=complex)
+        res[:, 0, 0] = np.exp(0.5j*qz*d)
+        res[:, 1, 1] = np.exp(-0.5j*qz*d)
+        return res
+
+    M = np.broadcast_to(np.eye(2, dtype=complex), (len(qz), 2, 2))
+    for i, eta in enumerate(strain):
+        UC = S.getUnitCellHandle(i)
+        c = UC.cAxis*(1 + eta)
+        last = 0
+        for atom, position, positionStr in sorted(UC.atoms, key=lambda a: a[1](0)):
+            g = 4*np.pi*r0/(qz*UC.area)
+            r = -1j*g*atom.getCMAtomicFormFactor(E, qz)*pol*np.exp(-UC.debWalFac*qz**2/2)
+            t = 1 - 1j*g*atom.getCMAtomicFormFactor(E, 0)
+            H = np.array([[t**2 - r**2, r], [-r, np.ones_like(r)]]).transpose(2, 0, 1)/t[:, None, None]
+            M = M @ L(c*(position(eta) - last)) @ H
+            last = position(eta)
+        M = M @ L(c*(1 - last))
+    return np.abs(M[:, 0, 1]/M[:, 1, 1])**2
+
+
+@pytest.fixture
+def strainMap(sample):
+    rng = np.random.default_rng(1)
+    strainMap = np.zeros([3, 35])
+    strainMap[1, :10] = 1e-3
+    strainMap[2] = np.repeat(rng.uniform(-5e-3, 5e-3, 7), 5)
+    return strainMap
+
+
+def testReflectivity(ud, sample, strainMap):
+    SRO, STO = sample.getUniqueUnitCells()[1]
+    SRO.debWalFac = 0.01*u.angstrom**2
+    X = ud.xrayDyn(sample, E, qz)
+    R = X.getReflectivity(strainMap)
+    assert R.shape == (3, len(qz))
+    for Rt, strain in zip(R, strainMap):
+        np.testing.assert_allclose(Rt, getSequentialReflectivity(sample, strain), rtol=1e-9)
+    # the unstrained structure is combined along the substructures tree
+    np.testing.assert_allclose(X.getReflectivity(), R[0], rtol=1e-9)
+    np.testing.assert_allclose(X.getReflectivity(strainMap[2]), R[2], rtol=1e-12)
+
+
+def testPolarization(ud, sample):
+    wavelength = 2*np.pi*u.hbar*u.c0/E
+    P = np.abs(1 - 2*(qz*wavelength/(4*np.pi))**2)
+    X = ud.xrayDyn(sample, E, qz, polarization='unpolarized')
+    expected = (getSequentialReflectivity(sample, np.zeros(35))
+                + getSequentialReflectivity(sample, np.zeros(35), P))/2
+    np.testing.assert_allclose(X.getReflectivity(), expected, rtol=1e-9)
+    X.polarization = 'circular'
+    with pytest.raises(ValueError):
+        X.getReflectivity()
+
+
+def testRepetitions(ud, sample):
+    # 10^6 repetitions are combined by exponentiation by squaring
+    S = ud.structure('thick')
+    S.addSubStructure(sample.substructures[1][0], 10**6)
+    R = ud.xrayDyn(S, E, qz).getReflectivity()
+    assert np.all(np.isfinite(R))
+    assert np.all(R <= 1 + 1e-9)
+
+
+def testCacheInvalidation(ud, sample, strainMap):
+    X = ud.xrayDyn(sample, E, qz)
+    R = X.getReflectivity(strainMap)
+    SRO, STO = sample.getUniqueUnitCells()[1]
+    for change in [lambda: setattr(SRO, 'cAxis', 4*u.angstrom),
+                   lambda: setattr(STO, 'debWalFac', 0.02*u.angstrom**2),
+                   lambda: STO.addAtom(ud.atom('O'), 0.75),
+                   lambda: sample.addSubStructure(SRO, 2)]:
+        change()
+        strainMap = np.hstack([strainMap, np.zeros([3, sample.getNumberOfUnitCells() - strainMap.shape[1]])])
+        new = X.getReflectivity(strainMap)
+        assert not np.allclose(new, R, rtol=1e-6)
+        for Rt, strain in zip(new, strainMap):
+            np.testing.assert_allclose(Rt, getSequentialReflectivity(sample, strain), rtol=1e-9)
+        R = new
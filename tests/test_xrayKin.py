@@ -0,0 +1,83 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import numericalunits as u
+import pytest
+
+E = 8000*u.eV
+qz = np.linspace(1.5, 3.4, 191)/u.angstrom
+
+
+def getBruteForceReflectivity(S, strain):
+    """getBruteForceReflectivity
+
+    Returns the kinematical reflectivity by the sum over all atoms of all
+    unit cells of the strained structure.
+    """
+    r0 = 2.8179403227e-15*u.m
+    A = np.zeros(len(qz), dtype=complex)
+    depth = 0
+    for i, eta in enumerate(strain):
+        UC = S.getUnitCellHandle(i)
+        c = UC.cAxis*(1 + eta)
+        for atom, position, positionStr in UC.atoms:
+            A += atom.getCMAtomicFormFactor(E, qz)*np.exp(1j*qz*(depth + c*position(eta))) \
+                * np.exp(-UC.debWalFac*qz**2/2)/UC.area
+        depth += c
+    return np.abs(4*np.pi*r0/qz*A)**2
+
+
+@pytest.fixture
+def strainMap(sample):
+    # piecewise constant strains, so that neighbouring unit cells form runs
+    rng = np.random.default_rng(1)
+    strainMap = np.zeros([3, 35])
+    strainMap[1, :10] = 1e-3
+    strainMap[2] = np.repeat(rng.uniform(-5e-3, 5e-3, 7), 5)
+    return strainMap
+
+
+def testReflectivity(ud, sample, strainMap):
+    SRO, STO = sample.getUniqueUnitCells()[1]
+    SRO.debWalFac = 0.01*u.angstrom**2
+    # a non-linear position function
+    STO.addAtom(ud.atom('O'), 'lambda strain: 0.25*(1 + 0.5*strain + 10*strain**2)')
+    X = ud.xrayKin(sample, E, qz)
+    R = X.getReflectivity(strainMap)
+    assert R.shape == (3, len(qz))
+    for Rt, strain in zip(R, strainMap):
+        np.testing.assert_allclose(Rt, getBruteForceReflectivity(sample, strain), rtol=1e-9)
+    np.testing.assert_allclose(X.getReflectivity(), R[0], rtol=1e-12)
+    np.testing.assert_allclose(X.getReflectivity(strainMap[2]), R[2], rtol=1e-12)
+
+
+def testCacheInvalidation(ud, sample, strainMap):
+    X = ud.xrayKin(sample, E, qz)
+    R = X.getReflectivity(strainMap)
+    SRO, STO = sample.getUniqueUnitCells()[1]
+    for change in [lambda: setattr(SRO, 'cAxis', 4*u.angstrom),
+                   lambda: setattr(STO, 'debWalFac', 0.02*u.angstrom**2),
+                   lambda: STO.addAtom(ud.atom('O'), 0.75),
+                   lambda: sample.addSubStructure(SRO, 2)]:
+        change()
+        strainMap = np.hstack([strainMap, np.zeros([3, sample.getNumberOfUnitCells() - strainMap.shape[1]])])
+        new = X.getReflectivity(strainMap)
+        assert not np.allclose(new, R, rtol=1e-6)
+        for Rt, strain in zip(new, strainMap):
+            np.testing.assert_allclose(Rt, getBruteForceReflectivity(sample, strain), rtol=1e-9)
+        R = new
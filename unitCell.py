@@ -16,9 +16,10 @@
 # Copyright (C) 2017 Daniel Schick
 
 import numpy as np
-from inspect import isfunction
-from sympy import integrate, Symbol
-from sympy.utilities.lambdify import lambdify
+import re
+from types import FunctionType
+from .antiderivatives import getAntiderivativeCache
+from .materialFunction import materialFunction
 import numericalunits as u
 u.reset_units('SI')
 
@@ -40,6 +41,7 @@ class unitCell(object):
     area  (float)                   : area of epitaxial unit cells
                                       need for normation for correct intensities) [m^2]
     volume (float)                  : volume of unit cell [m^3]
+    rawMass (float)                 : sum of the masses of all atoms in the unit cell [kg]
     mass (float)                    : mass of unit cell normalized to an area of 1 Ang^2 [kg]
     density (float)                 : density of the unitCell [kg/m^3]
     debWalFac (float)               : Debye Waller factor <u>^2 [m^2]
@@ -96,9 +98,11 @@ class unitCell(object):
         self.bAxis = kwargs.get('bAxis', self.aAxis)
         self.atoms          = []
         self.numAtoms       = 0
+        self._compiledAtomPositions = None
+        self.rawMass        = 0
         self.mass           = 0
         self.density        = 0
-        self.springConst    = np.array([0])
+        self.springConst    = np.array([0.])
         self.debWalFac               = kwargs.get('debWalFac', 0)
         self.soundVel                = kwargs.get('soundVel', 0)
         self.phononDamping           = kwargs.get('phononDamping', 0)
@@ -137,6 +141,7 @@ class unitCell(object):
         classStr += 'c-axis                 : {:3.2f} Å\n'.format(self.cAxis/u.angstrom)
         classStr += 'area                   : {:3.2f} Å²\n'.format(self.area/u.angstrom**2)
         classStr += 'volume                 : {:3.2f} Å³\n'.format(self.volume/u.angstrom**3)
+        classStr += 'raw mass               : {:3.2e} kg\n'.format(self.rawMass/u.kg)
         classStr += 'mass                   : {:3.2e} kg\n'.format(self.mass/u.kg)
         classStr += 'density                : {:3.2e} kg/m³\n'.format(self.density/(u.kg/u.m**3))
         classStr += 'Debye Waller Factor    : {:3.2f} m²\n'.format(self.debWalFac/u.m**2)
@@ -176,7 +181,9 @@ class unitCell(object):
         colors          = [cmx.Dark2(x) for x in np.linspace(0, 1, self.numAtoms)]
         atomIDs         = self.getAtomIDs()
 
-        for strain in strains:
+        positions       = self.getAtomPositions(strains)
+
+        for i, strain in enumerate(strains):
             plt.figure()
             atomsPlotted    = np.zeros_like(atomIDs)
             for j in range(self.numAtoms):
@@ -186,7 +193,7 @@ class unitCell(object):
                 else:
                     label = '_nolegend_'
 
-                l = plt.plot(1+j,self.atoms[j][1](strain), 'o', MarkerSize=10,
+                l = plt.plot(1+j,positions[i,j], 'o', MarkerSize=10,
                     markeredgecolor=[0, 0, 0], markerfaceColor=colors[atomIDs.index(self.atoms[j][0].ID)],
                     label=label)
 
@@ -230,7 +237,8 @@ class unitCell(object):
 
         Checks the input for inputs which are cell arrays of function
         handles, such as the heat capacity which is a cell array of N
-        function handles.
+        function handles. The function handles are vectorized and
+        picklable materialFunction instances.
         """
         output      = []
         outputStrs  = []
@@ -239,21 +247,24 @@ class unitCell(object):
             inputs = [inputs]
         # traverse each list element and convert it to a function handle
         for input in inputs:
-            if isfunction(input):
+            if isinstance(input, FunctionType):
                 raise ValueError('Please use string representation of function!')
                 output.append(input)
                 outputStrs.append('no str representation available')
+            elif isinstance(input, materialFunction):
+                output.append(input)
+                outputStrs.append(input.funcStr)
             elif isinstance(input, str):
                 try:
-                    output.append(eval(input))
+                    output.append(materialFunction(input))
                     outputStrs.append(input)
                 except Exception as e:
                     print('String input for unit cell property ' + input + ' \
                         cannot be converted to function handle!')
                     print(e)
             elif isinstance(input, (int, float)):
-                output.append(eval('lambda T: {:f}'.format(input)))
-                outputStrs.append('lambda T: {:f}'.format(input))
+                output.append(materialFunction('lambda T: {:e}'.format(input)))
+                outputStrs.append('lambda T: {:e}'.format(input))
             else:
                 raise ValueError('Unit cell property input has to be a single or'
                 'cell array of numerics, function handles or strings which can be'
@@ -267,7 +278,8 @@ class unitCell(object):
 
         Returns the anti-derrivative of the temperature-dependent heat
         $c(T)$ capacity function. If the _intHeatCapacity_ property is
-        not set, the symbolic integration is performed.
+        not set, the symbolic integration is performed or taken from the
+        persistent antiderivative cache.
         """
 
         if hasattr(self, '_intHeatCapacity') and isinstance(self._intHeatCapacity, list):
@@ -276,11 +288,10 @@ class unitCell(object):
             self._intHeatCapacity = []
             self.intHeatCapacityStr = []
             try:
-                T = Symbol('T')
                 for i, hcs in enumerate(self.heatCapacityStr):
-                    integral = integrate(hcs.split(':')[1], T)
-                    self._intHeatCapacity.append(lambdify(T, integral))
-                    self.intHeatCapacityStr.append('lambda T : ' + str(integral))
+                    integral, integralStr = getAntiderivativeCache().getAntiderivative(hcs)
+                    self._intHeatCapacity.append(integral)
+                    self.intHeatCapacityStr.append(integralStr)
 
             except Exception as e:
                 print('The sympy integration did not work. You can set the'
@@ -307,7 +318,8 @@ class unitCell(object):
 
         Returns the anti-derrivative of theintegrated temperature-dependent
         linear thermal expansion function. If the __intLinThermExp__
-        property is not set, the symbolic integration is performed.
+        property is not set, the symbolic integration is performed or taken
+        from the persistent antiderivative cache.
         """
 
         if hasattr(self, '_intLinThermExp') and isinstance(self._intLinThermExp, list):
@@ -316,11 +328,10 @@ class unitCell(object):
             self._intLinThermExp = []
             self.intLinThermExpStr = []
             try:
-                T = Symbol('T')
                 for i, ltes in enumerate(self.linThermExpStr):
-                    integral = integrate(ltes.split(':')[1], T)
-                    self._intLinThermExp.append(lambdify(T, integral))
-                    self.intLinThermExpStr.append('lambda T : ' + str(integral))
+                    integral, integralStr = getAntiderivativeCache().getAntiderivative(ltes)
+                    self._intLinThermExp.append(integral)
+                    self.intLinThermExpStr.append(integralStr)
 
             except Exception as e:
                 print('The sympy integration did not work. You can set the'
@@ -346,54 +357,88 @@ class unitCell(object):
         Adds an atomBase/atomMixed at a relative position of the unit
         cell.
         """
+        self.addAtoms([atom], [position])
+
+    def addAtoms(self, atoms, positions):
+        """ addAtoms
+        Adds a list of atomBase/atomMixed at the corresponding list of
+        relative positions of the unit cell in one call. The mass, density
+        and spring constant are updated only once afterwards.
+        """
+        if len(atoms) != len(positions):
+            raise ValueError('The number of atoms and positions must be the same!')
+
+        newAtoms = []
+        parsed   = {} # identical positions are parsed only once
+        for atom, position in zip(atoms, positions):
+            if not isinstance(position, (str, int, float)):
+                # raises the ValueError of invalid, possibly unhashable inputs
+                newAtoms.append([atom] + list(self.checkPositionInput(position)))
+                continue
+            key = (type(position), position)
+            if key not in parsed:
+                parsed[key] = self.checkPositionInput(position)
+            newAtoms.append([atom, parsed[key][0], parsed[key][1]])
+
+        # add the atoms at the end of the array
+        self.atoms.extend(newAtoms)
+        self._compiledAtomPositions = None
+        # increase the number of atoms
+        self.numAtoms = self.numAtoms + len(newAtoms)
+        # Update the mass, density and spring constant of the unit cell
+        # automatically:
+        #
+        # $$ \kappa = m \cdot (v_s / c)^2 $$
+        self.rawMass = self.rawMass + sum(atom[0].mass for atom in newAtoms)
+        self.updateMass()
+
+    def addMultipleAtoms(self, atom, position, Nb):
+        """addMultipleAtoms
 
+        Adds multiple atomBase/atomMixed at a relative position of the unit
+        cell.
+        """
+        self.addAtoms([atom]*Nb, [position]*Nb)
+
+    def checkPositionInput(self, position):
+        """ checkPositionInput
+
+        Checks the input for an atom position and converts it into a
+        materialFunction of the strain and its string representation.
+        """
         positionStr = ''
         # test the input type of the position
-        if isfunction(position):
+        if isinstance(position, FunctionType):
             raise ValueError('Please use string representation of function!')
-            pass
         elif isinstance(position, str):
             try:
                 positionStr = position
-                position = eval(position)
+                position = materialFunction(position)
             except Exception as e:
                 print('String input for unit cell property ' + position + ' \
                     cannot be converted to function handle!')
                 print(e)
         elif isinstance(position, (int, float)):
             positionStr = 'lambda strain: {:e}*(strain+1)'.format(position)
-            position = eval(positionStr);
+            position = materialFunction(positionStr)
         else:
             raise ValueError('Atom position input has to be a scalar, or string'
                     'which can be converted into a lambda function!')
 
-        # add the atom at the end of the array
-        self.atoms.append([atom, position, positionStr])
-        # increase the number of atoms
-        self.numAtoms = self.numAtoms + 1
-        # Update the mass, density and spring constant of the unit cell
-        # automatically:
-        #
-        # $$ \kappa = m \cdot (v_s / c)^2 $$
+        return(position, positionStr)
 
-        self.mass = 0;
-        for i  in range(self.numAtoms):
-            self.mass = self.mass + self.atoms[i][0].mass
+    def updateMass(self):
+        """ updateMass
 
-        self.density     = self.mass / self.volume
+        Calculates the density and the mass normalized to an area of
+        1 Ang^2 from the raw mass of all atoms and updates the spring
+        constant. The raw mass itself is never modified.
+        """
+        self.density     = self.rawMass / self.volume
         # set mass per unit area (do not know if necessary)
-        self.mass        = self.mass * 1*u.angstrom**2 / self.area
+        self.mass        = self.rawMass * 1*u.angstrom**2 / self.area
         self.calcSpringConst()
 
-    def addMultipleAtoms(self, atom, position, Nb):
-        """addMultipleAtoms
-
-        Adds multiple atomBase/atomMixed at a relative position of the unit
-        cell.
-        """
-        for i in range(Nb):
-           self.addAtom(atom,position)
-
     def calcSpringConst(self):
         """ calcSpringConst
 
@@ -429,14 +474,11 @@ class unitCell(object):
         Set the higher orders of the spring constant for anharmonic
         phonon simulations.
         """
-        # check if HO is column vector and transpose it in this case
-        if HO.shape[0] > 1:
-            HO = HO.T
+        # row and column vectors are both accepted
+        HO = np.ravel(np.asarray(HO, dtype=float))
 
         # reset old higher order spring constants
-        self.springConst = np.delete(self.springConst,
-                            np.r_[1:len(self.springConst)])
-        self.springConst = np.hstack((self.springConst, HO))
+        self.springConst = np.hstack((self.springConst[:1], HO))
 
     def getAtomIDs(self):
         """getAtomIDs
@@ -455,16 +497,75 @@ class unitCell(object):
         """getAtomPositions
 
         Returns a vector of all relative postion of the atoms in the unit
-        cell.
+        cell for the given strain. If the strain is an array, an array of
+        shape (strains x atoms) is returned which is evaluated vectorized,
+        see compileAtomPositions.
         """
 
         if args:
-            strain = args
+            strain = args[0]
         else:
             strain = 0
 
-        res = np.zeros([self.numAtoms])
-        for i, atom in enumerate(self.atoms):
-            res[i] = atom[1](strain)
+        strains = np.asarray(strain, dtype=float)
+        res = self.compileAtomPositions()(strains.ravel())
+        return res.reshape(strains.shape + (self.numAtoms,))
+
+    def compileAtomPositions(self):
+        """compileAtomPositions
+
+        Returns a function which evaluates the relative positions of all
+        atoms for a vector of strains at once as (strains x atoms) array.
+        Positions given by a number are linear in the strain and are
+        evaluated as matrix product with their coefficients. All other
+        position functions are called once with the whole strain vector.
+        The result is cached until atoms are added.
+        """
+        if self._compiledAtomPositions is None:
+            self._compiledAtomPositions = compiledAtomPositions(self.atoms)
+        return self._compiledAtomPositions
+
+
 
+class compiledAtomPositions(object):
+    """compiledAtomPositions
+
+    Vectorized evaluation of the relative atom positions of a unit cell
+    for arrays of strains.
+
+    linear (ndarray[bool])      : atoms with positions linear in strain
+    coeff (ndarray[float])      : (2 x atoms) matrix of the slope and
+                                  offset of the linear positions
+    funcs (list[@lambda])       : position functions of the other atoms
+    """
+
+    _linearPattern = re.compile(r'^lambda strain: *([-+0-9.eE]+) *\* *\(strain *\+ *1\)$')
+
+    def __init__(self, atoms):
+        self.numAtoms   = len(atoms)
+        self.linear     = np.zeros(self.numAtoms, dtype=bool)
+        self.coeff      = np.zeros([2, self.numAtoms])
+        self.funcs      = []
+        for i, atom in enumerate(atoms):
+            match = self._linearPattern.match(atom[2])
+            if match:
+                # x(strain) = x0*(strain+1)
+                self.linear[i] = True
+                self.coeff[:, i] = float(match.group(1))
+            else:
+                self.funcs.append((i, atom[1]))
+
+    def __call__(self, strains):
+        """Returns the (strains x atoms) array of relative positions for
+        the vector of strains.
+        """
+        strains = np.asarray(strains, dtype=float)
+        res = np.dot(np.stack([strains, np.ones_like(strains)], axis=-1), self.coeff)
+        for i, func in self.funcs:
+            try:
+                pos = np.asarray(func(strains), dtype=float)
+                res[:, i] = np.broadcast_to(pos, strains.shape)
+            except Exception:
+                # the function cannot be evaluated vectorized
+                res[:, i] = [func(strain) for strain in strains]
         return res
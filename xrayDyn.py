@@ -0,0 +1,374 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import numericalunits as u
+from .atoms import getCMAtomicFormFactors
+from .xrayKin import r0, getUnitCellKey
+from .strainBinning import strainBinning
+from .chunkedMap import chunkedMap, getStructureMetadata
+u.reset_units('SI')
+
+
+class xrayDyn(object):
+    """xrayDyn
+
+    The xrayDyn class calculates the dynamical X-ray diffraction of a
+    structure by the matrix formalism for a fixed energy and a grid of
+    scattering vectors $q_z$. Every atomic layer is a thin scatterer with
+    the reflection and transmission
+
+    $$ r = -i \\frac{4 \\pi r_0 f(E, q_z)}{q_z A} P e^{-\\langle u^2 \\rangle q_z^2/2},
+       \\quad t = 1 - i \\frac{4 \\pi r_0 f(E, 0)}{q_z A} $$
+
+    with the area $A$ and the Debye-Waller factor debWalFac of its unit
+    cell and the polarization factor $P$, and the reflection-transmission
+    matrix
+
+    $$ H = \\frac{1}{t} \\begin{pmatrix} t^2 - r^2 & r \\\\ -r & 1 \\end{pmatrix}. $$
+
+    The atomic layers are connected by the phase matrices
+    $L(d) = \\mathrm{diag}(e^{i q_z d/2}, e^{-i q_z d/2})$. The product $M$
+    of all matrices from the surface to the bottom gives the reflectivity
+    $R = |M_{01}/M_{11}|^2$.
+
+    All matrices are stacked (qz x 2 x 2) arrays. The matrix of each unique
+    unit cell is calculated once per strain bin and cached. Repeated
+    substructures are combined by exponentiation by squaring over the
+    substructures tree, and runs of identical unit cells and strains by a
+    batched exponentiation by squaring, so that the cost grows with the
+    logarithm of the number of repetitions. All products are normalized,
+    which leaves the reflectivity unchanged and avoids overflows for thick
+    samples.
+
+    Attributes:
+        S (structure)           : sample to do simulations with
+        E (float)               : photon energy [J]
+        qz (ndarray[float])     : z-components of the scattering vectors [1/m]
+        polarization (str)      : 'sigma', 'pi' or 'unpolarized'
+        binning (strainBinning) : binning of the strains with the
+                                  statistics of the last strain map
+    """
+
+    def __init__(self, S, E, qz, **kwargs):
+        """Initialize the class.
+
+        Args:
+            S (structure)                   : sample
+            E (float)                       : photon energy [J]
+            qz (ndarray[float])             : scattering vectors [1/m]
+            polarization (Optional[str])    : default is sigma
+            strainBinWidth (Optional[float]): default is 0, i.e. the
+                                              strains are not binned
+
+        """
+        self.S              = S
+        self.E              = E
+        self.qz             = qz
+        self.polarization   = kwargs.get('polarization', 'sigma')
+        self.binning        = strainBinning(S, kwargs.get('strainBinWidth', 0))
+        self._cacheKey      = None
+        self._matrices      = {}
+
+    def __str__(self):
+        """String representation of this class
+
+        """
+        qz = np.atleast_1d(self.qz)
+        classStr  = 'Dynamical X-ray diffraction simulation with the following properties\n'
+        classStr += 'sample                 : {:s}\n'.format(self.S.name)
+        classStr += 'energy                 : {:3.2f} keV\n'.format(self.E/(1e3*u.eV))
+        classStr += 'qz range               : {:3.2f} - {:3.2f} 1/Å ({:d} points)\n'.format(
+            qz.min()*u.angstrom, qz.max()*u.angstrom, len(qz))
+        classStr += 'polarization           : {:s}\n'.format(self.polarization)
+        classStr += 'strain bin width       : {:3.2e}\n'.format(self.binning.binWidth)
+        classStr += 'cached matrices        : {:d}\n'.format(len(self._matrices))
+        return(classStr)
+
+    def _getPolarizationFactors(self, qz):
+        """_getPolarizationFactors
+
+        Returns the list of polarization factors of the reflection for
+        the polarization of the incident X-rays.
+        """
+        wavelength = 2*np.pi*u.hbar*u.c0/self.E
+        cos2theta  = 1 - 2*(qz*wavelength/(4*np.pi))**2
+        if self.polarization == 'sigma':
+            return [np.ones_like(qz)]
+        elif self.polarization == 'pi':
+            return [np.abs(cos2theta)]
+        elif self.polarization == 'unpolarized':
+            return [np.ones_like(qz), np.abs(cos2theta)]
+        raise ValueError('The polarization has to be sigma, pi or unpolarized!')
+
+    def _checkCache(self):
+        """_checkCache
+
+        Clears the cached unit cell matrices if the energy, the scattering
+        vectors, the polarization, the structure or its unit cells changed
+        and returns the scattering vectors.
+        """
+        qz  = np.atleast_1d(np.asarray(self.qz, dtype=float))
+        key = (self.E, qz.tobytes(), self.polarization, self.binning.binWidth,
+               self.S._getSignature(), getUnitCellKey(self.S.compile().UCHandles))
+        if key != self._cacheKey:
+            self._matrices = {}
+            self._cacheKey = key
+        return qz
+
+    def clearCache(self):
+        """clearCache
+
+        Removes all cached unit cell matrices.
+        """
+        self._matrices = {}
+
+    def getUnitCellMatrices(self, UCIndex, strains):
+        """getUnitCellMatrices
+
+        Returns the (strains x pol x qz x 2 x 2) matrices of the unique unit
+        cell for a vector of binned strains, where pol are the
+        polarizations. The atomic layers are sorted by their unstrained
+        positions and the matrices of all strains are calculated at once.
+        """
+        qz = self._checkCache()
+        return self._calcUnitCellMatrices(self.S.compile().UCHandles[UCIndex], strains, qz)
+
+    def _calcUnitCellMatrices(self, UC, strains, qz):
+        """_calcUnitCellMatrices
+
+        Returns the matrices of getUnitCellMatrices for the unit cell
+        without checking the cache.
+        """
+        strains = np.asarray(strains, dtype=float)
+        pols = self._getPolarizationFactors(qz)
+        M   = np.zeros((len(strains), len(pols), len(qz), 2, 2), dtype=complex)
+        M[..., 0, 0] = M[..., 1, 1] = 1
+        if UC.numAtoms > 0:
+            atoms = [a[0] for a in UC.atoms]
+            f  = getCMAtomicFormFactors(atoms, self.E, qz)[:, 0, :]
+            f0 = getCMAtomicFormFactors(atoms, self.E, 0)[:, 0, :]
+            g  = 4*np.pi*r0/(qz*UC.area)
+            t  = 1 - 1j*g*f0  # (atoms x qz)
+            r  = -1j*g*f*np.exp(-UC.debWalFac*qz**2/2)
+            r  = r[:, np.newaxis, :]*np.array(pols)  # (atoms x pol x qz)
+            t  = t[:, np.newaxis, :]
+            H  = np.empty(r.shape + (2, 2), dtype=complex)
+            H[..., 0, 0] = (t**2 - r**2)/t
+            H[..., 0, 1] = r/t
+            H[..., 1, 0] = -r/t
+            H[..., 1, 1] = 1/t
+            x = UC.getAtomPositions(strains)  # (strains x atoms)
+            order = np.argsort(UC.getAtomPositions(0), kind='stable')
+            c = UC.cAxis*(1 + strains)
+            last = np.zeros(len(strains))
+            for j in order:
+                M = _matmul(_propagate(M, (c*(x[:, j] - last))[:, np.newaxis, np.newaxis]*qz), H[j])
+                last = x[:, j]
+        else:
+            c = UC.cAxis*(1 + strains)
+            last = np.zeros(len(strains))
+        return _normalize(_propagate(M, (c*(1 - last))[:, np.newaxis, np.newaxis]*qz))
+
+    def _getCachedMatrices(self, UCIndices, bins, strains):
+        """_getCachedMatrices
+
+        Returns the stacked matrices of the pairs of unique unit cell
+        indices and strain bins. Missing matrices are calculated at once
+        per unique unit cell and are added to the cache.
+        """
+        keys = list(zip(UCIndices.tolist(), bins.tolist()))
+        missing = {}
+        for key, strain in zip(keys, strains):
+            if key not in self._matrices:
+                missing.setdefault(key[0], {})[key] = strain
+        qz = np.atleast_1d(np.asarray(self.qz, dtype=float))
+        UCHandles = self.S.compile().UCHandles
+        for i, entries in missing.items():
+            for key, M in zip(entries, self._calcUnitCellMatrices(UCHandles[i], list(entries.values()), qz)):
+                self._matrices[key] = M
+        return np.array([self._matrices[key] for key in keys])
+
+    def iterMatrices(self, strainMap):
+        """iterMatrices
+
+        Yields the (pol x qz x 2 x 2) matrices of the structure for all
+        time steps of a (time x N) strain map. The strains are binned and
+        the matrices of all distinct pairs of unique unit cell and strain
+        bin are taken from the cache or are calculated once for all time
+        steps, see strainBinning. Runs of the same pair are combined with a
+        batched exponentiation by squaring, and the runs are multiplied by
+        pairwise reduction.
+        """
+        self._checkCache()
+        UCIndices, bins, strains, inverse = self.binning.bin(strainMap)
+        M = self._getCachedMatrices(UCIndices, bins, strains)
+        for pairIndices in inverse:
+            starts = np.flatnonzero(np.concatenate([[True], pairIndices[1:] != pairIndices[:-1]]))
+            counts = np.diff(np.append(starts, len(pairIndices)))
+            yield _reduce(_power(M[pairIndices[starts]], counts))
+
+    def getMatrix(self, strain=None):
+        """getMatrix
+
+        Returns the (pol x qz x 2 x 2) matrix of the structure for a strain
+        vector, see iterMatrices. The unstrained structure is combined
+        along its substructures tree with exponentiation by squaring of the
+        repetitions.
+        """
+        self._checkCache()
+        if strain is None:
+            view = self.S.getLayerView()
+            return self._getNodeMatrix(view.root, {})
+        return next(self.iterMatrices(strain))
+
+    def _getNodeMatrix(self, node, memo):
+        """_getNodeMatrix
+
+        Returns the matrix of a layerNode of the substructures tree. The
+        matrices of the child nodes are memoized, so that repeated
+        substructures are calculated only once.
+        """
+        if id(node) in memo:
+            return memo[id(node)]
+        leaves = [e for e in node.entries if node._isLeaf(e)]
+        if leaves:
+            self._getCachedMatrices(np.array(leaves), np.zeros(len(leaves), dtype=np.int64),
+                                    np.zeros(len(leaves)))
+        res = None
+        for entry, N in zip(node.entries, node.repetitions):
+            if node._isLeaf(entry):
+                M = self._matrices[(int(entry), 0)]
+            else:
+                M = self._getNodeMatrix(entry, memo)
+            M = _power(M[np.newaxis], np.array([N]))[0]
+            res = M if res is None else _normalize(_matmul(res, M))
+        memo[id(node)] = res
+        return res
+
+    def getReflectivity(self, strainMap=None):
+        """getReflectivity
+
+        Returns the dynamical reflectivity for the unstrained structure, a
+        strain vector or a (time x N) strain map as (qz) or (time x qz)
+        array. For unpolarized X-rays the reflectivities of sigma and pi
+        polarization are averaged.
+        """
+        if strainMap is not None and np.ndim(strainMap) == 2:
+            return np.array([_getReflectivity(M) for M in self.iterMatrices(strainMap)])
+        return _getReflectivity(self.getMatrix(strainMap))
+
+    def saveReflectivity(self, path, time, strainMap, chunkSize=100, compress=False, overwrite=False):
+        """saveReflectivity
+
+        Streams the (time x qz) dynamical reflectivity of the (time x N)
+        strain map chunk by chunk into a chunkedMap in the directory path
+        together with the energy, the scattering vectors and the metadata of
+        the structure. The strain map may be a chunkedMap as well. An
+        existing map in path is only replaced if overwrite is True. Returns
+        the chunkedMap.
+        """
+        qz = np.atleast_1d(np.asarray(self.qz, dtype=float))
+        metadata = {'E': self.E, 'qz': qz.tolist(), 'structure': getStructureMetadata(self.S, 'XRD')}
+        R = chunkedMap(path, shape=(len(qz),), compress=compress, metadata=metadata,
+                       overwrite=overwrite)
+        time = np.asarray(time, dtype=float)
+        for start in range(0, len(time), chunkSize):
+            stop = min(start + chunkSize, len(time))
+            R.append(time[start:stop], self.getReflectivity(np.asarray(strainMap[start:stop])))
+        return R
+
+
+def _getReflectivity(M):
+    """_getReflectivity
+
+    Returns the reflectivity of the (pol x qz x 2 x 2) matrix averaged over
+    the polarizations.
+    """
+    return np.mean(np.abs(M[..., 0, 1]/M[..., 1, 1])**2, axis=0)
+
+
+def _matmul(A, B):
+    """_matmul
+
+    Returns the products of the stacked 2x2 matrices, which are written
+    out element-wise as this is much faster than numpy's matmul for
+    small matrices.
+    """
+    res = np.empty(np.broadcast_shapes(A.shape, B.shape), dtype=complex)
+    res[..., 0, 0] = A[..., 0, 0]*B[..., 0, 0] + A[..., 0, 1]*B[..., 1, 0]
+    res[..., 0, 1] = A[..., 0, 0]*B[..., 0, 1] + A[..., 0, 1]*B[..., 1, 1]
+    res[..., 1, 0] = A[..., 1, 0]*B[..., 0, 0] + A[..., 1, 1]*B[..., 1, 0]
+    res[..., 1, 1] = A[..., 1, 0]*B[..., 0, 1] + A[..., 1, 1]*B[..., 1, 1]
+    return res
+
+
+def _propagate(M, phi):
+    """_propagate
+
+    Returns the stacked matrices multiplied by the phase matrices
+    $L(d) = \\mathrm{diag}(e^{i\\phi/2}, e^{-i\\phi/2})$ with $\\phi = q_z d$
+    from the right, i.e. the columns are scaled.
+    """
+    phase = np.exp(0.5j*phi)
+    res = M.copy()
+    res[..., 0] *= phase[..., np.newaxis]
+    res[..., 1] /= phase[..., np.newaxis]
+    return res
+
+
+def _normalize(M):
+    """_normalize
+
+    Scales the stacked matrices by their largest element, which leaves
+    the reflectivity unchanged.
+    """
+    M /= np.max(np.abs(M), axis=(-2, -1), keepdims=True)
+    return M
+
+
+def _power(M, counts):
+    """_power
+
+    Returns the stacked matrices M[i] to the power of counts[i] by a
+    batched exponentiation by squaring.
+    """
+    counts = np.array(counts, dtype=np.int64)
+    res  = np.broadcast_to(np.eye(2, dtype=complex), M.shape).copy()
+    base = M.copy()
+    while np.any(counts > 0):
+        odd = np.flatnonzero(counts & 1)
+        if len(odd):
+            res[odd] = _normalize(_matmul(res[odd], base[odd]))
+        counts >>= 1
+        busy = np.flatnonzero(counts > 0)
+        if len(busy):
+            base[busy] = _normalize(_matmul(base[busy], base[busy]))
+    return res
+
+
+def _reduce(M):
+    """_reduce
+
+    Returns the product M[0] @ M[1] @ ... of the stacked matrices by
+    pairwise reduction.
+    """
+    while len(M) > 1:
+        if len(M) % 2:
+            M = np.concatenate([M, np.broadcast_to(np.eye(2), (1,) + M.shape[1:])])
+        M = _normalize(_matmul(M[0::2], M[1::2]))
+    return M[0]
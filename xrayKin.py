@@ -0,0 +1,303 @@
+# This file is part of the udkm1Dsimpy module.
+#
+# udkm1Dsimpy is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2017 Daniel Schick
+
+import numpy as np
+import numericalunits as u
+from .atoms import getCMAtomicFormFactors
+from .strainBinning import strainBinning
+from .chunkedMap import chunkedMap, getStructureMetadata
+u.reset_units('SI')
+
+# classical electron radius [m]
+r0 = 2.8179403227e-15*u.m
+
+
+def getUnitCellKey(UCHandles):
+    """getUnitCellKey
+
+    Returns a tuple of all properties of the unit cells which enter the
+    X-ray diffraction, i.e. the axes, the Debye-Waller factor and the atoms
+    and their position functions, so that changes of the unit cells
+    invalidate the cached data of the diffraction engines.
+    """
+    return tuple((id(UC), UC.cAxis, UC.area, UC.debWalFac,
+                  tuple((id(a[0]), a[2]) for a in UC.atoms)) for UC in UCHandles)
+
+
+class xrayKin(object):
+    """xrayKin
+
+    The xrayKin class calculates the kinematical X-ray diffraction of a
+    structure for a fixed energy and a grid of scattering vectors $q_z$.
+    The structure factor of a unit cell with the strain $\\eta$ is
+
+    $$ F(q_z) = \\sum_j f_j(E, q_z)\\, e^{i q_z c (1+\\eta) x_j(\\eta)}
+       \\, e^{-\\langle u^2 \\rangle q_z^2/2} $$
+
+    with the relative atom positions $x_j$ and the Debye-Waller factor
+    debWalFac $\\langle u^2 \\rangle$. The reflectivity of the structure is
+
+    $$ R(q_z) = \\left|\\frac{4 \\pi r_0}{q_z} \\sum_i \\frac{F_i(q_z)}{A_i}
+       e^{i q_z z_i}\\right|^2 $$
+
+    with the depth $z_i$ of the top of the strained unit cell $i$ and its
+    area $A_i$.
+
+    The atomic form factors of all atoms and the structure factors of all
+    unique unit cells are calculated once as stacked arrays. The strains
+    of a strain map are binned and the structure factors are calculated
+    once per distinct pair of unique unit cell and strain bin for all time
+    steps. Neighbouring unit cells of the same pair form a run, whose
+    phase factors are summed as geometric series. Thus, the cost of a
+    strain map depends on the number of runs and not on the number of
+    unit cells, e.g. an unstrained substrate is a single run.
+
+    Attributes:
+        S (structure)           : sample to do simulations with
+        E (float)               : photon energy [J]
+        qz (ndarray[float])     : z-components of the scattering vectors [1/m]
+        binning (strainBinning) : binning of the strains with the
+                                  statistics of the last strain map
+        resultCache (resultCache)   : optional on-disk cache of the
+                                      structure factors, default is None
+    """
+
+    def __init__(self, S, E, qz, **kwargs):
+        """Initialize the class.
+
+        Args:
+            S (structure)                   : sample
+            E (float)                       : photon energy [J]
+            qz (ndarray[float])             : scattering vectors [1/m]
+            strainBinWidth (Optional[float]): default is 0, i.e. the
+                                              strains are not binned
+            resultCache (Optional[resultCache]) : default is None
+
+        """
+        self.S          = S
+        self.E          = E
+        self.qz         = qz
+        self.binning    = strainBinning(S, kwargs.get('strainBinWidth', 0))
+        self.resultCache = kwargs.get('resultCache', None)
+        self._cacheKey  = None
+        self._cache     = None
+
+    def __str__(self):
+        """String representation of this class
+
+        """
+        qz = np.atleast_1d(self.qz)
+        classStr  = 'Kinematical X-ray diffraction simulation with the following properties\n'
+        classStr += 'sample                 : {:s}\n'.format(self.S.name)
+        classStr += 'energy                 : {:3.2f} keV\n'.format(self.E/(1e3*u.eV))
+        classStr += 'qz range               : {:3.2f} - {:3.2f} 1/Å ({:d} points)\n'.format(
+            qz.min()*u.angstrom, qz.max()*u.angstrom, len(qz))
+        classStr += 'strain bin width       : {:3.2e}\n'.format(self.binning.binWidth)
+        return(classStr)
+
+    def _getUniqueData(self):
+        """_getUniqueData
+
+        Returns the dict of the atomic form factors of all atoms in the
+        unique unit cells, the padded (unique unit cells x atoms) matrix of
+        their indices, and the unstrained structure factors of the unique
+        unit cells. The data are recalculated only if the energy, the
+        scattering vectors, the structure or its unit cells change.
+        """
+        compiled = self.S.compile()
+        qz  = np.atleast_1d(np.asarray(self.qz, dtype=float))
+        key = (self.E, qz.tobytes(), self.S._getSignature(), getUnitCellKey(compiled.UCHandles))
+        if key != self._cacheKey:
+            atoms   = []
+            atomIDs = {}
+            numAtoms = max([UC.numAtoms for UC in compiled.UCHandles] + [1])
+            # the padded atoms of a unit cell point to the last row of zeros
+            atomIdx = np.full((len(compiled.UCHandles), numAtoms), -1)
+            for i, UC in enumerate(compiled.UCHandles):
+                for j, a in enumerate(UC.atoms):
+                    atomIdx[i, j] = atomIDs.setdefault(id(a[0]), len(atoms))
+                    if atomIdx[i, j] == len(atoms):
+                        atoms.append(a[0])
+            f = np.zeros((len(atoms) + 1, len(qz)), dtype=complex)
+            if atoms:
+                f[:-1] = getCMAtomicFormFactors(atoms, self.E, qz)[:, 0, :]
+            # padded (unique unit cells x atoms) matrix of the unstrained atom positions [m]
+            z = np.zeros(atomIdx.shape)
+            for i, UC in enumerate(compiled.UCHandles):
+                z[i, :UC.numAtoms] = UC.cAxis*UC.getAtomPositions(0)
+            DW = np.array([UC.debWalFac for UC in compiled.UCHandles], dtype=float)
+            F0 = np.einsum('ujq,ujq->uq', np.exp(1j*z[:, :, np.newaxis]*qz), f[atomIdx]) \
+                * np.exp(-np.multiply.outer(DW, qz**2)/2)
+            # atoms at the same position function share their phase factors
+            groups = []
+            for i, UC in enumerate(compiled.UCHandles):
+                posStrs = [a[2] for a in UC.atoms]
+                first   = sorted(set(posStrs.index(p) for p in posStrs))
+                member  = np.array([first.index(posStrs.index(p)) for p in posStrs], dtype=int)
+                fGroup  = np.zeros((len(first), len(qz)), dtype=complex)
+                np.add.at(fGroup, member, f[atomIdx[i, :UC.numAtoms]])
+                groups.append((np.array(first, dtype=int), fGroup))
+            self._cache = {'qz': qz, 'f': f, 'atomIdx': atomIdx, 'F0': F0, 'groups': groups}
+            self._cacheKey = key
+        return self._cache
+
+    def getStructureFactors(self, UCIndices, strains):
+        """getStructureFactors
+
+        Returns the (pairs x qz) structure factors for the vectors of unique
+        unit cell indices and strains. The atom positions are evaluated
+        vectorized per unique unit cell and the phase factors of all pairs
+        are summed in one stacked product. Atoms at the same position
+        function share their phase factors.
+        """
+        data     = self._getUniqueData()
+        compiled = self.S.compile()
+        qz       = data['qz']
+        UCIndices = np.asarray(UCIndices, dtype=int)
+        strains  = np.asarray(strains, dtype=float)
+        F = np.zeros((len(UCIndices), len(qz)), dtype=complex)
+        for i in np.unique(UCIndices):
+            UC  = compiled.UCHandles[i]
+            sel = np.flatnonzero(UCIndices == i)
+            if UC.numAtoms == 0:
+                continue
+            first, fGroup = data['groups'][i]
+            # (pairs x positions) of the distinct atom positions in the strained unit cell [m]
+            z = UC.cAxis*(1 + strains[sel, np.newaxis])*UC.getAtomPositions(strains[sel])[:, first]
+            F[sel] = np.einsum('pjq,jq->pq', np.exp(1j*z[:, :, np.newaxis]*qz), fGroup) \
+                * np.exp(-UC.debWalFac*qz**2/2)
+        return F
+
+    def getPairStructureFactors(self, UCIndices, strains):
+        """getPairStructureFactors
+
+        Returns the (pairs x qz) structure factors divided by the area of
+        the unit cell for the pairs of unique unit cell indices and
+        strains. The unstrained structure factors are taken from the
+        cache. If a resultCache is given, the structure factors are taken
+        from the resultCache or are stored in it.
+        """
+        data     = self._getUniqueData()
+        compiled = self.S.compile()
+        UCIndices = np.asarray(UCIndices, dtype=int)
+        strains  = np.asarray(strains, dtype=float)
+        if self.resultCache is not None:
+            params = {'E': self.E, 'qz': data['qz'], 'UCIndices': UCIndices, 'strains': strains}
+            F = self.resultCache.get('structureFactors', self.S, **params)
+            if F is not None:
+                return F
+        F = np.empty((len(UCIndices), len(data['qz'])), dtype=complex)
+        unstrained = strains == 0
+        F[unstrained] = data['F0'][UCIndices[unstrained]]
+        if not np.all(unstrained):
+            F[~unstrained] = self.getStructureFactors(UCIndices[~unstrained], strains[~unstrained])
+        F /= compiled.getUniquePropertyVector('area')[UCIndices][:, np.newaxis]
+        if self.resultCache is not None:
+            self.resultCache.put('structureFactors', self.S, F, **params)
+        return F
+
+    def _sumRuns(self, pairIndices, F, d):
+        """_sumRuns
+
+        Returns the sum of the phase factors times the structure factors of
+        the unit cells of one time step, given by their pair indices. F and
+        d are the structure factors and the strained thicknesses of the
+        pairs. Neighbouring unit cells of the same pair form runs, which are
+        summed as geometric series.
+        """
+        qz     = self._getUniqueData()['qz']
+        starts = np.flatnonzero(np.concatenate([[True], pairIndices[1:] != pairIndices[:-1]]))
+        counts = np.diff(np.append(starts, len(pairIndices)))
+        depth  = np.concatenate([[0], np.cumsum(d[pairIndices])])[starts]
+        runs   = pairIndices[starts]
+
+        terms = F[runs]*np.exp(1j*qz*depth[:, np.newaxis])
+        # geometric series of the phase factors of the unit cells of the runs
+        multi = np.flatnonzero(counts > 1)
+        if len(multi):
+            dRun  = d[runs[multi], np.newaxis]
+            phase = np.exp(1j*qz*dRun)
+            n = counts[multi, np.newaxis]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                G = (1 - np.exp(1j*qz*dRun*n))/(1 - phase)
+            bragg = np.abs(1 - phase) < 1e-12
+            G[bragg] = np.broadcast_to(n, G.shape)[bragg]
+            terms[multi] *= G
+        return np.sum(terms, axis=0)
+
+    def getAmplitudes(self, strainMap):
+        """getAmplitudes
+
+        Returns the (time x qz) complex scattering amplitudes with the
+        prefactor of the reflectivity for a (time x N) strain map or for
+        the unstrained structure if the strain map is None. The
+        strains are binned and the structure factor of each distinct pair
+        of unique unit cell and strain bin is calculated only once for all
+        time steps, see strainBinning.
+        """
+        qz = self._getUniqueData()['qz']
+        if strainMap is None:
+            # the pairs of the unstrained structure are the unique unit cells
+            compiled  = self.S.compile()
+            UCIndices = np.arange(len(compiled.UCHandles))
+            strains   = np.zeros(len(UCIndices))
+            inverse   = compiled.indices[np.newaxis, :]
+        else:
+            UCIndices, bins, strains, inverse = self.binning.bin(strainMap)
+        F = self.getPairStructureFactors(UCIndices, strains)
+        d = self.S.compile().getUniquePropertyVector('cAxis')[UCIndices]*(1 + strains)
+        A = np.array([self._sumRuns(pairIndices, F, d) for pairIndices in inverse])
+        return 4*np.pi*r0/qz*A
+
+    def getAmplitude(self, strain=None):
+        """getAmplitude
+
+        Returns the complex scattering amplitude of the structure for a
+        strain vector, with the prefactor of the reflectivity.
+        """
+        return self.getAmplitudes(strain)[0]
+
+    def getReflectivity(self, strainMap=None):
+        """getReflectivity
+
+        Returns the kinematical reflectivity for the unstrained structure,
+        a strain vector or a (time x N) strain map as (qz) or (time x qz)
+        array.
+        """
+        if strainMap is None or np.ndim(strainMap) == 1:
+            return np.abs(self.getAmplitude(strainMap))**2
+        return np.abs(self.getAmplitudes(strainMap))**2
+
+    def saveReflectivity(self, path, time, strainMap, chunkSize=100, compress=False, overwrite=False):
+        """saveReflectivity
+
+        Streams the (time x qz) kinematical reflectivity of the (time x N)
+        strain map chunk by chunk into a chunkedMap in the directory path
+        together with the energy, the scattering vectors and the metadata of
+        the structure. The strain map may be a chunkedMap as well. An
+        existing map in path is only replaced if overwrite is True. Returns
+        the chunkedMap.
+        """
+        qz = np.atleast_1d(np.asarray(self.qz, dtype=float))
+        metadata = {'E': self.E, 'qz': qz.tolist(), 'structure': getStructureMetadata(self.S, 'XRD')}
+        R = chunkedMap(path, shape=(len(qz),), compress=compress, metadata=metadata,
+                       overwrite=overwrite)
+        time = np.asarray(time, dtype=float)
+        for start in range(0, len(time), chunkSize):
+            stop = min(start + chunkSize, len(time))
+            R.append(time[start:stop], self.getReflectivity(np.asarray(strainMap[start:stop])))
+        return R